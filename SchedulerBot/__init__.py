@@ -1 +0,0 @@
-from schedulerbot import *
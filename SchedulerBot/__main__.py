@@ -1,9 +1,63 @@
-import bot
+import argparse
 import json
+import logging
+import os
+import sys
+
+# Run as a directory, i.e. python SchedulerBot, only the package's own directory is on the path.
+if not __package__:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SchedulerBot import bot
+from SchedulerBot.storage import open_storage, SQLiteStorage
+from SchedulerBot.leader import Lease
+from SchedulerBot.partitions import directory_factory
+from SchedulerBot.archive import ArchiveStore
 
 if __name__ == "__main__":
+    # Large bots run one process per gateway shard, i.e. python -m SchedulerBot --shard-id 0 --shard-count 4, and so on
+    # up to --shard-id 3. Every process reads the same tokens.json and storage directories.
+    parser = argparse.ArgumentParser(description="Runs SchedulerBot.")
+    parser.add_argument("--shard-id", type=int, default=0, help="The gateway shard this process connects as.")
+    parser.add_argument("--shard-count", type=int, help="The number of shards the bot is split over.")
+    args = parser.parse_args()
+
     with open('tokens.json') as jfile:
         tokens = json.load(jfile)
-    bot = bot.SchedulerBot(tokens["discord"])
-    bot.run()
+    # An optional "log_level" entry, i.e. "DEBUG", turns on more logging. Only warnings and errors are logged by default.
+    logging.basicConfig(level=tokens.get("log_level", "WARNING"), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    # A sharded process first takes its shard's lease in the "lease_database" file. A second process started for the same
+    # shard waits here as a standby, before it opens any storage, and takes over once the first one stops renewing.
+    lease = None
+    if args.shard_count:
+        lease = Lease(tokens.get("lease_database", "leases.sqlite3"), "shard-{}".format(args.shard_id), ttl=tokens.get("lease_seconds", 30))
+        lease.wait()
 
+    # An optional "database" entry picks the storage file, i.e. "db.sqlite3" for the SQLite backend.
+    # Every guild gets its own file of the same kind inside the "guilds" directory.
+    # Direct messages only arrive on shard 0, so the other shards leave the database file alone.
+    database = tokens.get("database", "db.json")
+    storage = open_storage(database) if args.shard_id == 0 else SQLiteStorage(":memory:")
+    partition_factory = directory_factory(tokens.get("guilds_directory", "guilds"), os.path.splitext(database)[1])
+    # Past events are archived into monthly files of the same kind inside the "archive" directory.
+    archive = ArchiveStore(tokens.get("archive_directory", "archive"), os.path.splitext(database)[1])
+    bot = bot.SchedulerBot(tokens["discord"], storage, partition_factory, archive, args.shard_id, args.shard_count, lease)
+    # An optional "archive_retention_days" entry sets how long events stay after they started, null keeps them all.
+    bot.archive_retention_days = tokens.get("archive_retention_days", bot.archive_retention_days)
+    # An optional "legacy_guild_id" entry names the guild whose events were kept in the database file before every
+    # guild got a file of its own. They move into that guild's file on the next start.
+    if tokens.get("legacy_guild_id") is not None:
+        bot.legacy_partition = str(tokens["legacy_guild_id"])
+    # An optional "metrics_port" entry serves the bot's metrics on http://127.0.0.1:<port>/metrics.
+    # Shards serve theirs on metrics_port plus their shard id.
+    bot.metrics_port = tokens.get("metrics_port")
+    if bot.metrics_port is not None:
+        bot.metrics_port += args.shard_id
+    # Optional "profile_sample_rate", "slow_command_seconds" and "slow_command_log" entries set up profiling, see profiling.py.
+    bot.profiler.sample_rate = tokens.get("profile_sample_rate", bot.profiler.sample_rate)
+    bot.profiler.slow_seconds = tokens.get("slow_command_seconds", bot.profiler.slow_seconds)
+    bot.profiler.path = tokens.get("slow_command_log", bot.profiler.path)
+    if args.shard_count:
+        bot.profiler.path = "{}.{}".format(bot.profiler.path, args.shard_id)
+    bot.run()
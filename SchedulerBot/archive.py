@@ -0,0 +1,84 @@
+import logging
+import os
+import time
+
+from SchedulerBot.storage import Range, open_storage
+
+log = logging.getLogger(__name__)
+
+MONTH_FORMAT = "%Y-%m"
+
+# Returns the "YYYY-MM" month a UTC timestamp falls in.
+def utc_month(timestamp):
+	return time.strftime(MONTH_FORMAT, time.gmtime(timestamp))
+
+# Cold storage for events that are over, together with their replies and reminders.
+# Every partition gets a directory of its own with one file per month the archived events started in,
+# i.e. archive/1234/2017-06.json, opened only while it is written or read. The hot storage then only holds recent and
+# upcoming events, so its indexes and scans stay small however long the bot runs.
+class ArchiveStore:
+	def __init__(self, directory="archive", extension=".json"):
+		self.directory = directory
+		self.extension = extension
+
+	def _directory(self, guild_id):
+		return os.path.join(self.directory, "default" if guild_id is None else str(guild_id))
+
+	def path(self, guild_id, month):
+		return os.path.join(self._directory(guild_id), "{}{}".format(month, self.extension))
+
+	# Opens the storage of an archived month. The caller closes it.
+	def open(self, guild_id, month):
+		if not os.path.isdir(self._directory(guild_id)):
+			os.makedirs(self._directory(guild_id))
+		return open_storage(self.path(guild_id, month))
+
+	# Returns the months a partition has archived events for, oldest first.
+	def months(self, guild_id):
+		if not os.path.isdir(self._directory(guild_id)):
+			return []
+		return sorted(name[:-len(self.extension)] for name in os.listdir(self._directory(guild_id)) if name.endswith(self.extension))
+
+	# Returns the records of an archived month ordered by field, like Storage.ordered. Months never archived are empty.
+	def ordered(self, guild_id, month, table_name, field, value_range=Range(), limit=None, after=None):
+		if not os.path.exists(self.path(guild_id, month)):
+			return []
+		storage = self.open(guild_id, month)
+		try:
+			return storage.ordered(table_name, field, value_range, limit, after)
+		finally:
+			storage.close()
+
+	# Moves up to limit of the oldest events that started before cutoff out of storage, with their replies and reminders.
+	# Records are written to the archive before they are removed, so a crash in between leaves copies rather than gaps.
+	# Events without a start time are never moved. Returns the moved events and reminders.
+	def move(self, storage, guild_id, cutoff, limit):
+		events = storage.ordered("Event", "start_ts", Range(None, cutoff), limit)
+		events_by_month = {}
+		for event in events:
+			events_by_month.setdefault(utc_month(event["start_ts"]), []).append(event)
+
+		moved_reminders = []
+		for month, month_events in sorted(events_by_month.items()):
+			records = {"Event": month_events, "Reply": [], "Reminder": []}
+			for event in month_events:
+				records["Reply"].extend(storage.search("Reply", event_name=event["name"]))
+				records["Reminder"].extend(storage.search("Reminder", event_name=event["name"]))
+
+			archive = self.open(guild_id, month)
+			try:
+				with archive.batch():
+					for table_name, table_records in records.items():
+						if table_records:
+							archive.insert_multiple(table_name, [dict(record) for record in table_records])
+			finally:
+				archive.close()
+
+			with storage.batch():
+				for table_name, table_records in records.items():
+					if table_records:
+						storage.remove_ids(table_name, [record.eid for record in table_records])
+			moved_reminders.extend(records["Reminder"])
+			log.info("archived events guild_id=%s month=%s events=%s replies=%s reminders=%s",
+				guild_id, month, len(month_events), len(records["Reply"]), len(records["Reminder"]))
+		return events, moved_reminders
@@ -0,0 +1,109 @@
+import asyncio
+import queue
+import threading
+import time
+
+# Runs storage work on a dedicated writer thread so disk I/O never blocks the event loop.
+# Work that arrives within window seconds of the first queued call is run as one group inside storage.batch(),
+# so a burst of commands costs a handful of flushes instead of one file rewrite each.
+# Every storage call of the bot has to go through here, since the storage itself is not thread safe.
+# Each call runs inside a savepoint of its own, so a call that raises halfway through its writes leaves none of them
+# behind, while the calls grouped with it are still written.
+# on_operation(name, seconds), when given, is called on the writer thread with the duration of every call and of every
+# flush ("flush"). on_wait(seconds) is called on the event loop with how long each run() waited for its result.
+class AsyncStorage:
+	def __init__(self, storage, window=0.005, max_batch=500, on_operation=None, on_wait=None):
+		self.storage = storage
+		self.on_operation = on_operation
+		self.on_wait = on_wait
+		self.window = window
+		self.max_batch = max_batch
+		self.queue = queue.Queue()
+		self.thread = None
+		self.flushes = 0
+		self.operations = 0
+
+	def start(self):
+		if self.thread is None:
+			self.thread = threading.Thread(target=self._worker, name="storage-writer", daemon=True)
+			self.thread.start()
+
+	# Stops the writer thread once the work queued so far is done.
+	def stop(self):
+		if self.thread is not None:
+			self.queue.put(None)
+			self.thread.join()
+			self.thread = None
+
+	# Runs fn(*args, **kwargs) on the writer thread and returns its result once its group has been flushed.
+	@asyncio.coroutine
+	def run(self, fn, *args, **kwargs):
+		self.start()
+		loop = asyncio.get_event_loop()
+		future = asyncio.Future()
+		started = time.perf_counter()
+		self.queue.put((loop, future, fn, args, kwargs))
+		try:
+			return (yield from future)
+		finally:
+			if self.on_wait:
+				self.on_wait(time.perf_counter() - started)
+
+	# Collects the calls that arrive within the group commit window, up to max_batch calls.
+	def _collect(self, first):
+		group = [first]
+		deadline = time.monotonic() + self.window
+		while len(group) < self.max_batch:
+			timeout = deadline - time.monotonic()
+			if timeout <= 0:
+				break
+			try:
+				item = self.queue.get(timeout=timeout)
+			except queue.Empty:
+				break
+			if item is None:
+				self.queue.put(None)
+				break
+			group.append(item)
+		return group
+
+	def _worker(self):
+		while True:
+			item = self.queue.get()
+			if item is None:
+				return
+
+			group = self._collect(item)
+			results = []
+			try:
+				with self.storage.batch():
+					for loop, future, fn, args, kwargs in group:
+						started = time.perf_counter()
+						try:
+							with self.storage.savepoint():
+								result = fn(*args, **kwargs)
+							results.append((loop, future, result, None))
+						except Exception as e:
+							results.append((loop, future, None, e))
+						if self.on_operation:
+							self.on_operation(getattr(fn, "__name__", "unknown"), time.perf_counter() - started)
+					# The group is written to disk when the batch closes.
+					flush_started = time.perf_counter()
+				if self.on_operation:
+					self.on_operation("flush", time.perf_counter() - flush_started)
+			except Exception as e:
+				# The flush itself failed, so none of the group made it to disk.
+				results = [(loop, future, None, e) for loop, future, fn, args, kwargs in group]
+
+			self.flushes += 1
+			self.operations += len(group)
+			for loop, future, result, error in results:
+				loop.call_soon_threadsafe(_resolve, future, result, error)
+
+def _resolve(future, result, error):
+	if future.cancelled():
+		return
+	if error is not None:
+		future.set_exception(error)
+	else:
+		future.set_result(result)
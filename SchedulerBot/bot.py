@@ -1,233 +1,657 @@
+import aiohttp
 import asyncio
+import functools
+import heapq
 import json
+import logging
+import os
+import tempfile
 import time
 from datetime import datetime, timedelta
 import sys
 import discord
 import unicodedata
-from tinydb import TinyDB, Query, where
-from tinydb.operations import delete
-import operator
-
-# Class that represents a rule in order to check discord command inputs.
-# InputRule checks if the arguments of those discord commands pass or fail.
-# And then provides a fail message if it fails.
-class InputRule:
-	def __init__(self, cond, fail_msg):
-		self.cond = cond
-		self.fail_msg = fail_msg
-
-	def passes(self, args):
-		if isinstance(args, list):
-			return self.cond(*args)
-		else:
-			return self.cond(args)
-
-# @TODO: Use a RuleChecker soon.
-class InputRuleChecker:
-	def check_rules(self, rule_args):
-		checked_rules = [rule_arg[0].passes(rule_arg[1]) for rule_arg in rule_args]
-		return all(checked_rules)
+from itertools import islice
+from SchedulerBot.storage import TinyDBStorage, Record, Range
+from SchedulerBot.async_storage import AsyncStorage
+from SchedulerBot.locks import KeyedLocks
+from SchedulerBot.partitions import PartitionManager, directory_factory, shard_of
+from SchedulerBot.archive import ArchiveStore
+from SchedulerBot.scheduler import ReminderScheduler, REMINDER_DATETIME_FORMAT, reminder_key, reminder_due_time
+from SchedulerBot.delivery import MemberIndex, send_all
+from SchedulerBot.dispatcher import MessageDispatcher, PRIORITY_REMINDER
+from SchedulerBot.tokenizer import tokenize, split_command
+from SchedulerBot.cache import RenderCache
+from SchedulerBot.metrics import Registry, MetricsServer, LAG_BUCKETS, current_task
+from SchedulerBot.profiling import CommandProfiler
+from SchedulerBot import recurrence
+from SchedulerBot.records import new_event_record, new_reply_record, rsvp_fields, updated_rsvps, event_end, attendees, DEFAULT_DURATION
+from SchedulerBot.importer import Importer, read_file, chunks
+from SchedulerBot.intervals import windows
+from SchedulerBot.timeutil import TIMEZONE_OFFSETS, MAX_TIMEZONE_OFFSET, SECONDS_PER_DAY, DATE_FORMAT, TIME_FORMAT, day_range, month_range, utc_date, format_duration
+from SchedulerBot.validation import (InputRule, InputRuleChecker, TEXT_RULE, DATE_RULE, TIME_RULE, TIMEZONE_RULE, DATE_RANGE_RULE, DURATION_RULE,
+	DAY_RULE, COUNT_RULE, MONTH_RULE, REPLY_STATUS_RULE, NUMBER_RULE, TIME_METRIC_RULE, RATE_RULE, SECONDS_RULE, EVENT_FIELD_RULE, EVENT_FIELD_RULES,
+	RECURRENCE_RULE, REPEAT_END_RULE, REPEAT_END_RULES, SCHEDULE_SCHEMA, REPLY_SCHEMA, event_timestamp)
+
+log = logging.getLogger(__name__)
+
+# Event fields the bot derives from the others. They are kept up to date on every write and can't be edited directly.
+# The recurrence fields of a series (see recurrence.py) are set with !repeat, !skip and !move instead, and the RSVP
+# fields follow the event's replies (see records.py). end_ts follows the start time and the duration.
+DERIVED_EVENT_FIELDS = ("start_ts", "end_ts", "rsvps", "rsvp_counts") + recurrence.SERIES_FIELDS
+
+# Event fields that the start time of an event is computed from.
+EVENT_TIME_FIELDS = ("date", "time", "timezone")
+
+# How far ahead !availability looks for a user when no day is given, in seconds.
+AVAILABILITY_SECONDS = 7 * SECONDS_PER_DAY
+
+# Seconds in each time metric a reminder can be set with.
+TIME_METRIC_SECONDS = {"minutes": 60, "hours": 60 * 60, "days": SECONDS_PER_DAY}
 
 # Represents the Discord bot.
 class SchedulerBot(discord.Client):
-	def __init__(self, discord_token):
-		super(SchedulerBot, self).__init__()
+	def __init__(self, discord_token, storage=None, partition_factory=None, archive=None, shard_id=None, shard_count=None, lease=None):
+		# A bot split over shard_count processes connects as gateway shard shard_id and only sees the guilds of that shard.
+		if shard_count:
+			super(SchedulerBot, self).__init__(shard_id=shard_id, shard_count=shard_count)
+		else:
+			super(SchedulerBot, self).__init__()
 
 		self.discord_token = discord_token
 
-		# Represents very small database inside a json file using TinyDB
-		self.db = TinyDB("db.json")
-
-		# Represents all available commands and how to use them.
-		# @TODO: Make command classes?!
+		# Every shard keeps the partitions of its own guilds, in the same guilds directory as the others.
+		# lease (see leader.py) is held by the one process running this shard, which is also the one sending its
+		# reminders. A standby process for the shard waits for the lease before it opens any storage (see __main__.py).
+		self.shard_id = shard_id if shard_count else None
+		self.shard_count = shard_count
+		self.lease = lease
+
+		# Represents the database behind the bot. Defaults to a very small database inside a json file using TinyDB.
+		# See storage.py for the SQLite backend. Reads are served from in-memory indexes (see index.py).
+		# Every guild gets a partition of its own (see partitions.py); the default storage keeps direct messages.
+		# Events written before start times and RSVP aggregates were stored get theirs when their partition is opened.
+		self.partitions = PartitionManager(storage if storage else TinyDBStorage("db.json"),
+			partition_factory if partition_factory else directory_factory("guilds"), on_open=self.backfill_events, owns=self.owns_partition)
+		self.storage = self.partitions.default
+
+		# Whether every channel, rather than every guild, gets a partition of its own.
+		self.partition_by_channel = False
+
+		# Partition key of the guild that the data from before partitioning belongs to, i.e. its guild id.
+		# When set, the events, replies and reminders of the default storage move there once, on start.
+		self.legacy_partition = None
+
+		# How often idle partitions are closed, in seconds.
+		self.partition_eviction_interval = 60
+
+		# Events that started more than archive_retention_days ago are moved, with their replies and reminders, into
+		# monthly files of the cold archive (see archive.py). !events archive 2017-06 reads them back.
+		# Housekeeping runs every archive_interval seconds and moves archive_batch_size events per storage call, so
+		# commands keep getting their turn on the writer thread. A retention of None keeps everything.
+		self.archive = archive if archive else ArchiveStore("archive")
+		self.archive_retention_days = 30
+		self.archive_interval = 60 * 60
+		self.archive_batch_size = 50
+
+		# Runs storage work off the event loop on a writer thread, grouping bursts of writes into one flush.
+		# Coroutines reach the storage only through self.data.run(...).
+		self.data = AsyncStorage(self.partitions, on_operation=self.observe_storage_operation, on_wait=self.observe_storage_wait)
+
+		# Commands that change an event hold its lock from their first storage call to their last (see locks.py),
+		# so two commands on the same event never interleave while commands on other events don't wait.
+		self.event_locks = KeyedLocks()
+
+		# Represents all available commands, how to use them and the handler that runs them.
+		# on_message dispatches on this dict and !scheduler-bot builds its help text from it.
+		# Commands with positional arguments also get the checker their arguments are validated and parsed with (see validation.py).
+		# Commands whose first argument is an event name have it resolved case-insensitively first, see resolve_event_name.
 		#!schedule "Hearthstone Tourney 4" 2017-06-07 7:30PM PST "Bring your best decks!"
 		self.commands = {
 			"!schedule": {
-				"examples": ["!schedule \"Game Night\" 2017-06-01 05:30PM PST \"Bring your own beer.\""]
+				"examples": ["!schedule \"Game Night\" 2017-06-01 05:30PM PST \"Bring your own beer.\"", "!schedule \"Game Night\" 2017-06-01 05:30PM PST \"Bring your own beer.\" 3h"],
+				"handler": self.handle_schedule,
+				"arguments": InputRuleChecker(SCHEDULE_SCHEMA + [("duration", DURATION_RULE)])
 			},
 			"!reply": {
-				"examples": ["!reply \"Game Night\" yes"]
+				"examples": ["!reply \"Game Night\" yes"],
+				"handler": self.handle_reply,
+				"event_name": True,
+				"arguments": InputRuleChecker(REPLY_SCHEMA)
 			},
 			"!events": {
-				"examples": ["!events 2017-06-01"]
+				"examples": ["!events 2017-06-01", "!events 2017-06", "!events 2017-06-01..2017-06-30", "!events week", "!events next 5", "!events next", "!events archive 2017-06"],
+				"handler": self.handle_events
+			},
+			"!event": {
+				"examples": ["!event \"Game Night\"", "!event \"Game Night\" summary"],
+				"handler": self.handle_event,
+				"event_name": True
 			},
 			"!scheduler-bot": {
-				"examples": ["!scheduler-bot"]
+				"examples": ["!scheduler-bot"],
+				"handler": self.handle_scheduler_bot
 			},
 			"!delete-event":{
-				"examples": ["!delete-event \"Game Night\""]
+				"examples": ["!delete-event \"Game Night\""],
+				"handler": self.handle_delete_event,
+				"event_name": True
 			},
 			"!edit-event":{
-				"examples": ["!edit-event \"Game Night\" date 2017-06-06 time 5:30PM"]
+				"examples": ["!edit-event \"Game Night\" date 2017-06-06 time 5:30PM"],
+				"handler": self.handle_edit_event,
+				"event_name": True,
+				"arguments": InputRuleChecker()
+			},
+			"!remind":{
+				"examples": ["!remind \"Game Night\" 30 minutes"],
+				"handler": self.handle_remind,
+				"event_name": True,
+				"arguments": InputRuleChecker([("event_name", TEXT_RULE), ("diff_value", NUMBER_RULE), ("time_metric", TIME_METRIC_RULE)])
+			},
+			"!repeat":{
+				"examples": ["!repeat \"Game Night\" weekly until 2017-12-31", "!repeat \"Game Night\" monthly count 6", "!repeat \"Game Night\" biweekly"],
+				"handler": self.handle_repeat,
+				"event_name": True,
+				"arguments": InputRuleChecker([("event_name", TEXT_RULE), ("rule", RECURRENCE_RULE)])
+			},
+			"!skip":{
+				"examples": ["!skip \"Game Night\" 2017-06-08"],
+				"handler": self.handle_skip,
+				"event_name": True,
+				"arguments": InputRuleChecker([("event_name", TEXT_RULE), ("date", DATE_RULE)])
+			},
+			"!move":{
+				"examples": ["!move \"Game Night\" 2017-06-08 2017-06-09 07:30PM"],
+				"handler": self.handle_move,
+				"event_name": True,
+				"arguments": InputRuleChecker([("event_name", TEXT_RULE), ("date", DATE_RULE), ("new_date", DATE_RULE), ("new_time", TIME_RULE)])
+			},
+			"!profile":{
+				"examples": ["!profile on 0.1", "!profile off", "!profile slow 1.5", "!profile"],
+				"handler": self.handle_profile
+			},
+			"!import":{
+				"examples": ["!import (with a .csv or .ics file attached)"],
+				"handler": self.handle_import
+			},
+			"!search":{
+				"examples": ["!search night", "!search \"Gmae Night\""],
+				"handler": self.handle_search
+			},
+			"!availability":{
+				"examples": ["!availability dave", "!availability 2017-06-03", "!availability dave 2017-06-03", "!availability anna week"],
+				"handler": self.handle_availability
 			}
-			#,
-			#"!remind":{
-			#	"examples": ["!remind \"Game Night\" 30 minutes"]
-			#}
-
 		}
 
-
+		# Sends reminders when they are due. Loaded from storage once the bot starts running.
+		self.reminder_scheduler = ReminderScheduler(self.handle_reminders)
+
+		# Members the bot can send reminders to, kept current from the member events.
+		self.members = MemberIndex()
+
+		# How many reminder DMs can be in flight at once.
+		self.reminder_send_limit = 10
+
+		# Outbound queue that paces every message the bot sends. Command replies go ahead of reminder DMs.
+		self.dispatcher = MessageDispatcher(self.send_message)
+
+		# How many events one page of !events shows. Keeps a page well under Discord's 2000 character limit.
+		self.events_page_size = 15
+
+		# Where the last !events listing of each channel stopped, so !events next can carry on from there.
+		# @format: {(guild_id, channel_id): {"start": ..., "end": ..., "remaining": ..., "after": (start_ts, eid), "page": 2}}
+		self.event_cursors = {}
+
+		# Rendered !events and !event responses. Writes bump the version of the guild's events table and of the event
+		# they touch, which invalidates only the responses rendered from them. See render_cache.stats() for hit rates.
+		self.render_cache = RenderCache(256)
+
+		# Metrics of the bot, served in the Prometheus text format on metrics_port when it is set (see metrics.py).
+		# Commands are timed in four phases: parse (tokenizing), storage (waiting on self.data), render (the rest of the
+		# handler: validation and formatting) and send (until the response was delivered).
+		self.metrics = Registry()
+		self.metrics_port = None
+		self.metrics_server = None
+		self.command_seconds = self.metrics.histogram("schedulerbot_command_phase_seconds",
+			"Time spent in each phase of a command.", ["command", "phase"])
+		self.storage_seconds = self.metrics.histogram("schedulerbot_storage_operation_seconds",
+			"Time the storage writer thread spent on each operation.", ["operation"])
+		self.storage_operations = self.metrics.counter("schedulerbot_storage_operations_total",
+			"Storage operations run by the writer thread.", ["operation"])
+		self.reminder_lag = self.metrics.histogram("schedulerbot_reminder_lag_seconds",
+			"Time between a reminder being due and being sent.", buckets=LAG_BUCKETS)
+		self.archived_events = self.metrics.counter("schedulerbot_archived_events_total", "Events moved to the archive.")
+		self.metrics.gauge("schedulerbot_outbound_queue_depth", "Messages waiting in the outbound queue.",
+			lambda: {("commands",): self.dispatcher.stats()["queue_depth_commands"], ("reminders",): self.dispatcher.stats()["queue_depth_reminders"]}, ["lane"])
+		self.metrics.gauge("schedulerbot_storage_flushes", "Groups of storage work flushed to disk.", lambda: self.data.flushes)
+		self.metrics.gauge("schedulerbot_event_locks", "Event locks held or waited for, taken and found taken.",
+			lambda: {(name,): value for name, value in self.event_locks.stats().items()}, ["stat"])
+		self.metrics.gauge("schedulerbot_lease_held", "Whether this process holds its shard's lease.",
+			lambda: int(self.lease is None or self.lease.held()))
+		self.metrics.gauge("schedulerbot_render_cache", "Render cache size, hits, misses and evictions.",
+			lambda: {(name,): value for name, value in self.render_cache.stats().items() if name != "hit_rate"}, ["stat"])
+
+		# Storage wait time of the commands being handled, by the task that handles them.
+		self.command_timings = {}
+
+		# Profiles a sample of the commands when turned on, by config or by an admin with !profile, and writes
+		# commands slower than profiler.slow_seconds to a rotating file (see profiling.py).
+		self.profiler = CommandProfiler()
+
+	# Loads the pending reminders of every partition once and hands them to the scheduler,
+	# which sleeps until the next one is due.
+	# Reminders that are long overdue are marked as sent without going out, and those of recurring events move on
+	# to their next occurrence.
+	@asyncio.coroutine
+	def check_for_reminders(self):
+		if self.legacy_partition is not None:
+			yield from self.data.run(self.migrate_legacy_partition)
+		reminders = yield from self.data.run(self.get_pending_reminders)
+		now = time.time()
+		stale = self.reminder_scheduler.load(reminders, now)
+		if stale:
+			log.info("skipping overdue reminders count=%s", len(stale))
+			yield from self.data.run(self.mark_reminders_sent, [reminder_key(reminder) for reminder in stale])
+			yield from self.data.run(self.rearm_series_reminders, stale, int(now))
+		# Reminders go to members, who are only known once the bot has logged in.
+		yield from self.wait_until_ready()
+		yield from self.reminder_scheduler.run()
+
+	# Database helper function that moves the data from before partitioning into the partition of its guild.
+	# Only an unsharded bot has that data in its default storage.
+	def migrate_legacy_partition(self):
+		if self.shard_count:
+			log.warning("legacy data not migrated by a sharded bot, start it unsharded once partition=%s", self.legacy_partition)
+			return
+		moved = self.partitions.migrate_default(self.legacy_partition)
+		if moved:
+			log.info("migrated legacy data partition=%s events=%s replies=%s reminders=%s",
+				self.legacy_partition, moved["Event"], moved["Reply"], moved["Reminder"])
+
+	# Database helper function that pulls the unsent reminders out of every partition.
+	def get_pending_reminders(self):
+		reminders = []
+		for guild_id, partition_reminders in self.partitions.scan("Reminder", is_sent=False):
+			for reminder in partition_reminders:
+				reminder["guild_id"] = guild_id
+				reminders.append(reminder)
+		return reminders
+
+	# Closes the partitions of guilds that have gone quiet.
 	@asyncio.coroutine
-	def check_for_reminders(self, task_name, seconds_to_sleep=3):
+	def evict_partitions(self):
 		while True:
-			yield from asyncio.sleep(seconds_to_sleep)
-			now = datetime.now().strftime("%Y-%m-%d %I:%M:%p")
-			reminders = self.get_data("Reminder", "reminder_datetime", now)
-			if len(reminders) > 0:
-				yield from self.handle_reminders(reminders)
+			yield from asyncio.sleep(self.partition_eviction_interval)
+			yield from self.data.run(self.partitions.evict_idle)
 
+	# Moves the events that are past the retention window into the archive, a batch at a time, partition by partition.
+	# Partitions are only opened when they hold such an event, so idle guilds stay closed.
+	@asyncio.coroutine
+	def archive_past_events(self):
+		while self.archive_retention_days is not None:
+			yield from asyncio.sleep(self.archive_interval)
+			cutoff = int(time.time()) - self.archive_retention_days * SECONDS_PER_DAY
+			guild_ids = yield from self.data.run(self.partitions.keys)
+			for guild_id in guild_ids:
+				if not (yield from self.data.run(self.has_events_before, guild_id, cutoff)):
+					continue
+				while (yield from self.data.run(self.archive_events, guild_id, cutoff, self.archive_batch_size)) == self.archive_batch_size:
+					pass
+
+	# Database helper function that tells whether a partition has an event that started before cutoff,
+	# reading its oldest start time without opening the partition.
+	def has_events_before(self, guild_id, cutoff):
+		return bool(self.partitions.peek(guild_id, lambda storage: storage.ordered("Event", "start_ts", Range(None, cutoff), 1)))
+
+	# Database helper function that moves up to limit events that started before cutoff into the archive.
+	# Their reminders leave the scheduler and their rendered responses the cache. Returns how many events were moved.
+	def archive_events(self, guild_id, cutoff, limit):
+		events, reminders = self.archive.move(self.partitions.get(guild_id), guild_id, cutoff, limit)
+		for reminder in reminders:
+			self.reminder_scheduler.cancel((guild_id, reminder.eid))
+		if events:
+			self.render_cache.bump(("Event", guild_id), *[("Event", guild_id, event["name"]) for event in events])
+			self.archived_events.inc(len(events))
+		return len(events)
+
+	# Database helper function that imports the next chunk of rows into a partition. Returns False once every row is in.
+	def import_next_chunk(self, importer, rows, guild_id=None):
+		chunk = next(rows, None)
+		if chunk is None:
+			return False
+		names = importer.import_chunk(self.partitions.get(guild_id), chunk)
+		self.render_cache.bump(("Event", guild_id), *[("Event", guild_id, name) for name in names])
+		return True
+
+	# Downloads a message attachment into a file, a piece at a time.
+	@asyncio.coroutine
+	def download_attachment(self, attachment, path):
+		with aiohttp.ClientSession(loop=self.loop) as session:
+			response = yield from session.get(attachment["url"])
+			try:
+				with open(path, "wb") as download:
+					while True:
+						data = yield from response.content.read(64 * 1024)
+						if not data:
+							break
+						download.write(data)
+			finally:
+				response.release()
+
+	# Returns whether the author of a message is an administrator of the server it was sent in.
+	def is_admin(self, message):
+		permissions = getattr(message.author, "server_permissions", None)
+		return message.server is not None and permissions is not None and permissions.administrator
+
+	# Database helper function that counts the records of every table in a partition.
+	def get_partition_sizes(self, guild_id=None):
+		storage = self.partitions.get(guild_id)
+		return {table_name: storage.count(table_name) for table_name in ("Event", "Reply", "Reminder")}
+
+	# Returns the partition key of the guild (or channel) a message was sent in. None for direct messages.
+	def get_partition_key(self, message):
+		if message.server is None:
+			return None
+		if self.partition_by_channel:
+			return "{}-{}".format(message.server.id, message.channel.id)
+		return message.server.id
+
+	# Returns whether a partition belongs to this process's shard. Every partition does when the bot isn't sharded.
+	def owns_partition(self, key):
+		return self.shard_count is None or shard_of(key, self.shard_count) == self.shard_id
 
 	def main(self):
-		pass
-		# @TODO: Commenting this out for reminders.
-		# loop = asyncio.get_event_loop()
-		# try:
-			# asyncio.async(self.check_for_reminders('reminder_task',1))
-			# asyncio.async(self.run())
-			# loop.run_forever()
-		# except KeyboardInterrupt:
-			# pass
-		# finally:
-			# print('step: loop.close()')
-			# loop.close()
+		self.run()
 
 	def run(self):
-		print("superclass being called...")
+		if self.metrics_port is not None:
+			self.metrics_server = MetricsServer(self.metrics, self.metrics_port)
+			self.metrics_server.start()
+		self.loop.create_task(self.dispatcher.run())
+		self.loop.create_task(self.check_for_reminders())
+		self.loop.create_task(self.evict_partitions())
+		self.loop.create_task(self.archive_past_events())
+		if self.lease is not None:
+			self.loop.create_task(self.keep_lease())
+		log.info("starting discord client shard_id=%s shard_count=%s", self.shard_id, self.shard_count)
 		# Calling superclass to do discord.Client's run.
-		super(SchedulerBot, self).run(self.discord_token)
+		try:
+			super(SchedulerBot, self).run(self.discord_token)
+		finally:
+			if self.lease is not None:
+				self.lease.release()
+
+	# Renews the shard's lease a few times per ttl, off the event loop and away from the storage writer thread.
+	# A process that can't renew has been replaced by a standby, so it stops sending reminders and logs out.
+	@asyncio.coroutine
+	def keep_lease(self):
+		while True:
+			try:
+				held = yield from self.loop.run_in_executor(None, self.lease.acquire)
+			except Exception:
+				log.exception("lease renewal failed name=%s", self.lease.name)
+				held = self.lease.held()
+			if not held:
+				log.error("lease lost, shutting down name=%s", self.lease.name)
+				yield from self.logout()
+				return
+			yield from asyncio.sleep(self.lease.ttl / 3)
 
 	# Discord client function that is called when the bot has logged into the registered server.
 	@asyncio.coroutine
 	def on_ready(self):
-		print('Logged in as')
-		print(self.user.name)
-		print(self.user.id)
-		print('------')
-	
+		log.info("logged in name=%s id=%s", self.user.name, self.user.id)
+		self.members.load(self.get_all_members())
+
+	# Records how long the storage writer thread spent on an operation. Called on the writer thread.
+	def observe_storage_operation(self, operation, seconds):
+		self.storage_seconds.observe(seconds, operation=operation)
+		self.storage_operations.inc(operation=operation)
+
+	# Adds the time a coroutine waited on storage to the command its task is handling, if any.
+	def observe_storage_wait(self, seconds):
+		timing = self.command_timings.get(current_task())
+		if timing is not None:
+			timing["storage"] += seconds
+
+	# Discord client functions that keep the member index current.
+	@asyncio.coroutine
+	def on_member_join(self, member):
+		self.members.add(member)
+
+	@asyncio.coroutine
+	def on_member_update(self, before, after):
+		self.members.update(before, after)
+
+	@asyncio.coroutine
+	def on_member_remove(self, member):
+		self.members.remove(member)
+
 	# Bot function that handles the reminders of a certain time and alerts all attendies.
+	# Event details are looked up once per event, DMs go out concurrently and the sent reminders are marked in one write.
 	@asyncio.coroutine
 	def handle_reminders(self, reminders):
-		names = [reminder["attendie"] for reminder in reminders]
-		reminders_by_name = {}
+		event_keys = set([(reminder.get("guild_id"), reminder["event_name"]) for reminder in reminders])
+		log.debug("handling reminders count=%s events=%s", len(reminders), event_keys)
+
+		events = {}
+		for guild_id, event_name in event_keys:
+			event_data = yield from self.data.run(self.get_data, "Event", "name", event_name, guild_id=guild_id)
+			if event_data:
+				events[(guild_id, event_name)] = event_data[0]
+
+		# Reminders of events that are gone, or of members the bot can't see, are marked as sent without going out,
+		# rather than being dropped and coming back as stale on the next start.
+		jobs = []
+		skipped = []
 		for reminder in reminders:
-			if reminder["attendie"] not in reminders_by_name:
-				reminders_by_name[reminder["attendie"]] = []
-			reminders_by_name[reminder["attendie"]].append(reminder)
-				
-		print("Handling unique reminders for the following events: {}".format(set([reminder["event_name"] for reminder in reminders])))
-		for i in self.get_all_members():
-			if i.name in names:
-				user = i
-				for reminder in reminders_by_name[i.name]:
-					event_date = self.get_data(table_name="Event", field="name", field_value=reminder["event_name"])[0]["date"]
-					event_time = self.get_data(table_name="Event", field="name", field_value=reminder["event_name"])[0]["time"]
-					event_timezone = self.get_data(table_name="Event", field="name", field_value=reminder["event_name"])[0]["timezone"]
-					yield from self.send_message(user, 'Reminding you that {} starts at {} {} {}.'.format(reminder["event_name"],event_date,event_time,event_timezone))
-				self.delete_reminder(reminders_by_name[i.name])
-				break
+			event = events.get((reminder.get("guild_id"), reminder["event_name"]))
+			user = self.members.find(reminder.get("attendie_id"), reminder["attendie"])
+			if not (event and user):
+				skipped.append(reminder)
+			else:
+				date, time_str = event["date"], event["time"]
+				if event.get("recurrence") and reminder.get("occurrence_ts") is not None:
+					date, time_str = recurrence.local_date_time(reminder["occurrence_ts"], event)
+				content = 'Reminding you that {} starts at {} {} {}.'.format(reminder["event_name"], date, time_str, event["timezone"])
+				jobs.append((user, content, reminder_key(reminder)))
+
+		# A process whose lease ran out may already have been replaced, and the standby sends these reminders instead.
+		if self.lease is not None and not self.lease.held():
+			log.warning("lease not held, reminders left to the new holder count=%s", len(jobs))
+			return
+
+		if skipped:
+			log.warning("reminders without event or member not sent count=%s", len(skipped))
+
+		send_reminder = functools.partial(self.dispatcher.send, priority=PRIORITY_REMINDER)
+		sent_keys = yield from send_all(send_reminder, jobs, self.reminder_send_limit)
+
+		sent_at = time.time()
+		sent = set(sent_keys)
+		for reminder in reminders:
+			if reminder_key(reminder) in sent:
+				self.reminder_lag.observe(max(0, sent_at - reminder_due_time(reminder)))
+		sent_keys = sent_keys + [reminder_key(reminder) for reminder in skipped]
+		sent.update(sent_keys)
+		yield from self.data.run(self.mark_reminders_sent, sent_keys)
+		yield from self.data.run(self.rearm_series_reminders, [reminder for reminder in reminders if reminder_key(reminder) in sent])
+
+	# Marks reminders as sent, with one write per partition.
+	def mark_reminders_sent(self, reminder_keys):
+		eids_by_guild = {}
+		for guild_id, eid in reminder_keys:
+			eids_by_guild.setdefault(guild_id, []).append(eid)
+		for guild_id, eids in eids_by_guild.items():
+			self.partitions.get(guild_id).update_ids("Reminder", eids, {"is_sent": True})
+
+	# Points the sent reminders of recurring events at the occurrence after the one they went out for,
+	# or the first one after after.
+	def rearm_series_reminders(self, reminders, after=None):
+		for reminder in reminders:
+			if reminder.get("occurrence_ts") is None:
+				continue
+			guild_id = reminder.get("guild_id")
+			events = self.get_data("Event", "name", reminder["event_name"], guild_id=guild_id)
+			if not events or not events[0].get("recurrence"):
+				continue
+			reminder_times = self.get_reminder_times(events[0], reminder["time_metric"], reminder["diff_value"], after=max(reminder["occurrence_ts"], after or 0))
+			if reminder_times is None:
+				continue
+			reminder_times["is_sent"] = False
+			self.partitions.get(guild_id).update_ids("Reminder", [reminder.eid], reminder_times)
+			reminder.update(reminder_times)
+			self.reminder_scheduler.add(reminder)
 
 	# Delete reminder from db.
-	def delete_reminder(self, reminders):
+	def delete_reminder(self, reminders, guild_id=None):
 		for reminder in reminders:
-			self.db.table("Reminder").remove(eids=[reminder.eid])
-		#self.db.table("Reminder").update(delete('eid'), where('eid') == reminder["eid"])
-		#self.db.update(delete(), User.name == 'John')
+			self.reminder_scheduler.cancel((guild_id, reminder.eid))
+		self.partitions.get(guild_id).remove_ids("Reminder", [reminder.eid for reminder in reminders])
 
 	# Helper function that handles tokens captured within quotations.
 	# If there are tokens captured in two quotes, it will treat said tokens as a single token.
 	def handle_quotations(self, tokens):
-		new_tokens = []
-
-		phrase_found = False
-		phrase = ""
-
-		for token in tokens:
-			if "\"" in token:
-				token_ = token.strip("\"")
-				phrase += (token_ + " ")
-				if phrase_found or token.count("\"") == 2:
-					new_tokens.append(phrase.strip())
-					phrase = " "
-					phrase_found = False
-				else:
-					phrase_found = True
-			else:
-				if phrase_found:
-					phrase += (token + " ")
-				else:
-					new_tokens.append(token.strip())
-		return new_tokens
-
-	# Database helper function that strictly pulls events from the database.
-	# Pulls events based on desired fields.
+		return tokenize(" ".join(tokens))
+
+	# Database helper function that strictly pulls records from the database.
+	# Pulls records based on desired fields. Every field given has to match.
 	# @param: field="date", field_value="2017-01-06"
-	# @TODO: Allow this function to query multiple parameters at once
-	# @TODO: Allow this function to look at differ
-	def get_data(self, table_name, field=None, field_value=None):
-		table = self.db.table(table_name)
+	# @param: event_name="Game Night", author="dave", status="yes"
+	# @param: date=Range("2017-06-01", "2017-07-01")
+	# @param: guild_id picks the partition to read from, None for the default one.
+	def get_data(self, table_name, field=None, field_value=None, guild_id=None, **fields):
 		if field:
-			all_results = table.search(Query()[field] == field_value)
-		else:
-			all_results = table.all()
-		return all_results
+			fields[field] = field_value
+		return self.partitions.get(guild_id).search(table_name, **fields)
 
 	# Database helper function that gets all the field names from a given table.
-	def get_field_names(self, table_name):
-		table = self.db.table(table_name)
-		all_keys = table.all()[0].keys()
-		return all_keys
+	# Derived fields are left out since they can't be edited.
+	def get_field_names(self, table_name, guild_id=None):
+		all_keys = self.partitions.get(guild_id).all(table_name)[0].keys()
+		return [key for key in all_keys if key not in DERIVED_EVENT_FIELDS]
+
+	# Database helper function that pulls one page of the events starting in a range of UTC timestamps, ordered by start time.
+	# Only the rows of the page are read from the index. Returns the events and whether more come after them.
+	# @param: query={"start": 1496275200, "end": None, "remaining": 5} -> the first five events from 2017-06-01 onwards
+	# @param: query["after"]=(start_ts, eid) continues after the last event of the previous page.
+	# @param: query["archive"]="2017-06" reads the page from that month of the archive instead.
+	def get_events_page(self, query, guild_id=None):
+		limit = self.events_page_size
+		if query.get("remaining") is not None:
+			limit = min(limit, query["remaining"])
+		value_range = Range(query.get("start"), query.get("end"))
+		if query.get("archive"):
+			events = self.archive.ordered(guild_id, query["archive"], "Event", "start_ts", value_range, limit + 1, query.get("after"))
+		else:
+			storage = self.partitions.get(guild_id)
+			# Events listed by local date are kept by their date field, so the whole widened range is read.
+			dates = query.get("dates")
+			events = storage.ordered("Event", "start_ts", value_range, None if dates else limit + 1, query.get("after"))
+			# Recurring events are expanded only for the range and only until the page is full.
+			series = storage.ordered("Event", "recurrence", Range())
+			if series:
+				occurrences = [recurrence.expand(event, value_range.start, value_range.end, query.get("after")) for event in series]
+				events = heapq.merge(events, *occurrences, key=lambda event: (event["start_ts"], event.eid))
+			if dates:
+				events = (event for event in events if dates[0] <= event.get("date", "") < dates[1])
+			events = list(islice(events, limit + 1))
+		has_more = len(events) > limit and (query.get("remaining") is None or query["remaining"] > limit)
+		return events[:limit], has_more
+
+	# Helper function that returns the UTC timestamp an event starts at, or None if its date or time can't be read.
+	# Values the argument checkers already parsed are passed in parsed and used as they are. Unknown time zones count as UTC.
+	def get_event_timestamp(self, event, parsed=None):
+		parsed = parsed or {}
+		try:
+			date_ts = parsed["date"] if "date" in parsed else DATE_RULE.parse(event["date"])
+			time_seconds = parsed["time"] if "time" in parsed else TIME_RULE.parse(event["time"])
+			tz_offset = parsed["timezone"] if "timezone" in parsed else TIMEZONE_OFFSETS.get(event["timezone"], 0) * 60
+		except (KeyError, ValueError):
+			return None
+		return event_timestamp(date_ts, time_seconds, tz_offset)
+
+	# Database helper function that gives start and end times to the events of a partition that were stored without them.
+	# Series keep the start time of None they were given, see recurrence.py.
+	def backfill_event_timestamps(self, storage):
+		events = [event for event in storage.all("Event") if "start_ts" not in event or "end_ts" not in event]
+		with storage.batch():
+			for event in events:
+				start_ts = event["start_ts"] if "start_ts" in event else self.get_event_timestamp(event)
+				storage.update_ids("Event", [event.eid], {"start_ts": start_ts, "end_ts": event_end(event.get("duration"), start_ts)})
+
+	# Database helper function that builds the RSVP aggregates of the events of a partition that were stored without them.
+	def backfill_rsvps(self, storage):
+		events = [event for event in storage.all("Event") if "rsvps" not in event]
+		with storage.batch():
+			for event in events:
+				storage.update_ids("Event", [event.eid], rsvp_fields(storage.search("Reply", event_name=event["name"])))
+
+	# Brings the events of a freshly opened partition up to date.
+	def backfill_events(self, storage):
+		self.backfill_event_timestamps(storage)
+		self.backfill_rsvps(storage)
 
 	# Bot function that creates an event in the database.
-	def create_event(self, event_name, event_date, event_time, event_timezone, event_description, event_author):
-		table = self.db.table('Event')
-
-		# Checks if the event has already been created.
-		# If it has, don't override the event.
-		if table.search(Query().name == event_name):
-			return "Event {} already created. Cannot override this event.".format(event_name)
-
-		# Calculates the date, time, and timezone that the event was created.
-		# This helps with logging purposes.
-		now_date = time.strftime("%Y-%m-%d")
-		now_time = time.strftime("%I:%M%p")
-		now_tz = time.tzname[0]
-		now_tz_tokens = now_tz.split(" ")
-		if len(now_tz_tokens) > 1:
-			now_tz = "".join([token[0] for token in now_tz_tokens])
+	# @param: parsed holds the date, time, timezone and duration as parsed by the !schedule checker, if they were.
+	# The response warns about the events the new one overlaps that its host is going to as well.
+	def create_event(self, event_name, event_date, event_time, event_timezone, event_description, event_author, guild_id=None, parsed=None):
+		storage = self.partitions.get(guild_id)
 
 		# Create the dictionary that represents the record in the event table.
-		event_record = {
-			'name': event_name, 'date': event_date, 'time': event_time, 'timezone': event_timezone,
-			'description': event_description, 'author': event_author, 'created_date': now_date,
-			'created_time': now_time, 'created_timezone': now_tz
-		}
+		# It also keeps the date, time, and timezone that the event was created, which helps with logging purposes.
+		start_ts = self.get_event_timestamp({'date': event_date, 'time': event_time, 'timezone': event_timezone}, parsed)
+		event_record = new_event_record(event_name, event_date, event_time, event_timezone, event_description, event_author, start_ts,
+			(parsed or {}).get("duration"))
+		event_record.update(rsvp_fields([]))
 
-		# Try to insert the record into the table.
+		# Try to insert the record into the table. Event names are unique: an event that was already created isn't overridden.
 		try:
-			table.insert(event_record)
-			return "{} event successfully recorded. Others may now reply to this event.".format(event_name)
+			eid = storage.insert_unique("Event", event_record, "name")
+			if eid is None:
+				return "Event {} already created. Cannot override this event.".format(event_name)
+			self.render_cache.bump(("Event", guild_id), ("Event", guild_id, event_name))
 		except:
 			return "Cannot insert record into the Event table."
+		response = "{} event successfully recorded. Others may now reply to this event.".format(event_name)
+		return response + self.format_conflicts(self.find_conflicts(Record(event_record, eid), guild_id=guild_id))
 
 	# Bot function that edits an event that has already been created.
 	# @format field_values: {"name": "event1", "date": 2017-01-01}
-	def edit_event(self, event_name, reply_author, field_values):
-		table = self.db.table("Event")
-
+	# @param: parsed holds the field values as parsed by the !edit-event checker, if they were.
+	def edit_event(self, event_name, reply_author, field_values, guild_id=None, parsed=None):
+		storage = self.partitions.get(guild_id)
 		response = ""
 
-		if table.search(Query().name == event_name):
-			if table.search((Query().author == reply_author) & (Query().name == event_name)):
-				table.update(field_values, ((Query().author == reply_author) & (Query().name == event_name)))
-				# If date, time, or timezone changed in the event, delete the reminder and make a new one with the updated times.
-				#if set(["date","time","timezone"]).intersection(set(field_values.keys())):
-					#reminder_data = [(reminder_record['attendie'], reminder_record['time_metric'], reminder_record['diff_value']) for reminder_record in self.get_data('Reminder', 'event_name', event_name)] 
-					# print("Editing event, reminder_data: {}".format(reminder_data))
-					# self.delete_reminders_by_event_name(event_name, reply_author)
-					#for reminder in reminder_data:
-						# self.create_reminder(event_name, reminder[0], reminder[1], reminder[2])
+		if storage.search("Event", name=event_name):
+			events = storage.search("Event", author=reply_author, name=event_name)
+			if events and field_values.get("name", event_name) != event_name and storage.search("Event", name=field_values["name"]):
+				response += "Event {} already created. Cannot rename this event.".format(field_values["name"])
+			elif events:
+				# If date, time, or timezone changed in the event, its start time and reminders move with it.
+				# Its end time follows its start time and its duration, which is kept in seconds.
+				time_changed = set(EVENT_TIME_FIELDS).intersection(set(field_values.keys()))
+				values = dict(field_values)
+				if "duration" in field_values:
+					values["duration"] = (parsed or {}).get("duration")
+				if time_changed:
+					events[0].update(field_values)
+					start_ts = self.get_event_timestamp(events[0], parsed)
+					if events[0].get("recurrence"):
+						# A series moves as a whole. Its exceptions are keyed by the old start times, so they are dropped.
+						values.update({"recurrence_start_ts": start_ts, "exceptions": {}})
+					else:
+						values["start_ts"] = start_ts
+				if not events[0].get("recurrence") and (time_changed or "duration" in values):
+					values["end_ts"] = event_end(values.get("duration", events[0].get("duration")), values.get("start_ts", events[0].get("start_ts")))
+				storage.update("Event", values, author=reply_author, name=event_name)
+				self.render_cache.bump(("Event", guild_id), ("Event", guild_id, event_name), ("Event", guild_id, field_values.get("name", event_name)))
+				if field_values.get("name", event_name) != event_name:
+					self.rename_event_rows(event_name, field_values["name"], guild_id)
+				if time_changed:
+					self.reschedule_reminders(field_values.get("name", event_name), guild_id)
 				response += "Event table has been edited with new values: {}".format(field_values)
 			else:
 				response += "You do not have permission to edit this event."
@@ -236,180 +660,322 @@ class SchedulerBot(discord.Client):
 
 		return response
 
+	# Bot function that turns an event into a series that repeats weekly, biweekly or monthly, or changes how it repeats.
+	# The series is stored once, on the event's row. Its occurrences are expanded when they are listed or reminded of.
+	# @param: until_ts is the UTC midnight of the last day the series runs on, count the number of weeks or months it runs for.
+	def repeat_event(self, event_name, reply_author, rule, until_ts=None, count=None, guild_id=None):
+		storage = self.partitions.get(guild_id)
+
+		if not storage.search("Event", name=event_name):
+			return "Event {} does not exist.".format(event_name)
+		events = storage.search("Event", author=reply_author, name=event_name)
+		if not events:
+			return "You do not have permission to edit this event."
+
+		event = events[0]
+		start_ts = event.get("recurrence_start_ts") if event.get("recurrence") else event.get("start_ts")
+		if start_ts is None:
+			return "Event {} has no valid start time.".format(event_name)
+		values = recurrence.series_fields(event, rule, start_ts, until_ts, count)
+		# Exceptions are kept while the rule stays the same, since they are keyed by the rule's start times.
+		if event.get("recurrence") == rule:
+			values["exceptions"] = event.get("exceptions") or {}
+		storage.update_ids("Event", [event.eid], values)
+		self.render_cache.bump(("Event", guild_id), ("Event", guild_id, event_name))
+		self.reschedule_reminders(event_name, guild_id)
+		event.update(values)
+		return "{} now repeats {}.".format(event_name, recurrence.describe(event))
+
+	# Bot function that stores an exception for the occurrence of a series on a date: cancelled, or moved to new values.
+	# @param: date_ts is the UTC midnight of the occurrence's date in the event's time zone.
+	# @param: moved={"start_ts": ..., "date": "2017-06-09", "time": "07:30PM"}
+	def set_occurrence_exception(self, event_name, reply_author, date_ts, moved=None, guild_id=None):
+		storage = self.partitions.get(guild_id)
+
+		events = storage.search("Event", name=event_name)
+		if not events:
+			return "Event {} does not exist.".format(event_name)
+		elif not events[0].get("recurrence"):
+			return "Event {} does not repeat.".format(event_name)
+		elif events[0]["author"] != reply_author:
+			return "You do not have permission to edit this event."
+
+		event = events[0]
+		original_ts = recurrence.find_occurrence(event, date_ts)
+		if original_ts is None:
+			return "{} does not happen on {}.".format(event_name, utc_date(date_ts))
+		exceptions = dict(event.get("exceptions") or {})
+		exceptions[str(original_ts)] = moved if moved else {"cancelled": True}
+		storage.update_ids("Event", [event.eid], {"exceptions": exceptions})
+		self.render_cache.bump(("Event", guild_id), ("Event", guild_id, event_name))
+		self.reschedule_reminders(event_name, guild_id)
+
+		if moved:
+			return "{} on {} moved to {} {}.".format(event_name, utc_date(date_ts), moved["date"], moved["time"])
+		return "{} on {} cancelled.".format(event_name, utc_date(date_ts))
+
+	# Helper function that calculates when a reminder should go out: diff_value time_metric before the event starts.
+	# Returns the reminder's fields, a UTC timestamp and the same time as a local datetime string, or None if the
+	# event has no start time.
+	# Reminders of a recurring event are for its next occurrence after now (or after the timestamp after), whose start
+	# time is kept in occurrence_ts.
+	def get_reminder_times(self, event_data, time_metric, diff_value, after=None):
+		reminder_times = {}
+		if event_data.get('recurrence'):
+			occurrence = recurrence.next_occurrence(event_data, int(time.time()) if after is None else after)
+			start_ts = occurrence["start_ts"] if occurrence else None
+			reminder_times["occurrence_ts"] = start_ts
+		else:
+			start_ts = event_data.get('start_ts')
+			if start_ts is None:
+				start_ts = self.get_event_timestamp(event_data)
+		if start_ts is None:
+			return None
+
+		reminder_ts = start_ts - diff_value * TIME_METRIC_SECONDS[time_metric]
+		reminder_times.update({"reminder_ts": reminder_ts, "reminder_datetime": time.strftime(REMINDER_DATETIME_FORMAT, time.localtime(reminder_ts))})
+		return reminder_times
+
+	# Database helper function that carries the rename of an event over to its replies and reminders,
+	# including the reminders waiting in the scheduler.
+	def rename_event_rows(self, old_name, new_name, guild_id=None):
+		storage = self.partitions.get(guild_id)
+		storage.update("Reply", {"event_name": new_name}, event_name=old_name)
+		storage.update("Reminder", {"event_name": new_name}, event_name=old_name)
+		for reminder in storage.search("Reminder", event_name=new_name, is_sent=False):
+			reminder["guild_id"] = guild_id
+			self.reminder_scheduler.add(reminder)
+
+	# Bot function that moves the unsent reminders of an event after its date or time changed.
+	def reschedule_reminders(self, event_name, guild_id=None):
+		event_data = self.get_data('Event', 'name', event_name, guild_id=guild_id)[0]
+		for reminder in self.get_data('Reminder', event_name=event_name, is_sent=False, guild_id=guild_id):
+			reminder_times = self.get_reminder_times(event_data, reminder['time_metric'], reminder['diff_value'])
+			if reminder_times is None:
+				continue
+			self.partitions.get(guild_id).update_ids("Reminder", [reminder.eid], reminder_times)
+			reminder.update(reminder_times)
+			reminder["guild_id"] = guild_id
+			self.reminder_scheduler.add(reminder)
+
 	# Database function that creates a reminder in the database.
-	def create_reminder(self, event_name, attendie, time_metric, diff_value):
-		event_data = self.get_data('Event', 'name', event_name)[0]
+	def create_reminder(self, event_name, attendie, time_metric, diff_value, attendie_id=None, guild_id=None):
+		event_data = self.get_data('Event', 'name', event_name, guild_id=guild_id)[0]
 		event_time = event_data['time']
 		event_date = event_data['date']
 		
-		reminder_table = self.db.table('Reminder')
-		
-		reply_data = [reply_record for reply_record in self.get_data('Reply') if reply_record['event_name'] == event_name and reply_record['author'] == attendie and reply_record['status'] == 'yes']
-		if len(reply_data) <= 0:
+		if (event_data.get('rsvps') or {}).get(attendie) != 'yes':
 			return "Attendie did not reply yes to the event."
 		if time_metric not in ("minutes","hours","days"):
 			return "Invalid time metric."
-		print("event_date: {}, event_time: {}".format(event_date, event_time))
-		event_dt = datetime.strptime(" ".join((event_date, event_time)), '%Y-%m-%d %I:%M%p')
-
-		if time_metric == "minutes":
-			reminder_dt = event_dt - timedelta(minutes=diff_value)
-		elif time_metric == "hours":
-			reminder_dt = event_dt - timedelta(hours=diff_value)
-		elif time_metric == "days":
-			reminder_dt = event_dt - timedelta(days=diff_value)
+		reminder_times = self.get_reminder_times(event_data, time_metric, diff_value)
+		if reminder_times is None:
+			return "Event {} has no valid start time.".format(event_name)
+		log.debug("creating reminder event=%s date=%s time=%s attendie=%s reminder_datetime=%s",
+			event_name, event_date, event_time, attendie, reminder_times["reminder_datetime"])
 
-		reminder_dt = reminder_dt.strftime("%Y-%m-%d %I:%M:%p")	
-		print("reminder_dt: {}".format(reminder_dt))
-
-		reply_data = self.get_data('Reply', 'event_name', event_name)
-		print("attendie: {}".format(attendie))
 		reminder_record = {
 			"event_name": event_name,
 			"attendie": attendie,
-			"reminder_datetime": reminder_dt,
+			"attendie_id": attendie_id,
+			"reminder_datetime": reminder_times["reminder_datetime"],
+			"reminder_ts": reminder_times["reminder_ts"],
 			"time_metric": time_metric,
 			"diff_value": diff_value,
 			"is_sent": False
 		}
+		if "occurrence_ts" in reminder_times:
+			reminder_record["occurrence_ts"] = reminder_times["occurrence_ts"]
 		try:
-			reminder_table.insert(reminder_record)
+			eid = self.partitions.get(guild_id).insert("Reminder", reminder_record)
 		except:
 			return "Reminder not recorded into db. Check connection."
 
-		return "Reminder set. You'll be alerted {} {} before {} begins.".format(diff_value, time_metric, event_name) 
+		reminder = Record(reminder_record, eid)
+		reminder["guild_id"] = guild_id
+		self.reminder_scheduler.add(reminder)
 
-		# @TODO finish reminder stuff right here.
+		return "Reminder set. You'll be alerted {} {} before {} begins.".format(diff_value, time_metric, event_name) 
 
 	# Bot function that creates a reply [to an event] in the database.
-	def create_reply(self, event_name, reply_status, reply_author):
-		reply_table = self.db.table('Reply')
+	def create_reply(self, event_name, reply_status, reply_author, guild_id=None):
+		storage = self.partitions.get(guild_id)
 
 		# Checks if the event has been created.
 		# If it hasn't been created, there is no event to reply to.
-		event_table = self.db.table('Event')
-		if not event_table.search(Query().name == event_name):
+		events = storage.search("Event", name=event_name)
+		if not events:
 			return "This event hasn\'t been scheduled yet."
 
-		# Checks if the user has already submitted a reply to this event.
-		# If they have already replied, the reply is overwritten and the user is notified of it's updated value.
-		if reply_table.search((Query().author == reply_author) & (Query().event_name == event_name)):
-			reply_table.update({'status': reply_status}, ((Query().author == reply_author) & (Query().event_name == event_name)))
-			#if reply_status == "yes":
-				# print(self.create_reminder(event_name, reply_author, "hours", 1))
-				#print(self.create_reminder(event_name, reply_author, "days", 1))
-			return "Your old reply has been updated to {}.".format(reply_status)
-
-		# Calculates the date, time, and timezone that the event was created.
-		# This helps with logging purposes.
-		now_date = time.strftime("%Y-%m-%d")
-		now_time = time.strftime("%I:%M %p")
-		now_tz = time.tzname[0]
+		# The event's RSVP aggregates are updated with the reply, in the same batch.
+		rsvps = updated_rsvps(events[0], {reply_author: reply_status})
 
 		# Create the dictionary that represents the record in the reply table.
-		reply_record = {
-			'event_name': event_name, 'status': reply_status, 'author': reply_author,
-			'created_date': now_date, 'created_time': now_time, 'created_timezone': now_tz
-		}
+		# It also keeps the date, time, and timezone that the reply was created, which helps with logging purposes.
+		reply_record = new_reply_record(event_name, reply_status, reply_author)
 
-		
-		# Try to insert the record into the table.
+		# Try to write the reply. A user has one reply per event: if they have already replied, the reply is overwritten
+		# and the user is notified of it's updated value.
 		try:
-			reply_table.insert(reply_record)
-			#if reply_status == "yes":
-				# Create error handling for this. @TODO
-				# print(self.create_reminder(event_name, reply_author, "hours", 1))
-			#	print(self.create_reminder(event_name, reply_author, "days", 1))
-			return "Your reply has been successfully recorded."
+			inserted = storage.upsert("Reply", {'status': reply_status}, reply_record, event_name=event_name, author=reply_author)
+			storage.update_ids("Event", [events[0].eid], rsvps)
+			self.render_cache.bump(("Event", guild_id, event_name))
 		except:
 			return "Cannot insert record into the Reply table."
+		# Someone who says yes hears about the other events at the same time they are going to.
+		conflicts = ""
+		if reply_status == "yes":
+			conflicts = self.format_conflicts(self.find_conflicts(events[0], {reply_author}, guild_id))
+		if inserted:
+			return "Your reply has been successfully recorded." + conflicts
+		return "Your old reply has been updated to {}.".format(reply_status) + conflicts
 	
 
 	# Helper function that determines whether or not a string is of the correct date format.
 	# @param: date i.e. "2017-06-01"
 	def is_date(self, date):
-		# Try to convert the date into a struct_time. If it works, it's of a correct format.
-		try:
-			format_correct = isinstance(time.strptime(date, "%Y-%m-%d"), time.struct_time)
-			return format_correct
-		except:
-			return False
+		return DATE_RULE.passes(date)
 
 	# Helper function that determines whether or not a string is of the correct time format.
 	# @param: time_str i.e. "5:30PM"
 	def is_time(self, time_str):
-		time_str = time_str.lower()
-		time_period = time_str.split(":")
-		time_ = (":".join(time_period[:2]))[:-2]
-		period = time_str[-2:]
-
-		# Try to convert the date into a struct_time. If it works, it's of a correct format.
-		try:
-			time_correct = isinstance(time.strptime(time_, '%H:%M'), time.struct_time)
-			period_correct = period in ("am","pm")
-			return period_correct
-		except:
-			return False
+		return TIME_RULE.passes(time_str)
 
 	# Helper function that determines whether or not a string is a valid time zone abbreviation.
 	def is_timezone(self, tz_str):
-		known_timezones = [
-			"ACDT",     "ACST", "ACT",  "ACT",  "ADT",  "AEDT", "AEST", "AFT",  "AKDT", "AKST", "AMST", "AMT",  "AMT",  "ART",  "AST",  "AST",  "AWST", "AZOST",        "AZOT", "AZT",
-			"BDT",      "BIOT", "BIT",  "BOT",  "BRST", "BRT",  "BST",  "BST",  "BST",  "BTT",  "CAT",  "CCT",  "CDT",  "CDT",  "CEST", "CET",  "CHADT",        "CHAST",        "CHOT", "CHOST",
-			"CHST",     "CHUT", "CIST", "CIT",  "CKT",  "CLST", "CLT",  "COST", "COT",  "CST",  "CST",  "ACST", "ACDT", "CST",  "CT",   "CVT",  "CWST", "CXT",  "DAVT", "DDUT",
-			"DFT",      "EASST", "EAST",        "EAT",  "ECT",  "ECT",  "EDT",  "AEDT", "EEST", "EET",  "EGST", "EGT",  "EIT",  "EST",  "AEST", "FET",  "FJT",  "FKST", "FKT",  "FNT",
-			"GALT",     "GAMT", "GET",  "GFT",  "GILT", "GIT",  "GMT",  "GST",  "GST",  "GYT",  "HADT", "HAEC", "HAST", "HKT",  "HMT",  "HOVST",        "HOVT", "ICT",  "IDT",  "IOT",
-			"IRDT",     "IRKT", "IRST", "IST",  "IST",  "IST",  "JST",  "KGT",  "KOST", "KRAT", "KST",  "LHST", "LHST", "LINT", "MAGT", "MART", "MAWT", "MDT",  "MET",  "MEST",
-			"MHT",      "MIST", "MIT",  "MMT",  "MSK",  "MST",  "MST",  "MUT",  "MVT",  "MYT",  "NCT",  "NDT",  "NFT",  "NPT",  "NST",  "NT",   "NUT",  "NZDT", "NZST", "OMST",
-			"ORAT",     "PDT",  "PET",  "PETT", "PGT",  "PHOT", "PHT",  "PKT",  "PMDT", "PMST", "PONT", "PST",  "PST",  "PYST", "PYT",  "RET",  "ROTT", "SAKT", "SAMT", "SAST",
-			"SBT",      "SCT",  "SGT",  "SLST", "SRET", "SRT",  "SST",  "SST",  "SYOT", "TAHT", "THA",  "TFT",  "TJT",  "TKT",  "TLT",  "TMT",  "TRT",  "TOT",  "TVT",  "ULAST",
-			"ULAT",     "USZ1", "UTC",  "UYST", "UYT",  "UZT",  "VET",  "VLAT", "VOLT", "VOST", "VUT",  "WAKT", "WAST", "WAT",  "WEST", "WET",  "WIT",  "WST",  "YAKT", "YEKT"
-		]
-
-		return (tz_str in known_timezones)
+		return TIMEZONE_RULE.passes(tz_str)
 
 	# Helper function that determines whether or not a string has a digit.
 	# This is used as quick hack to look for  strings that may have dates.
 	def has_digit(self, input_str):
 		return any(char.isdigit() for char in input_str)
 
+	# Locks events of a guild for the rest of a command. Returns a coroutine to yield from; the result releases them on exit.
+	# @usage: with (yield from self.lock_events(guild_id, "Game Night")):
+	def lock_events(self, guild_id, *event_names):
+		return self.event_locks.acquire(*[("Event", guild_id, event_name) for event_name in event_names])
+
+	# Database helper function that finds the event a name refers to: the event with that name, or else the only one whose
+	# name matches it case-insensitively. Names that match nothing come back with the names of similar events instead.
+	# Only a miss reaches the name index (see search.py), so exact names cost one hash lookup as before.
+	# @param: event_name "game night" -> ("Game Night", []); "Gmae Night" -> (None, ["Game Night"])
+	def find_event_name(self, event_name, guild_id=None):
+		storage = self.partitions.get(guild_id)
+		if storage.search("Event", name=event_name):
+			return event_name, []
+		names = storage.text_index("Event", "name")
+		matching = names.matching(event_name)
+		if len(matching) == 1:
+			return matching[0], []
+		elif matching:
+			return None, matching
+		return None, [name for distance, name in names.similar(event_name)]
+
+	# Database helper function that searches the event names of a guild. Returns up to limit events: those whose name, or
+	# a word of it, starts with text first, then those with names within a few typos of text, closest first.
+	def search_events(self, text, limit=10, guild_id=None):
+		storage = self.partitions.get(guild_id)
+		names = storage.text_index("Event", "name")
+		found = names.prefix(text, limit)
+		found += [name for distance, name in names.similar(text, limit) if name not in found]
+		return [event for name in found[:limit] for event in storage.search("Event", name=name)]
+
+	# Database helper function that returns the events of a guild whose time overlaps [start, end), ordered by start time.
+	# One-off events come from the interval index (see intervals.py) and series are expanded for the range only.
+	def find_overlapping_events(self, start, end, guild_id=None):
+		storage = self.partitions.get(guild_id)
+		events = storage.overlapping("Event", "start_ts", "end_ts", start, end)
+		series = storage.ordered("Event", "recurrence", Range())
+		if series:
+			occurrences = [[event for event in recurrence.expand(series_event, start - (series_event.get("duration") or DEFAULT_DURATION), end)
+				if event["end_ts"] > start] for series_event in series]
+			events = list(heapq.merge(events, *occurrences, key=lambda event: (event["start_ts"], event.eid)))
+		return events
+
+	# Database helper function that returns (event, people) for every other event overlapping an event that some of the
+	# people are going to as well (see records.attendees). people defaults to everyone going to the event.
+	# Series have no single time of their own, so only one-off events are checked.
+	def find_conflicts(self, event, people=None, guild_id=None):
+		if event.get("start_ts") is None or event.get("end_ts") is None:
+			return []
+		people = attendees(event) if people is None else set(people)
+		conflicts = []
+		for other in self.find_overlapping_events(event["start_ts"], event["end_ts"], guild_id):
+			shared = people & attendees(other)
+			if other.eid != event.eid and shared:
+				conflicts.append((other, sorted(shared)))
+		return conflicts
+
+	# Database helper function that splits [start, end) into the windows where someone in a guild is busy and the free
+	# windows between them (see intervals.windows). Only the events user is going to count when user is given.
+	def get_availability(self, start, end, user=None, guild_id=None):
+		events = self.find_overlapping_events(start, end, guild_id)
+		if user is not None:
+			events = [event for event in events if user in attendees(event)]
+		return windows([(event["start_ts"], event["end_ts"], event) for event in events], start, end)
+
 	# Helper function that determines whether or not an event exists.
-	def event_exists(self, event_name):
-		table = self.db.table("Event")
-		return len(table.search(Query().name == event_name)) > 0
+	def event_exists(self, event_name, guild_id=None):
+		return len(self.partitions.get(guild_id).search("Event", name=event_name)) > 0
 
-	# String formatter function that determines how the events are displayed in the Discord client.
-	def format_events(self, events):
-		events_str = "**EVENTS**\n"
+	# String formatter function that determines how a page of events is displayed in the Discord client.
+	# The events come in already sorted by start time.
+	def format_events(self, events, page=1, has_more=False):
+		events_str = "**EVENTS**" + (" (page {})".format(page) if page > 1 or has_more else "") + "\n"
 		events_str += "```{:12} {:25} {:10} {:6} {:8}\n".format("Host", "Name", "Date", "Time", "Timezone")
 
-		# Sort the events by date.
-		date_string = '2009-11-29 03:17 PM'
-		events_by_datetime = { event["name"]:(datetime.strptime(event["date"] + " " + event["time"],'%Y-%m-%d %I:%M%p')) for event in events}
-		sorted_events = sorted(events_by_datetime.items(), key=lambda p: p[1], reverse=False)
-		print("events_sorted_by_datetime: {}".format(sorted_events))
-	
-		for target_event in sorted_events:	
-			for event in events:
-				if target_event[0] == event["name"]:
-					author = event["author"]
-					name = event["name"]
-					date = event["date"]
-					time = event["time"]
-					timezone = event["timezone"]
+		for event in events:
+			author = event["author"]
+			name = event["name"]
+			date = event["date"]
+			time = event["time"]
+			timezone = event["timezone"]
 
-					events_str += "{:12} {:25} {:10} {:6} {:8}\n".format(author, name if len(name) < 25 else name[:22]+"...", date, time, timezone)
-					break
+			events_str += "{:12} {:25} {:10} {:6} {:8}\n".format(author[:12], name if len(name) < 25 else name[:22]+"...", date, time, timezone)
 
 		events_str += "```"
-
-		# Just for debugging purposes.
-		print("events_str: {}".format(events_str))
+		if has_more:
+			events_str += "More events: `!events next`"
 
 		return events_str
 
+	# String formatter function that lists the conflicts find_conflicts found, to go after a command's response.
+	def format_conflicts(self, conflicts, limit=5):
+		if not conflicts:
+			return ""
+		conflicts_str = "\nHeads up, this overlaps with:"
+		for event, people in conflicts[:limit]:
+			conflicts_str += "\n{} on {} {} {}, with {} going".format(event["name"], event["date"], event["time"], event["timezone"], ", ".join(people))
+		if len(conflicts) > limit:
+			conflicts_str += "\nand {} more.".format(len(conflicts) - limit)
+		return conflicts_str
+
+	# String formatter function that determines how the free and busy windows of !availability are displayed.
+	# Times are UTC, like the dates of !events. Busy windows list their events, and who is going to them unless the
+	# windows are a single user's. At most limit windows of at most event_limit events each are shown, which keeps the
+	# response under Discord's 2000 character limit.
+	def format_availability(self, found, user=None, limit=15, event_limit=3):
+		def moment(timestamp):
+			return time.strftime("{} {}".format(DATE_FORMAT, TIME_FORMAT), time.gmtime(timestamp))
+
+		availability_str = "**AVAILABILITY**" + (" of {}".format(user) if user else "") + " (UTC)\n```"
+		for window_start, window_end, events in found[:limit]:
+			if events is None:
+				availability_str += "Free {} - {}\n".format(moment(window_start), moment(window_end))
+				continue
+			names = [event["name"] if user or not attendees(event) else "{} ({})".format(event["name"], ", ".join(sorted(attendees(event)))) for event in events[:event_limit]]
+			if len(events) > event_limit:
+				names.append("{} more".format(len(events) - event_limit))
+			availability_str += "Busy {} - {} {}\n".format(moment(window_start), moment(window_end), ", ".join(names))
+		if len(found) > limit:
+			availability_str += "and {} more windows.\n".format(len(found) - limit)
+		availability_str += "```"
+		return availability_str
+
 	# String formatter function that determines how single events are displayed in the Discord client.
-	def format_single_event(self, event, replies):
+	# The replies are read from the event's RSVP aggregates (see records.py). Events without them take their replies.
+	# summary=True lists how many replied each way instead of who did.
+	def format_single_event(self, event, replies=None, summary=False):
 		event_str = "**{}**".format(event["name"])
 		event_str += "```{:12} {:15} {:10} {:6} {:8}\n".format("Host", "Name", "Date", "Time", "Timezone")
 
@@ -421,296 +987,560 @@ class SchedulerBot(discord.Client):
 		desc = event["description"]
 
 		event_str += "{:12} {:15} {:10} {:6} {:8}\n\n{}\n\n".format(author, name[:15], date, time, timezone, desc)
+		if event.get("duration"):
+			event_str += "Lasts {}.\n\n".format(format_duration(event["duration"]))
+		if event.get("recurrence"):
+			event_str += "Repeats {}.\n\n".format(recurrence.describe(event))
 
-		reply_statuses = {"yes": [], "no": [], "maybe": []}
+		if replies is not None or "rsvps" not in event:
+			event = dict(event, **rsvp_fields(replies or []))
 
-		for reply in replies:
-			user = reply["author"]
-			status = reply["status"]
-			reply_statuses[status].append(user)
+		if summary:
+			counts = event["rsvp_counts"]
+			event_str += "Yes: {}\nNo: {}\nMaybe: {}".format(counts.get("yes", 0), counts.get("no", 0), counts.get("maybe", 0))
+		else:
+			reply_statuses = {"yes": [], "no": [], "maybe": []}
+
+			for user, status in event["rsvps"].items():
+				reply_statuses[status].append(user)
 
-		event_str += "Yes: {}\n".format(", ".join(reply_statuses["yes"]))
-		event_str += "No: {}\n".format(", ".join(reply_statuses["no"]))
-		event_str += "Maybe: {}".format(", ".join(reply_statuses["maybe"]))
+			event_str += "Yes: {}\n".format(", ".join(reply_statuses["yes"]))
+			event_str += "No: {}\n".format(", ".join(reply_statuses["no"]))
+			event_str += "Maybe: {}".format(", ".join(reply_statuses["maybe"]))
 
 		event_str += "```"
 
 		return event_str
 
 	# Bot function that deletes certain reminders from the database based on the event name.
-	def delete_reminders_by_event_name(self, event_name, author):
-		event_table = self.db.table("Event")
+	def delete_reminders_by_event_name(self, event_name, author, guild_id=None):
+		storage = self.partitions.get(guild_id)
 
-		if not event_table.search(Query().name == event_name):
+		if not storage.search("Event", name=event_name):
 			return "Event {} not in the table.".format(event_name)
-		elif not event_table.search((Query().author == author) & (Query().name == event_name)):
+		elif not storage.search("Event", author=author, name=event_name):
 			return "You do not have permission to delete this event."
 
-		reminder_table = self.db.table("Reminder")
-	
 		# Remove all reminders from the reminder table with that event name.
 		try:
-			reminder_table.remove(Query().event_name == event_name)
+			self.delete_reminder(storage.search("Reminder", event_name=event_name), guild_id)
 		except:
 			return "Cannot connect to Reminder table."
 
 		return "Reminders successfully deleted for event {}.".format(event_name)
 
 	# Bot function that deletes a certain event from the database.
-	def delete_event(self, event_name, reply_author):
-		event_table = self.db.table("Event")
-		reply_table = self.db.table("Reply")
-		#reminder_table = self.db.table("Reminder")
+	def delete_event(self, event_name, reply_author, guild_id=None):
+		storage = self.partitions.get(guild_id)
 
-		if not event_table.search(Query().name == event_name):
+		if not storage.search("Event", name=event_name):
 			return "Event {} not in the table.".format(event_name)
-		elif not event_table.search((Query().author == reply_author) & (Query().name == event_name)):
+		elif not storage.search("Event", author=reply_author, name=event_name):
 			return "You do not have permission to delete this event."
 
 		# Remove event from event table.
 		try:
-			event_table.remove(Query().name == event_name)
+			storage.remove("Event", name=event_name)
 		except:
 			return "Cannot connect to the Event table."
+		self.render_cache.bump(("Event", guild_id), ("Event", guild_id, event_name))
 
 		# Remove all replies from the reply table with that event name.
 		try:
-			reply_table.remove(Query().event_name == event_name)
+			storage.remove("Reply", event_name=event_name)
 		except:
 			return "Cannot connect to the Reply table."
 
 		# Remove all reminders from the reminder table with that event name.
-		# try:
-			# reminder_table.remove(Query().event_name == event_name)
-		#except:
-			#return "Cannot connect to Reminder table."
+		try:
+			self.delete_reminder(storage.search("Reminder", event_name=event_name), guild_id)
+		except:
+			return "Cannot connect to Reminder table."
 
 		return "Event successfully deleted."
 
 
 	# Discord client function that determines how to handle a new message when it appears on the Discord server.
+	# Ordinary chat is rejected on its first character. Commands are looked up in self.commands and
+	# only then are their arguments tokenized and handed to the command's handler.
+	# Every command is timed in phases for the metrics, see self.command_seconds. A sample of them is profiled when
+	# profiling is on, and the slow ones are written to the profiler's file.
 	@asyncio.coroutine
 	def on_message(self, message):
-		tokens = message.content.split(' ')
-		tokens = [str(token) for token in tokens]
-		bot_command = tokens[0].lower()
-		# !schedule command.
-		if bot_command == '!schedule':
-			tokens = tokens[1:]
-
-			if len(tokens):
-				tokens = self.handle_quotations(tokens)
-				if len(tokens) > 5:
-					create_event_response = "Invalid input: too many parameters."
-				else:
-					event_name = tokens[0].strip()
-					event_date = tokens[1]
-					event_time = tokens[2]
-					event_timezone = tokens[3]
-					event_description = tokens[4].strip()
-					event_author = message.author.name
-
-					# Setup input rules to check inputs.
-					date_rule = InputRule(self.is_date, "Invalid date format. Use: YYYY-MM-DD i.e. 2017-01-01")
-					time_rule = InputRule(self.is_time, "Invalid time format. Use: HH:MMPP i.e. 07:58PM")
-
-					if date_rule.passes(event_date) is False:
-						create_event_response = date_rule.fail_msg
-					elif time_rule.passes(event_time) is False:
-						create_event_response = time_rule.fail_msg
-					else:
-						create_event_response = self.create_event(event_name, event_date, event_time, event_timezone, event_description, event_author)
-			else:
-				create_event_response = "Invalid input: not enough inputs."
-			
-			yield from self.send_message(message.channel, create_event_response)
-
-		# !reply command.
-		elif bot_command == '!reply':
-		#	print("message.author: {}, type(message.author): {}".format(message.author, type(message.author)))
-			tokens = tokens[1:]
-			if len(tokens) >= 2:
-				tokens = self.handle_quotations(tokens)
-
-				if len(tokens) == 2:
-					event_name = tokens[0].strip()
-					reply_status = tokens[1].strip().lower()
-					reply_author = message.author.name
-
-					event_created_rule = InputRule(self.event_exists, "Invalid input. Event not yet created.")
-					reply_rule = InputRule(lambda v1: (v1 in ("yes","no","maybe")), "Invalid input. Use: yes, no, or maybe.")
-					if not event_created_rule.passes(event_name):
-						create_reply_response = event_created_rule.fail_msg
-					elif not reply_rule.passes(reply_status):
-						create_reply_response = reply_rule.fail_msg
-					else:
-						create_reply_response = self.create_reply(event_name, reply_status, reply_author)
-				else:
-					create_reply_response = "Invalid input: Too many parameters."
-			else:
-				create_reply_response = "Invalid input: Not enough inputs. Provide event name and reply status."
-
-			yield from self.send_message(message.channel, create_reply_response)
-
-		# !events command.
-		elif bot_command == '!events':
-			tokens = tokens[1:]
-			if tokens:
-				if len(tokens) == 1:
-					date = tokens[0].lower()
-
-					# Setup input rules to check inputs.
-					date_rule = InputRule(self.is_date, "Invalid date format. Use: YYYY-MM-DD i.e. 2017-01-01")
-					today_tomorrow_rule = InputRule(lambda x: x.lower() in ("today","tomorrow"), "Invalid day format. Use: today or tomorrow.")
-
-					if self.has_digit(date):
-						if not date_rule.passes(date):
-							create_events_response = date_rule.fail_msg
-						else:
-							all_events_str = self.format_events(self.get_data("Event","date", date))
-							create_events_response = all_events_str
-					else:
-						if not today_tomorrow_rule.passes(date):
-							create_events_response = today_tomorrow_rule.fail_msg
-						else:
-							date_ = datetime.now().strftime("%Y-%m-%d") if date == "today" else (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-							all_events_str = self.format_events(self.get_data("Event","date", date_))
-							create_events_response = all_events_str
-				else:
-					create_events_response = "Invalid input: Too many parameters."
-			else:
-				create_events_response = self.format_events(self.get_data("Event"))
+		started = time.perf_counter()
+		bot_command, arguments = split_command(message.content)
+		if bot_command not in self.commands:
+			return
+		profile = self.profiler.maybe_start()
+		tokens = tokenize(arguments)
+		parsed = time.perf_counter()
+
+		task = current_task()
+		timing = self.command_timings[task] = {"storage": 0.0}
+		try:
+			response = None
+			if self.commands[bot_command].get("event_name") and tokens:
+				tokens, response = yield from self.resolve_event_name(message, tokens)
+			if response is None:
+				response = yield from self.commands[bot_command]["handler"](message, tokens)
+		finally:
+			del self.command_timings[task]
+			if profile is not None:
+				self.profiler.stop(profile)
+		handled = time.perf_counter()
+
+		phases = {"parse": parsed - started, "storage": timing["storage"], "render": max(0, handled - parsed - timing["storage"])}
+		if response:
+			# The response is queued rather than waited for, so a slow channel doesn't hold the handler up.
+			# Its send phase is observed once the dispatcher has delivered it.
+			sent = self.dispatcher.enqueue(message.channel, response)
+			sent.add_done_callback(functools.partial(self.observe_send, bot_command, handled))
+		for phase, seconds in phases.items():
+			self.command_seconds.observe(seconds, command=bot_command, phase=phase)
+
+		elapsed = time.perf_counter() - started
+		if self.profiler.is_slow(elapsed):
+			yield from self.record_slow_command(message, bot_command, elapsed, phases, profile)
+
+	# Records the send phase of a command whose response went out. Called when the dispatcher's future is done.
+	def observe_send(self, bot_command, handled, future):
+		# Failures have been logged by the dispatcher already.
+		if not future.cancelled() and future.exception() is None:
+			self.command_seconds.observe(time.perf_counter() - handled, command=bot_command, phase="send")
+
+	# Writes a slow command to the profiler's file, together with the sizes of its guild's tables.
+	@asyncio.coroutine
+	def record_slow_command(self, message, bot_command, elapsed, phases, profile=None):
+		guild_id = self.get_partition_key(message)
+		sizes = yield from self.data.run(self.get_partition_sizes, guild_id)
+		self.profiler.record_slow({
+			"command": bot_command, "content": message.content, "guild_id": guild_id, "seconds": elapsed,
+			"phases": phases, "sizes": sizes
+		}, profile)
+
+	# !schedule command.
+	@asyncio.coroutine
+	def handle_schedule(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if len(tokens) > 6:
+			return "Invalid input: too many parameters."
+		elif len(tokens) < 5:
+			return "Invalid input: not enough inputs."
+
+		event_name = tokens[0]
+		event_date = tokens[1]
+		event_time = tokens[2]
+		event_timezone = tokens[3]
+		event_description = tokens[4]
+		event_author = message.author.name
+
+		parsed, errors = self.commands["!schedule"]["arguments"].check(tokens)
+		if errors:
+			return "\n".join(errors)
+		with (yield from self.lock_events(guild_id, event_name)):
+			return (yield from self.data.run(self.create_event, event_name, event_date, event_time, event_timezone, event_description, event_author, guild_id=guild_id, parsed=parsed))
+
+	# !reply command.
+	@asyncio.coroutine
+	def handle_reply(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if len(tokens) < 2:
+			return "Invalid input: Not enough inputs. Provide event name and reply status."
+		elif len(tokens) > 2:
+			return "Invalid input: Too many parameters."
+
+		event_name = tokens[0]
+		reply_author = message.author.name
+
+		parsed, errors = self.commands["!reply"]["arguments"].check(tokens)
+		with (yield from self.lock_events(guild_id, event_name)):
+			if not (yield from self.data.run(self.event_exists, event_name, guild_id=guild_id)):
+				errors.insert(0, "Invalid input. Event not yet created.")
+			if errors:
+				return "\n".join(errors)
+			return (yield from self.data.run(self.create_reply, event_name, parsed["status"], reply_author, guild_id=guild_id))
+
+	# !events command.
+	# Dates are the events' own local dates and every form is answered from the sorted start time index, one page at a time:
+	# the UTC range is widened by the largest time zone offset and the events in it are kept by their date field.
+	# !events, !events 2017-06-01, !events 2017-06, !events 2017-06-01..2017-06-30, !events today, !events week, !events next 5
+	# !events next shows the next page of the channel's last listing. !events archive 2017-06 lists the archived events of a month.
+	@asyncio.coroutine
+	def handle_events(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+		cursor_key = (guild_id, message.channel.id)
+
+		if not tokens:
+			return (yield from self.show_events_page(cursor_key, {"start": None, "end": None, "remaining": None}, guild_id))
+		elif len(tokens) > 2:
+			return "Invalid input: Too many parameters."
+
+		date = tokens[0].lower()
+		now = int(time.time())
+
+		# Pick the rule of the form used. Its argument is then parsed once by a rule compiled in validation.py.
+		argument = date
+		if date == "next":
+			if len(tokens) == 1:
+				if cursor_key not in self.event_cursors:
+					return "No more events to show."
+				return (yield from self.show_events_page(cursor_key, self.event_cursors[cursor_key], guild_id))
+			rule, argument = COUNT_RULE, tokens[1]
+		elif date == "archive":
+			if len(tokens) == 1:
+				return MONTH_RULE.fail_msg
+			rule, argument = MONTH_RULE, tokens[1]
+		elif len(tokens) > 1:
+			return "Invalid input: Too many parameters."
+		elif ".." in date:
+			rule = DATE_RANGE_RULE
+		elif self.has_digit(date):
+			rule = MONTH_RULE if date.count("-") == 1 else DATE_RULE
+		else:
+			rule = DAY_RULE
 
-			yield from self.send_message(message.channel, create_events_response)
+		try:
+			value = rule.parse(argument)
+		except ValueError:
+			return rule.fail_msg
+
+		if rule is COUNT_RULE:
+			return (yield from self.show_events_page(cursor_key, {"start": now, "end": None, "remaining": value}, guild_id))
+		elif rule is MONTH_RULE and date == "archive":
+			return (yield from self.show_events_page(cursor_key, {"start": None, "end": None, "remaining": None, "archive": value}, guild_id))
+		elif rule is MONTH_RULE:
+			start, end = month_range(value)
+		elif rule is DATE_RANGE_RULE:
+			start, end = value
+		elif rule is DATE_RULE:
+			start, end = value, value + SECONDS_PER_DAY
+		elif value == "week":
+			start, end = now, now + 7 * SECONDS_PER_DAY
+		else:
+			start, end = day_range(utc_date(now if value == "today" else now + SECONDS_PER_DAY))
 
-		elif bot_command == '!event':
-			tokens = tokens[1:]
-			if tokens:
-				tokens = self.handle_quotations(tokens)
+		if value == "week":
+			query = {"start": start, "end": end, "remaining": None}
+		else:
+			query = self.local_dates_query(start, end)
+		return (yield from self.show_events_page(cursor_key, query, guild_id))
 
-				if len(tokens) == 1:
-					event_name = tokens[0]
-					all_events = self.get_data("Event", "name", event_name)
-					all_replies = self.get_data("Reply", "event_name", event_name)
+	# Returns the !events query of the events whose local date falls in the days from start up to end, given as the
+	# UTC midnights of those dates. Their start times lie within MAX_TIMEZONE_OFFSET of that range.
+	def local_dates_query(self, start, end):
+		return {"start": start - MAX_TIMEZONE_OFFSET, "end": end + MAX_TIMEZONE_OFFSET, "remaining": None, "dates": (utc_date(start), utc_date(end))}
 
-					if len(all_events) > 0:
-						event_response = self.format_single_event(all_events[0], all_replies)
-					else:
-						event_response = "Invalid input: event not yet created."
-				else:
-					event_response = "Invalid input: Too many parameters."
-			else:
-				event_response = "Invalid input: no event name."
+	# Renders the page of events a query is at and moves the channel's cursor past it.
+	# The rendered page and the query of the page after it are cached until the guild's events change.
+	@asyncio.coroutine
+	def show_events_page(self, cursor_key, query, guild_id=None):
+		cache_key = self.render_cache.key(("events", guild_id) + tuple(sorted(query.items())), ("Event", guild_id))
+		cached = self.render_cache.get(cache_key)
+
+		if cached is None:
+			events, has_more = yield from self.data.run(self.get_events_page, query, guild_id=guild_id)
+			page = query.get("page", 1)
+			next_query = None
+			if has_more:
+				last = events[-1]
+				remaining = None if query.get("remaining") is None else query["remaining"] - len(events)
+				next_query = dict(query, after=(last["start_ts"], last.eid), page=page + 1, remaining=remaining)
+			cached = (self.format_events(events, page, has_more), next_query)
+			self.render_cache.put(cache_key, cached)
+
+		response, next_query = cached
+		if next_query:
+			self.event_cursors[cursor_key] = next_query
+		else:
+			self.event_cursors.pop(cursor_key, None)
+		return response
+
+	# !event command.
+	@asyncio.coroutine
+	def handle_event(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if not tokens:
+			return "Invalid input: no event name."
+		elif len(tokens) > 2:
+			return "Invalid input: Too many parameters."
+		elif len(tokens) == 2 and tokens[1].lower() != "summary":
+			return "Invalid input: Use !event \"Name\" summary for reply counts."
+
+		event_name = tokens[0]
+		summary = len(tokens) == 2
+		cache_key = self.render_cache.key(("event", guild_id, event_name, summary), ("Event", guild_id, event_name))
+		response = self.render_cache.get(cache_key)
+		if response is not None:
+			return response
+
+		# The replies come with the event as its RSVP aggregates, so rendering it is a single lookup.
+		all_events = yield from self.data.run(self.get_data, "Event", "name", event_name, guild_id=guild_id)
+
+		if len(all_events) > 0:
+			response = self.format_single_event(all_events[0], summary=summary)
+		else:
+			response = "Invalid input: event not yet created."
+		self.render_cache.put(cache_key, response)
+		return response
 
-			yield from self.send_message(message.channel, event_response)
+	# Resolves the event name a command starts with (see find_event_name), i.e. !reply "game night" yes runs as
+	# !reply "Game Night" yes. Returns the tokens to run the command with, and a "did you mean" response instead when the
+	# name matches no event but resembles some. Names that resemble nothing are left for the command to report.
+	@asyncio.coroutine
+	def resolve_event_name(self, message, tokens):
+		name, suggestions = yield from self.data.run(self.find_event_name, tokens[0], guild_id=self.get_partition_key(message))
+		if name is not None:
+			return [name] + tokens[1:], None
+		if suggestions:
+			return tokens, "Event {} does not exist. Did you mean {}?".format(tokens[0], " or ".join("\"{}\"".format(suggestion) for suggestion in suggestions))
+		return tokens, None
+
+	# !search command.
+	# !search night finds "Game Night" and "Night Raid", !search "Gmae Night" finds "Game Night".
+	@asyncio.coroutine
+	def handle_search(self, message, tokens):
+		if not tokens:
+			return "Invalid input: Provide the text to search for."
+
+		text = " ".join(tokens)
+		events = yield from self.data.run(self.search_events, text, self.events_page_size, guild_id=self.get_partition_key(message))
+		if not events:
+			return "No events match {}.".format(text)
+		return self.format_events(events)
+
+	# !availability command.
+	# !availability 2017-06-03 shows when anyone in the guild is busy that day and who with, !availability dave shows dave's
+	# free and busy windows over the next week, !availability dave 2017-06-03 just that day. Days can also be date
+	# ranges, today, tomorrow or week, like !events.
+	@asyncio.coroutine
+	def handle_availability(self, message, tokens):
+		if not tokens or len(tokens) > 2:
+			return "Invalid input: Use !availability <user>, !availability <date> or !availability <user> <date>."
+
+		now = int(time.time())
+		window = self.parse_availability_window(tokens[0], now)
+		user = None
+		if window is None or len(tokens) == 2:
+			user = tokens[0]
+			mentions = getattr(message, "mentions", None)
+			if user.startswith("<@") and mentions:
+				user = mentions[0].name
+			window = (now, now + AVAILABILITY_SECONDS) if len(tokens) == 1 else self.parse_availability_window(tokens[1], now)
+			if window is None:
+				return "Invalid input: Use a date (YYYY-MM-DD), a date range (YYYY-MM-DD..YYYY-MM-DD), today, tomorrow or week."
+
+		found = yield from self.data.run(self.get_availability, window[0], window[1], user, guild_id=self.get_partition_key(message))
+		return self.format_availability(found, user)
+
+	# Returns the (start, end) UTC timestamps a day argument of !availability stands for, or None if it isn't one.
+	def parse_availability_window(self, argument, now):
+		argument = argument.lower()
+		try:
+			if ".." in argument:
+				return DATE_RANGE_RULE.parse(argument)
+			elif self.has_digit(argument):
+				date_ts = DATE_RULE.parse(argument)
+				return date_ts, date_ts + SECONDS_PER_DAY
+			value = DAY_RULE.parse(argument)
+		except ValueError:
+			return None
+		if value == "week":
+			return now, now + 7 * SECONDS_PER_DAY
+		return day_range(utc_date(now if value == "today" else now + SECONDS_PER_DAY))
+
+	# !scheduler-bot command. (list commands)
+	# The help text is generated from self.commands, so new commands show up on their own.
+	@asyncio.coroutine
+	def handle_scheduler_bot(self, message, tokens):
+		if tokens:
+			return None
 
-		# !scheduler-bot command. (list commands)
-		elif bot_command == '!scheduler-bot' and len(tokens) == 1:
-			list_commands_response = "**COMMANDS**\n```"
-			for command in list(self.commands.keys()):
-				list_commands_response += "{}: \n\t {}\n\n".format(command, self.commands[command]["examples"][0])
-			list_commands_response += "```"
+		list_commands_response = "**COMMANDS**\n```"
+		for command in sorted(self.commands.keys()):
+			list_commands_response += "{}: \n\t {}\n\n".format(command, self.commands[command]["examples"][0])
+		list_commands_response += "```"
+		return list_commands_response
 
-			yield from self.send_message(message.channel, list_commands_response)
+	# !delete-event command.
+	@asyncio.coroutine
+	def handle_delete_event(self, message, tokens):
+		guild_id = self.get_partition_key(message)
 
-		# !delete-event command.
-		elif bot_command == '!delete-event':
-			tokens = tokens[1:]
-			if tokens:
-				tokens = self.handle_quotations(tokens)
+		if not tokens:
+			return "Invalid input: no event name."
+		elif len(tokens) > 1:
+			return "Invalid input: Too many parameters."
 
-				if len(tokens) == 1:
-					event_name = tokens[0]
-					reply_author = message.author.name
-					all_events = self.get_data("Event", "name", event_name)
+		event_name = tokens[0]
+		reply_author = message.author.name
+		with (yield from self.lock_events(guild_id, event_name)):
+			all_events = yield from self.data.run(self.get_data, "Event", "name", event_name, guild_id=guild_id)
 
-					if len(all_events) > 0:
-						delete_event_response = self.delete_event(event_name,reply_author)
-					else:
-						delete_event_response = "Invalid input: event not yet created."
-				else:
-					delete_event_response = "Invalid input: Too many parameters."
-			else:
-				delete_event_response = "Invalid input: no event name."
-
-			yield from self.send_message(message.channel, delete_event_response)
-
-		# !remind command.
-		# !remind OverwatchNight 2 days
-		elif bot_command == "!remind":
-			tokens = tokens[1:]
-			if tokens:
-				if len(tokens) < 3:
-					remind_response = "Invalid input: missing arguments."
-				else:	
-					tokens = self.handle_quotations(tokens)
-					event_table = self.db.table('Event')
-					reply_table = self.db.table('Reply')
-					if not event_table.search(Query().name == tokens[0]):
-						remind_response = "Invalid input: This event hasn\'t been scheduled yet."
-					elif not tokens[1].isdigit():
-						remind_response = "Invalid input: bad numeric."
-					elif not tokens[2] in ["minutes","hours","days"]:
-						remind_response = "Invalid input: did not use 'minutes','hours', or 'days'."
-					elif not reply_table.search((Query().author == message.author.name) & (Query().event_name == tokens[0])):
-						remind_response = "Invalid input: User has not replied 'yes' to the event."
-					else:
-						remind_response = self.create_reminder(tokens[0], message.author.name,  tokens[2], int(tokens[1]))
-			else:
-				remind_response = "Invalid input: no event name."
-			
-			yield from self.send_message(message.channel, remind_response)
-
-		# !edit-event command.
-		# !edit OverwatchNight date 1/6/17 time 5:30PM
-		# @TODO: InputRule for time and timezone.
-		elif bot_command == '!edit-event':
-			tokens = tokens[1:]
-			if tokens:
-				tokens = self.handle_quotations(tokens)
-				event_name = tokens[0]
-				event_author = message.author.name
-
-				if len(tokens) <= 1:
-					edit_event_response = "No fields given to edit."
-				else:
-					tokens = tokens[1:]
-
-					if len(tokens) % 2 == 0:
-						is_event_field_rule = InputRule(lambda x: x.lower() in self.get_field_names("Event"), "Field does not exist.")
-						date_rule = InputRule(self.is_date, "Invalid date format. Use: YYYY-MM-DD i.e. 2017-01-01")
-						time_rule = InputRule(self.is_time, "Invalid time format. Use: HH:MMPP i.e. 07:58PM")
-						timezone_rule = InputRule(self.is_timezone, "Invalid timezone abbreviation.")
-
-						field_values = {}
-						rule_fail = False
-						for p in range(0, len(tokens), 2):
-							if not is_event_field_rule.passes(tokens[p]):
-								return is_event_field_rule.fail_msg
-							else:
-								# @TODO Rulechecker would fix this awful redundancy.
-								if tokens[p] == "date":
-									if not date_rule.passes(tokens[p+1]):
-										edit_event_response = date_rule.fail_msg
-										rule_fail = True
-										break
-								elif tokens[p] == "time":
-									if not time_rule.passes(tokens[p+1]):
-										edit_event_response = time_rule.fail_msg
-										rule_fail = True
-										break
-								elif tokens[p] == "timezone":
-									if not timezone_rule.passes(tokens[p+1]):
-										edit_event_response = timezone_rule.fail_msg
-										rule_fail = True
-										break
-
-								field_values[tokens[p]] = tokens[p+1]
-
-						if not rule_fail:
-							edit_event_response = self.edit_event(event_name, event_author, field_values)
-					else: edit_event_response = "Invalid input: incorrect number of parameters."
-			else:
-				edit_event_response = "Invalid input: no event name."
+			if len(all_events) > 0:
+				return (yield from self.data.run(self.delete_event, event_name, reply_author, guild_id=guild_id))
+		return "Invalid input: event not yet created."
+
+	# !remind command.
+	# !remind OverwatchNight 2 days
+	@asyncio.coroutine
+	def handle_remind(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if not tokens:
+			return "Invalid input: no event name."
+		elif len(tokens) < 3:
+			return "Invalid input: missing arguments."
+
+		parsed, errors = self.commands["!remind"]["arguments"].check(tokens)
+		with (yield from self.lock_events(guild_id, tokens[0])):
+			events = yield from self.data.run(self.get_data, "Event", name=tokens[0], guild_id=guild_id)
+			if not events:
+				errors.insert(0, "Invalid input: This event hasn\'t been scheduled yet.")
+			elif message.author.name not in (events[0].get("rsvps") or {}):
+				errors.append("Invalid input: User has not replied 'yes' to the event.")
+			if errors:
+				return "\n".join(errors)
+			return (yield from self.data.run(self.create_reminder, tokens[0], message.author.name, parsed["time_metric"], parsed["diff_value"], message.author.id, guild_id=guild_id))
+
+	# !profile command. (admins only)
+	# !profile on 0.1 profiles a tenth of the commands, !profile off stops, !profile slow 1.5 sets the slow command threshold.
+	# !profile on its own shows the current settings.
+	@asyncio.coroutine
+	def handle_profile(self, message, tokens):
+		if not self.is_admin(message):
+			return "You do not have permission to use this command."
+
+		action = tokens[0].lower() if tokens else "status"
+		try:
+			if action == "on":
+				self.profiler.sample_rate = RATE_RULE.parse(tokens[1]) if len(tokens) > 1 else 0.1
+			elif action == "off":
+				self.profiler.sample_rate = 0.0
+			elif action == "slow" and len(tokens) > 1:
+				self.profiler.slow_seconds = SECONDS_RULE.parse(tokens[1])
+			elif action != "status":
+				return "Invalid input: Use: !profile on 0.1, !profile off or !profile slow 1.5"
+		except ValueError:
+			return RATE_RULE.fail_msg if action == "on" else SECONDS_RULE.fail_msg
+
+		stats = self.profiler.stats()
+		return "Profiling {} of commands. Commands slower than {}s are written to {}. Sampled: {}, slow: {}.".format(
+			"{:.0%}".format(stats["sample_rate"]) if stats["sample_rate"] else "none", stats["slow_seconds"],
+			self.profiler.path, stats["sampled"], stats["slow"])
+
+	# !edit-event command.
+	# !edit OverwatchNight date 2017-01-06 time 5:30PM
+	@asyncio.coroutine
+	def handle_edit_event(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if not tokens:
+			return "Invalid input: no event name."
 
-			yield from self.send_message(message.channel, edit_event_response)
+		event_name = tokens[0]
+		event_author = message.author.name
+
+		if len(tokens) <= 1:
+			return "No fields given to edit."
+
+		tokens = tokens[1:]
+		if len(tokens) % 2 != 0:
+			return "Invalid input: incorrect number of parameters."
+
+		field_values, parsed, errors = self.commands["!edit-event"]["arguments"].check_pairs(tokens, EVENT_FIELD_RULE, EVENT_FIELD_RULES)
+		if errors:
+			return "\n".join(errors)
+		# A rename also locks the new name, so no event can be scheduled under it meanwhile.
+		with (yield from self.lock_events(guild_id, event_name, field_values.get("name", event_name))):
+			return (yield from self.data.run(self.edit_event, event_name, event_author, field_values, guild_id=guild_id, parsed=parsed))
+
+	# !repeat command.
+	# !repeat "Game Night" weekly, !repeat "Game Night" weekly until 2017-12-31, !repeat "Game Night" monthly count 6
+	@asyncio.coroutine
+	def handle_repeat(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if len(tokens) < 2:
+			return "Invalid input: Provide an event name and weekly, biweekly or monthly."
+		elif len(tokens) not in (2, 4):
+			return "Invalid input: incorrect number of parameters."
+
+		parsed, errors = self.commands["!repeat"]["arguments"].check(tokens[:2])
+		_, ends, end_errors = self.commands["!repeat"]["arguments"].check_pairs(tokens[2:], REPEAT_END_RULE, REPEAT_END_RULES)
+		errors.extend(end_errors)
+		if errors:
+			return "\n".join(errors)
+		with (yield from self.lock_events(guild_id, tokens[0])):
+			return (yield from self.data.run(self.repeat_event, tokens[0], message.author.name, parsed["rule"],
+				until_ts=ends.get("until"), count=ends.get("count"), guild_id=guild_id))
+
+	# !skip command.
+	# !skip "Game Night" 2017-06-08 cancels the occurrence of that date only.
+	@asyncio.coroutine
+	def handle_skip(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if len(tokens) != 2:
+			return "Invalid input: Provide an event name and the date to skip."
+
+		parsed, errors = self.commands["!skip"]["arguments"].check(tokens)
+		if errors:
+			return "\n".join(errors)
+		with (yield from self.lock_events(guild_id, tokens[0])):
+			return (yield from self.data.run(self.set_occurrence_exception, tokens[0], message.author.name, parsed["date"], guild_id=guild_id))
+
+	# !move command.
+	# !move "Game Night" 2017-06-08 2017-06-09 07:30PM moves the occurrence of that date only, in the event's time zone.
+	@asyncio.coroutine
+	def handle_move(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if len(tokens) != 4:
+			return "Invalid input: Provide an event name, the date to move and the new date and time."
+
+		parsed, errors = self.commands["!move"]["arguments"].check(tokens)
+		if errors:
+			return "\n".join(errors)
+		# The new start time is worked out from the event's time zone, which can't change before the exception is stored.
+		with (yield from self.lock_events(guild_id, tokens[0])):
+			events = yield from self.data.run(self.get_data, "Event", "name", tokens[0], guild_id=guild_id)
+			if not events:
+				return "Event {} does not exist.".format(tokens[0])
+			moved = {
+				"start_ts": event_timestamp(parsed["new_date"], parsed["new_time"], recurrence.tz_offset(events[0])),
+				"date": tokens[2], "time": tokens[3].upper()
+			}
+			return (yield from self.data.run(self.set_occurrence_exception, tokens[0], message.author.name, parsed["date"], moved, guild_id=guild_id))
+
+	# !import command. (admins only)
+	# Imports the events or replies of the .csv or .ics file attached to the message, see importer.py for the columns.
+	# The file is read as a stream and written a chunk at a time, so commands keep being answered during a long import.
+	@asyncio.coroutine
+	def handle_import(self, message, tokens):
+		guild_id = self.get_partition_key(message)
+
+		if not self.is_admin(message):
+			return "You do not have permission to use this command."
+		elif not message.attachments:
+			return "Invalid input: Attach a .csv or .ics file to import."
+
+		attachment = message.attachments[0]
+		extension = os.path.splitext(attachment["filename"])[1].lower()
+		if extension not in (".csv", ".ics"):
+			return "Invalid input: Only .csv and .ics files can be imported."
+
+		descriptor, path = tempfile.mkstemp(suffix=extension)
+		os.close(descriptor)
+		try:
+			yield from self.download_attachment(attachment, path)
+			# Only the first errors are listed, so the report fits in one message.
+			importer = Importer(message.author.name, max_errors=15)
+			rows = chunks(read_file(path), importer.chunk_size)
+			while (yield from self.data.run(self.import_next_chunk, importer, rows, guild_id=guild_id)):
+				pass
+		finally:
+			os.remove(path)
+		return importer.report()
@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+
+# Bounded LRU cache of rendered command responses.
+# Every entry is keyed by its query plus the versions of the scopes it was rendered from, i.e. the events table of a
+# guild or a single event. Writes bump the versions of the scopes they touch, so entries rendered from older data stop
+# matching and age out of the LRU, while entries of untouched scopes keep being served.
+# Versions are bumped from the storage writer thread and read on the event loop, so everything is guarded by a lock.
+class RenderCache:
+	def __init__(self, capacity=256):
+		self.capacity = capacity
+		self.entries = OrderedDict()
+		self.versions = {}
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	# Returns the current version of a scope, i.e. ("Event", guild_id) or ("Event", guild_id, "Game Night").
+	def version(self, scope):
+		with self.lock:
+			return self.versions.get(scope, 0)
+
+	# Invalidates every entry rendered from the given scopes.
+	def bump(self, *scopes):
+		with self.lock:
+			for scope in scopes:
+				self.versions[scope] = self.versions.get(scope, 0) + 1
+
+	# Builds the key of a query rendered from the given scopes, tagged with their current versions.
+	def key(self, query, *scopes):
+		with self.lock:
+			return (query,) + tuple(self.versions.get(scope, 0) for scope in scopes)
+
+	# Returns the cached value of a key, or None on a miss.
+	def get(self, key):
+		with self.lock:
+			if key in self.entries:
+				self.entries.move_to_end(key)
+				self.hits += 1
+				return self.entries[key]
+			self.misses += 1
+			return None
+
+	def put(self, key, value):
+		with self.lock:
+			self.entries[key] = value
+			self.entries.move_to_end(key)
+			while len(self.entries) > self.capacity:
+				self.entries.popitem(last=False)
+				self.evictions += 1
+
+	def stats(self):
+		with self.lock:
+			lookups = self.hits + self.misses
+			return {
+				"size": len(self.entries),
+				"capacity": self.capacity,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"hit_rate": self.hits / lookups if lookups else 0.0
+			}
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+# Index of the members the bot can see, by id and by name.
+# Seeded from the client whenever it connects and then kept current from the member join/update/leave events.
+# Those come once per guild, so the index counts the guilds every user shares with the bot and only forgets a user
+# who left the last of them.
+class MemberIndex:
+	def __init__(self):
+		self.by_id = {}
+		self.by_name = {}
+		self.guild_counts = {}
+
+	def _index(self, member):
+		self.by_id[member.id] = member
+		self.by_name[member.name] = member
+
+	def _unindex(self, member):
+		self.by_id.pop(member.id, None)
+		if member.name in self.by_name and self.by_name[member.name].id == member.id:
+			del self.by_name[member.name]
+
+	def add(self, member):
+		self.guild_counts[member.id] = self.guild_counts.get(member.id, 0) + 1
+		self._index(member)
+
+	def remove(self, member):
+		count = self.guild_counts.pop(member.id, 0) - 1
+		if count > 0:
+			self.guild_counts[member.id] = count
+		else:
+			self._unindex(member)
+
+	def update(self, before, after):
+		self._unindex(before)
+		self._index(after)
+
+	# Replaces the index with members, one per guild membership like Client.get_all_members() returns them.
+	def load(self, members):
+		self.by_id = {}
+		self.by_name = {}
+		self.guild_counts = {}
+		for member in members:
+			self.add(member)
+
+	# Returns the member for a user id or name, or None if the bot can't see them.
+	def find(self, member_id=None, name=None):
+		if member_id is not None and member_id in self.by_id:
+			return self.by_id[member_id]
+		return self.by_name.get(name)
+
+	def __len__(self):
+		return len(self.by_id)
+
+# Sends messages concurrently, with at most limit sends in flight at once.
+# jobs is a list of (destination, content, key) tuples. Returns the keys of the messages that were sent.
+@asyncio.coroutine
+def send_all(send, jobs, limit=10):
+	semaphore = asyncio.Semaphore(limit)
+
+	@asyncio.coroutine
+	def send_one(destination, content, key):
+		yield from semaphore.acquire()
+		try:
+			yield from send(destination, content)
+		finally:
+			semaphore.release()
+		return key
+
+	results = yield from asyncio.gather(*[send_one(*job) for job in jobs], return_exceptions=True)
+	for result in results:
+		if isinstance(result, Exception):
+			log.warning("failed to send message error=%s", result)
+	return [result for result in results if not isinstance(result, Exception)]
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Priority lanes of the outbound queue. Lower lanes are sent first.
+PRIORITY_COMMAND = 0
+PRIORITY_REMINDER = 1
+
+# Discord won't accept messages longer than this.
+MAX_MESSAGE_LENGTH = 2000
+
+# Token bucket that allows rate tokens per second, with bursts of up to capacity tokens.
+class TokenBucket:
+	def __init__(self, rate, capacity, clock=time.monotonic):
+		self.rate = rate
+		self.capacity = capacity
+		self.clock = clock
+		self.tokens = capacity
+		self.updated = clock()
+		self.blocked_until = 0
+
+	def _refill(self):
+		now = self.clock()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+		return now
+
+	# Returns how many seconds until a token is available. 0 means one can be taken now.
+	def delay(self):
+		now = self._refill()
+		if now < self.blocked_until:
+			return self.blocked_until - now
+		if self.tokens >= 1:
+			return 0
+		return (1 - self.tokens) / self.rate
+
+	def take(self):
+		self._refill()
+		self.tokens -= 1
+
+	# Holds the bucket empty for a number of seconds, i.e. after Discord answered with a 429.
+	def block(self, seconds):
+		self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+# Returns whether an exception raised while sending is Discord telling us to slow down.
+def is_rate_limited(e):
+	status = getattr(e, "status", None) or getattr(getattr(e, "response", None), "status", None)
+	return status == 429
+
+# Returns whether sending again might work after an exception: rate limits and server errors.
+def is_retryable(e):
+	status = getattr(e, "status", None) or getattr(getattr(e, "response", None), "status", None)
+	return status == 429 or (status is not None and status >= 500)
+
+# A message waiting in the outbound queue.
+class OutboundMessage:
+	def __init__(self, destination, content, priority, enqueued):
+		self.destination = destination
+		self.content = content
+		self.priority = priority
+		self.enqueued = enqueued
+		self.future = asyncio.Future()
+
+	@property
+	def key(self):
+		return getattr(self.destination, "id", self.destination)
+
+# Outbound queue that every message of the bot goes through.
+# Sends are paced by a global and a per-channel token bucket, command replies go ahead of reminder DMs,
+# rate limited or failed sends are retried with backoff, and consecutive messages to the same channel
+# are joined into one message when they fit under Discord's length limit.
+class MessageDispatcher:
+	def __init__(self, send, global_rate=50, channel_rate=1, channel_burst=5, max_retries=5, backoff=0.5):
+		# Coroutine function that actually sends a message, i.e. discord.Client.send_message.
+		self.send_message = send
+		self.global_bucket = TokenBucket(global_rate, global_rate)
+		self.channel_rate = channel_rate
+		self.channel_burst = channel_burst
+		self.channel_buckets = {}
+		self.max_retries = max_retries
+		self.backoff = backoff
+
+		self.lanes = {PRIORITY_COMMAND: deque(), PRIORITY_REMINDER: deque()}
+		self.busy = set()
+		# Deliveries in flight, cancelled together with the run loop.
+		self.deliveries = set()
+		self.wakeup = asyncio.Event()
+
+		self.sent = 0
+		self.coalesced = 0
+		self.retries = 0
+		self.rate_limited = 0
+		self.failed = 0
+		self.dispatched = 0
+		self.total_wait = 0.0
+		self.max_wait = 0.0
+
+	def _channel_bucket(self, key):
+		if key not in self.channel_buckets:
+			self.channel_buckets[key] = TokenBucket(self.channel_rate, self.channel_burst)
+		return self.channel_buckets[key]
+
+	# Queues a message without waiting for it to be sent. Returns a future with the result of the send.
+	def enqueue(self, destination, content, priority=PRIORITY_COMMAND):
+		message = OutboundMessage(destination, content, priority, time.monotonic())
+		message.future.add_done_callback(self._log_failure)
+		self.lanes[priority].append(message)
+		self.wakeup.set()
+		return message.future
+
+	# Queues a message and waits until it has been sent.
+	@asyncio.coroutine
+	def send(self, destination, content, priority=PRIORITY_COMMAND):
+		return (yield from self.enqueue(destination, content, priority))
+
+	def _log_failure(self, future):
+		if not future.cancelled() and future.exception():
+			log.warning("failed to send message error=%s", future.exception())
+
+	# Finds the first message that can be sent right now and takes it off its lane,
+	# together with the messages to the same channel that can be joined to it.
+	# Returns (messages, None), or (None, seconds to wait) when nothing can be sent yet.
+	def _next_ready(self):
+		global_delay = self.global_bucket.delay()
+		if global_delay > 0:
+			return None, global_delay
+
+		wait = None
+		seen = set()
+		for priority in sorted(self.lanes):
+			lane = self.lanes[priority]
+			for position, message in enumerate(lane):
+				key = message.key
+				if key in seen or key in self.busy:
+					seen.add(key)
+					continue
+				seen.add(key)
+
+				delay = self._channel_bucket(key).delay()
+				if delay > 0:
+					wait = delay if wait is None else min(wait, delay)
+					continue
+
+				del lane[position]
+				return [message] + self._coalesce(lane, position, message), None
+		return None, wait
+
+	# Takes the messages queued after first to the same channel off the lane for as long as they fit into one message.
+	def _coalesce(self, lane, position, first):
+		messages = []
+		length = len(first.content)
+		while position < len(lane):
+			message = lane[position]
+			if message.key != first.key:
+				position += 1
+				continue
+			if length + 1 + len(message.content) > MAX_MESSAGE_LENGTH:
+				break
+			length += 1 + len(message.content)
+			messages.append(message)
+			del lane[position]
+		self.coalesced += len(messages)
+		return messages
+
+	@asyncio.coroutine
+	def run(self):
+		try:
+			while True:
+				messages, wait = self._next_ready()
+				if messages is None:
+					self.wakeup.clear()
+					try:
+						yield from asyncio.wait_for(self.wakeup.wait(), wait)
+					except asyncio.TimeoutError:
+						pass
+					continue
+
+				key = messages[0].key
+				self.global_bucket.take()
+				self._channel_bucket(key).take()
+				self.busy.add(key)
+
+				now = time.monotonic()
+				self.dispatched += len(messages)
+				for message in messages:
+					self.total_wait += now - message.enqueued
+					self.max_wait = max(self.max_wait, now - message.enqueued)
+				delivery = asyncio.ensure_future(self._deliver(messages))
+				self.deliveries.add(delivery)
+				delivery.add_done_callback(self.deliveries.discard)
+		finally:
+			deliveries = list(self.deliveries)
+			for delivery in deliveries:
+				delivery.cancel()
+			if deliveries:
+				yield from asyncio.wait(deliveries)
+
+	@asyncio.coroutine
+	def _deliver(self, messages):
+		destination = messages[0].destination
+		content = "\n".join(message.content for message in messages)
+		key = messages[0].key
+		try:
+			for attempt in range(self.max_retries + 1):
+				try:
+					result = yield from self.send_message(destination, content)
+				except Exception as e:
+					if not is_retryable(e) or attempt == self.max_retries:
+						self.failed += len(messages)
+						for message in messages:
+							if not message.future.done():
+								message.future.set_exception(e)
+						return
+
+					self.retries += 1
+					wait = getattr(e, "retry_after", None) or self.backoff * (2 ** attempt)
+					if is_rate_limited(e):
+						self.rate_limited += 1
+						self._channel_bucket(key).block(wait)
+					yield from asyncio.sleep(wait)
+				else:
+					self.sent += len(messages)
+					for message in messages:
+						if not message.future.done():
+							message.future.set_result(result)
+					return
+		finally:
+			self.busy.discard(key)
+			self.wakeup.set()
+
+	# Returns the numbers that show how the queue is doing.
+	def stats(self):
+		return {
+			"queue_depth": sum(len(lane) for lane in self.lanes.values()),
+			"queue_depth_commands": len(self.lanes[PRIORITY_COMMAND]),
+			"queue_depth_reminders": len(self.lanes[PRIORITY_REMINDER]),
+			"in_flight": len(self.busy),
+			"sent": self.sent,
+			"failed": self.failed,
+			"coalesced": self.coalesced,
+			"retries": self.retries,
+			"rate_limited": self.rate_limited,
+			"average_wait": self.total_wait / self.dispatched if self.dispatched else 0.0,
+			"max_wait": self.max_wait
+		}
@@ -0,0 +1,337 @@
+import argparse
+import csv
+import logging
+import os
+import re
+import sys
+import time
+from itertools import islice
+
+from SchedulerBot import recurrence
+from SchedulerBot.index import IndexedStorage
+from SchedulerBot.partitions import directory_factory
+from SchedulerBot.records import new_event_record, new_reply_record, rsvp_fields, updated_rsvps
+from SchedulerBot.storage import open_storage
+from SchedulerBot.timeutil import TIMEZONE_OFFSETS, SECONDS_PER_DAY, to_utc_timestamp, format_duration
+from SchedulerBot.validation import (InputRuleChecker, SCHEDULE_SCHEMA, REPLY_SCHEMA, RECURRENCE_RULE, REPEAT_END_RULES,
+	DURATION_RULE, event_timestamp)
+
+log = logging.getLogger(__name__)
+
+# Bulk import of events and replies from CSV and iCalendar files.
+# Files are parsed as a stream of rows, and rows are checked with the rules of !schedule and !reply and written a chunk
+# at a time, each chunk in one storage batch. Memory stays flat however long the file is, apart from the error report.
+#
+# CSV files have a header row. Event files have the columns name, date, time, timezone and description, optionally
+# author, duration and repeat, until and count (see !repeat). Reply files have the columns event_name, status and author.
+# iCalendar files give one event per VEVENT, with its ATTENDEEs as replies.
+#
+# Usage: python -m SchedulerBot.importer events.csv --database db.json --guild 1234 --author dave
+# Run it while the bot is stopped, since the bot keeps its storage in memory.
+
+# How iCalendar attendee statuses map to reply statuses.
+PARTSTAT_STATUS = {"ACCEPTED": "yes", "DECLINED": "no", "TENTATIVE": "maybe"}
+
+# How iCalendar repeat rules map to !repeat rules, by FREQ and INTERVAL.
+RRULE_RULES = {("WEEKLY", "1"): "weekly", ("WEEKLY", "2"): "biweekly", ("MONTHLY", "1"): "monthly"}
+
+# Yields (line, kind, fields) for every row of a CSV file, kind being "event" or "reply" depending on the header.
+def read_csv(lines):
+	reader = csv.DictReader(lines)
+	kind = "reply" if reader.fieldnames and "status" in reader.fieldnames else "event"
+	for row in reader:
+		yield reader.line_num, kind, {field: (value or "").strip() for field, value in row.items() if field}
+
+# Undoes the escaping of an iCalendar text value.
+def _ics_text(value):
+	return value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+# Splits an unfolded iCalendar content line into its name, parameters and value.
+# i.e. 'ATTENDEE;CN="Dave";PARTSTAT=ACCEPTED:mailto:dave@example.com' -> ("ATTENDEE", {"CN": "Dave", "PARTSTAT": "ACCEPTED"}, "mailto:...")
+def _ics_line(line):
+	quoted = False
+	for position, char in enumerate(line):
+		if char == "\"":
+			quoted = not quoted
+		elif char == ":" and not quoted:
+			break
+	else:
+		return None, {}, ""
+	head, value = line[:position], line[position + 1:]
+	parts = head.split(";")
+	params = {}
+	for part in parts[1:]:
+		key, _, param = part.partition("=")
+		params[key.upper()] = param.strip("\"")
+	return parts[0].upper(), params, value
+
+# Turns a DTSTART (or DTEND) into the date, time and time zone !schedule takes.
+# UTC times ("...Z") are in UTC, TZID has to be a known time zone abbreviation and dates without a time start at midnight.
+def _ics_start(params, value, name="DTSTART"):
+	timezone = params.get("TZID", "UTC")
+	if value.endswith("Z"):
+		value, timezone = value[:-1], "UTC"
+	if timezone not in TIMEZONE_OFFSETS:
+		raise ValueError("Unknown time zone {}.".format(timezone))
+	try:
+		start = time.strptime(value, "%Y%m%dT%H%M%S" if "T" in value else "%Y%m%d")
+	except ValueError:
+		raise ValueError("Invalid {} {}.".format(name, value))
+	return time.strftime("%Y-%m-%d", start), time.strftime("%I:%M%p", start), timezone
+
+ICS_DURATION_PATTERN = re.compile(r"^P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+# Turns a DURATION, i.e. "PT1H30M", into the duration !schedule takes, i.e. "1h30m". Seconds are dropped.
+def _ics_duration(value):
+	match = ICS_DURATION_PATTERN.match(value.upper())
+	if not match:
+		raise ValueError("Invalid DURATION {}.".format(value))
+	weeks, days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+	return format_duration((weeks * 7 + days) * SECONDS_PER_DAY + hours * 3600 + minutes * 60)
+
+# Turns an RRULE into the repeat, until and count fields of an event row.
+def _ics_repeat(value):
+	parts = dict(part.partition("=")[::2] for part in value.upper().split(";"))
+	rule = RRULE_RULES.get((parts.get("FREQ"), parts.get("INTERVAL", "1")))
+	if rule is None:
+		raise ValueError("Unsupported RRULE {}.".format(value))
+	fields = {"repeat": rule}
+	if "UNTIL" in parts:
+		fields["until"] = "{}-{}-{}".format(parts["UNTIL"][:4], parts["UNTIL"][4:6], parts["UNTIL"][6:8])
+	if "COUNT" in parts:
+		fields["count"] = parts["COUNT"]
+	return fields
+
+# Yields (line, kind, fields) for every VEVENT of an iCalendar file and for each of its attendees that replied.
+# Folded lines are unfolded on the fly, so only one event is held at a time.
+def read_ics(lines):
+	def unfolded():
+		current, current_line = None, 0
+		for number, line in enumerate(lines, 1):
+			line = line.rstrip("\r\n")
+			if line[:1] in (" ", "\t") and current is not None:
+				current += line[1:]
+				continue
+			if current is not None:
+				yield current_line, current
+			current, current_line = line, number
+		if current is not None:
+			yield current_line, current
+
+	event = None
+	for number, line in unfolded():
+		name, params, value = _ics_line(line)
+		if name == "BEGIN" and value.upper() == "VEVENT":
+			event = {"line": number, "fields": {"description": ""}, "replies": [], "error": None, "end": None}
+		elif event is None:
+			continue
+		elif name == "END" and value.upper() == "VEVENT":
+			# A DTEND gives the duration once DTSTART is known too, whichever came first.
+			fields = event["fields"]
+			if event["end"] and "date" in fields and not fields.get("duration"):
+				seconds = to_utc_timestamp(*event["end"]) - to_utc_timestamp(fields["date"], fields["time"], fields["timezone"])
+				if seconds >= 60:
+					fields["duration"] = format_duration(seconds)
+			if event["error"]:
+				yield event["line"], "error", {"error": event["error"]}
+			else:
+				yield event["line"], "event", event["fields"]
+				for reply in event["replies"]:
+					reply["event_name"] = event["fields"].get("name", "")
+					yield event["line"], "reply", reply
+			event = None
+		else:
+			try:
+				if name == "SUMMARY":
+					event["fields"]["name"] = _ics_text(value).strip()
+				elif name == "DESCRIPTION":
+					event["fields"]["description"] = _ics_text(value)
+				elif name == "DTSTART":
+					event["fields"]["date"], event["fields"]["time"], event["fields"]["timezone"] = _ics_start(params, value)
+				elif name == "DTEND":
+					event["end"] = _ics_start(params, value, name)
+				elif name == "DURATION":
+					event["fields"]["duration"] = _ics_duration(value)
+				elif name == "ORGANIZER" and params.get("CN"):
+					event["fields"]["author"] = params["CN"]
+				elif name == "RRULE":
+					event["fields"].update(_ics_repeat(value))
+				elif name == "ATTENDEE" and params.get("CN") and params.get("PARTSTAT", "").upper() in PARTSTAT_STATUS:
+					event["replies"].append({"author": params["CN"], "status": PARTSTAT_STATUS[params["PARTSTAT"].upper()]})
+			except ValueError as error:
+				event["error"] = event["error"] or str(error)
+
+# Yields the rows of a .csv or .ics file.
+def read_file(path):
+	with open(path, newline="", encoding="utf-8-sig") as import_file:
+		if os.path.splitext(path)[1].lower() in (".ics", ".ical", ".ifb"):
+			yield from read_ics(import_file)
+		else:
+			yield from read_csv(import_file)
+
+# Yields the rows in lists of up to size rows.
+def chunks(rows, size):
+	rows = iter(rows)
+	while True:
+		chunk = list(islice(rows, size))
+		if not chunk:
+			return
+		yield chunk
+
+# Writes imported rows into a storage and keeps count of what happened to them.
+# Rows without an author get author. Events whose name is taken and replies to events that don't exist are errors;
+# a reply by someone who already replied updates their status, like !reply does.
+# At most max_errors errors are kept for the report, the rest are only counted.
+class Importer:
+	def __init__(self, author, chunk_size=1000, max_errors=100):
+		self.author = author
+		self.chunk_size = chunk_size
+		self.max_errors = max_errors
+		self.schedule_checker = InputRuleChecker(SCHEDULE_SCHEMA)
+		self.reply_checker = InputRuleChecker(REPLY_SCHEMA)
+		self.events = 0
+		self.replies = 0
+		self.errors = []
+		self.error_count = 0
+
+	def error(self, line, message):
+		self.error_count += 1
+		if len(self.errors) < self.max_errors:
+			self.errors.append((line, message))
+
+	# Returns the event record of a row, or None after reporting why it can't be imported.
+	# @param: names holds the event names of the chunk so far.
+	def event_record(self, storage, line, fields, names):
+		args = [fields.get(name, "") for name, rule in SCHEDULE_SCHEMA]
+		parsed, errors = self.schedule_checker.check(args)
+		name = parsed.get("name")
+		if not name:
+			errors.insert(0, "Missing event name.")
+		elif name in names or storage.search("Event", name=name):
+			errors.insert(0, "Event {} already created.".format(name))
+
+		duration = None
+		if fields.get("duration"):
+			try:
+				duration = DURATION_RULE.parse(fields["duration"])
+			except ValueError:
+				errors.append(DURATION_RULE.fail_msg)
+
+		repeat = {}
+		if fields.get("repeat"):
+			try:
+				repeat["rule"] = RECURRENCE_RULE.parse(fields["repeat"])
+			except ValueError:
+				errors.append(RECURRENCE_RULE.fail_msg)
+			for end in ("until", "count"):
+				if fields.get(end):
+					try:
+						repeat[end] = REPEAT_END_RULES[end].parse(fields[end])
+					except ValueError:
+						errors.append(REPEAT_END_RULES[end].fail_msg)
+		if errors:
+			self.error(line, " ".join(errors))
+			return None
+
+		start_ts = event_timestamp(parsed["date"], parsed["time"], parsed["timezone"])
+		record = new_event_record(name, args[1], args[2], args[3], args[4], fields.get("author") or self.author, start_ts, duration)
+		if repeat:
+			record.update(recurrence.series_fields(record, repeat["rule"], start_ts, repeat.get("until"), repeat.get("count")))
+		return record
+
+	# Returns the (event_name, status, author) of a reply row, or None after reporting why it can't be imported.
+	def reply_values(self, storage, line, fields, names):
+		parsed, errors = self.reply_checker.check([fields.get(name, "") for name, rule in REPLY_SCHEMA])
+		event_name = parsed.get("event_name")
+		if not event_name:
+			errors.insert(0, "Missing event name.")
+		elif event_name not in names and not storage.search("Event", name=event_name):
+			errors.insert(0, "Event {} not yet created.".format(event_name))
+		if errors:
+			self.error(line, " ".join(errors))
+			return None
+		return event_name, parsed["status"], fields.get("author") or self.author
+
+	# Imports one chunk of rows in a single storage batch. Returns the names of the events that were created or replied to.
+	def import_chunk(self, storage, rows):
+		events = []
+		names = set()
+		replies = {}
+		for line, kind, fields in rows:
+			if kind == "error":
+				self.error(line, fields["error"])
+			elif kind == "event":
+				record = self.event_record(storage, line, fields, names)
+				if record:
+					record.update(rsvp_fields([]))
+					events.append(record)
+					names.add(record["name"])
+			else:
+				values = self.reply_values(storage, line, fields, names)
+				if values:
+					replies[(values[0], values[2])] = values[1]
+
+		with storage.batch():
+			if events:
+				storage.insert_multiple("Event", events)
+			new_replies = []
+			for (event_name, author), status in replies.items():
+				existing = storage.search("Reply", event_name=event_name, author=author)
+				if existing:
+					storage.update_ids("Reply", [reply.eid for reply in existing], {"status": status})
+				else:
+					new_replies.append(new_reply_record(event_name, status, author))
+			if new_replies:
+				storage.insert_multiple("Reply", new_replies)
+
+			# Each event's RSVP aggregates are rewritten once per chunk, however many of its replies the chunk holds.
+			statuses = {}
+			for (event_name, author), status in replies.items():
+				statuses.setdefault(event_name, {})[author] = status
+			for event_name, event_statuses in statuses.items():
+				for event in storage.search("Event", name=event_name):
+					storage.update_ids("Event", [event.eid], updated_rsvps(event, event_statuses))
+
+		self.events += len(events)
+		self.replies += len(replies)
+		log.info("imported chunk rows=%s events=%s replies=%s errors=%s", len(rows), len(events), len(replies), self.error_count)
+		return names | set(event_name for event_name, author in replies)
+
+	# Imports every row into storage. Returns the report.
+	def run(self, storage, rows):
+		for chunk in chunks(rows, self.chunk_size):
+			self.import_chunk(storage, chunk)
+		return self.report()
+
+	# Sums up the import, with the errors that were kept.
+	def report(self):
+		lines = ["Imported {} events and {} replies. {} rows failed.".format(self.events, self.replies, self.error_count)]
+		lines.extend("Line {}: {}".format(line, message) for line, message in self.errors)
+		if self.error_count > len(self.errors):
+			lines.append("... and {} more errors.".format(self.error_count - len(self.errors)))
+		return "\n".join(lines)
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Imports events and replies from a CSV or iCalendar file into SchedulerBot's storage.")
+	parser.add_argument("path", help="The .csv or .ics file to import.")
+	parser.add_argument("--database", default="db.json", help="The bot's database file.")
+	parser.add_argument("--guild", help="The id of the server to import into. Leave it out to import into the database file itself.")
+	parser.add_argument("--guilds-directory", default="guilds", help="The directory the servers' files are kept in.")
+	parser.add_argument("--author", default="import", help="Author of the rows that don't name one.")
+	parser.add_argument("--chunk-size", type=int, default=1000, help="Rows written per storage batch.")
+	args = parser.parse_args(argv)
+
+	if args.guild:
+		backend = directory_factory(args.guilds_directory, os.path.splitext(args.database)[1])(args.guild)
+	else:
+		backend = open_storage(args.database)
+	storage = IndexedStorage(backend)
+	started = time.perf_counter()
+	try:
+		print(Importer(args.author, args.chunk_size).run(storage, read_file(args.path)))
+	finally:
+		storage.close()
+	print("Took {:.1f}s.".format(time.perf_counter() - started))
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
@@ -0,0 +1,281 @@
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from itertools import islice
+
+from SchedulerBot.storage import Storage, Record, Range
+from SchedulerBot.search import NameIndex
+from SchedulerBot.intervals import IntervalTree
+from SchedulerBot.records import COMPACT_TYPES
+
+# Hash indexes kept per table. Each entry is a tuple of fields whose combined values map to a set of eids, or to
+# the eid itself while only one record has them, which is the usual case for ("event_name", "author").
+# Lookups such as "replies by author X to event Y" hit the ("event_name", "author") index in O(1).
+HASH_INDEXES = {
+	"Event": [("name",), ("date",), ("author",)],
+	"Reply": [("event_name", "author"), ("event_name",), ("author",)],
+	"Reminder": [("event_name",), ("attendie",)]
+}
+
+# Sorted indexes kept per table. Each field keeps a sorted list of (value, eid) pairs for range lookups.
+SORTED_INDEXES = {
+	"Event": ["date", "start_ts", "recurrence"],
+	"Reminder": ["reminder_datetime"]
+}
+
+# Text indexes kept per table, for case-insensitive, prefix and fuzzy lookups of a field (see search.py).
+# They are built the first time they are used, so opening a table costs no more than before.
+TEXT_INDEXES = {
+	"Event": ["name"]
+}
+
+# Interval indexes kept per table, for lookups of the records whose [start, end) range overlaps a range (see intervals.py).
+# Like text indexes, they are built the first time they are used.
+INTERVAL_INDEXES = {
+	"Event": [("start_ts", "end_ts")]
+}
+
+# Secondary indexes over the records of one table.
+# Rows are kept as row_type(record, eid), i.e. a compact row type of records.py, and read like dicts.
+class TableIndex:
+	def __init__(self, hash_fields, sorted_fields, text_fields=(), row_type=Record, interval_fields=()):
+		self.row_type = row_type
+		self.records = {}
+		self.hashes = {fields: {} for fields in hash_fields}
+		self.sorted = {field: [] for field in sorted_fields}
+		self.texts = {field: None for field in text_fields}
+		self.intervals = {fields: None for fields in interval_fields}
+
+	# Returns the text index of field, building it from the records the first time.
+	def text(self, field):
+		if self.texts[field] is None:
+			self.texts[field] = NameIndex(record[field] for record in self.records.values() if record.get(field) is not None)
+		return self.texts[field]
+
+	# Returns the interval index of a (start field, end field) pair, building it from the records the first time.
+	def interval(self, fields):
+		if self.intervals[fields] is None:
+			start_field, end_field = fields
+			self.intervals[fields] = IntervalTree((record[start_field], record[end_field], record.eid) for record in self.records.values()
+				if record.get(start_field) is not None and record.get(end_field) is not None)
+		return self.intervals[fields]
+
+	# changed, when given, names the fields an update set. Text and interval indexes of other fields are left alone.
+	def add(self, record, changed=None):
+		self.records[record.eid] = record
+		for field, index in self.texts.items():
+			if index is not None and record.get(field) is not None and (changed is None or field in changed):
+				index.add(record[field])
+		for (start_field, end_field), tree in self.intervals.items():
+			if tree is not None and record.get(start_field) is not None and record.get(end_field) is not None and (
+					changed is None or start_field in changed or end_field in changed):
+				tree.add(record[start_field], record[end_field], record.eid)
+		for fields, index in self.hashes.items():
+			key = tuple(record.get(field) for field in fields)
+			eids = index.get(key)
+			if eids is None:
+				index[key] = record.eid
+			elif isinstance(eids, set):
+				eids.add(record.eid)
+			else:
+				index[key] = {eids, record.eid}
+		for field, entries in self.sorted.items():
+			if record.get(field) is not None:
+				insort(entries, (record[field], record.eid))
+
+	def discard(self, eid, changed=None):
+		record = self.records.pop(eid)
+		for field, index in self.texts.items():
+			if index is not None and record.get(field) is not None and (changed is None or field in changed):
+				index.discard(record[field])
+		for (start_field, end_field), tree in self.intervals.items():
+			if tree is not None and record.get(start_field) is not None and record.get(end_field) is not None and (
+					changed is None or start_field in changed or end_field in changed):
+				tree.remove(record[start_field], eid)
+		for fields, index in self.hashes.items():
+			key = tuple(record.get(field) for field in fields)
+			eids = index[key]
+			if not isinstance(eids, set):
+				del index[key]
+				continue
+			eids.discard(eid)
+			if len(eids) == 1:
+				index[key] = eids.pop()
+		for field, entries in self.sorted.items():
+			if record.get(field) is not None:
+				del entries[bisect_left(entries, (record[field], eid))]
+		return record
+
+	# Lazily yields the eids in the sorted index of field that fall in the range, in order.
+	# Starts after the (value, eid) entry when after is given. Finding the first eid is a bisection.
+	def iter_range(self, field, value_range, after=None):
+		entries = self.sorted[field]
+		lo = 0 if value_range.start is None else bisect_left(entries, (value_range.start,))
+		if after is not None:
+			lo = max(lo, bisect_right(entries, tuple(after)))
+		for position in range(lo, len(entries)):
+			value, eid = entries[position]
+			if value_range.end is not None and value >= value_range.end:
+				return
+			yield eid
+
+	# Returns the eids in the sorted index of field that fall in the range, in order. At most limit eids when given.
+	def range_eids(self, field, value_range, limit=None, after=None):
+		return list(islice(self.iter_range(field, value_range, after), limit))
+
+	# Picks the cheapest candidate eids for the given fields, or None when no index applies.
+	def candidates(self, fields):
+		equal = {field: value for field, value in fields.items() if not isinstance(value, Range)}
+		covering = [index_fields for index_fields in self.hashes if set(index_fields) <= set(equal)]
+		if covering:
+			index_fields = max(covering, key=len)
+			eids = self.hashes[index_fields].get(tuple(equal[field] for field in index_fields), ())
+			return eids if isinstance(eids, (set, tuple)) else (eids,)
+		for field, value in fields.items():
+			if isinstance(value, Range) and field in self.sorted:
+				return self.range_eids(field, value)
+		return None
+
+	def find(self, fields):
+		candidates = self.candidates(fields)
+		records = self.records.values() if candidates is None else [self.records[eid] for eid in candidates]
+		return [record for record in records if matches(record, fields)]
+
+# Returns whether the record matches every given field.
+def matches(record, fields):
+	for field, value in fields.items():
+		if isinstance(value, Range):
+			if not value.matches(record.get(field)):
+				return False
+		elif record.get(field) != value:
+			return False
+	return True
+
+# Storage that keeps every table it touches in memory with hash and sorted secondary indexes.
+# Reads are answered from the indexes, writes go to the wrapped backend and keep the indexes in sync.
+# Rows of the tables in row_types are held as compact rows (see records.py), other tables' rows as Records. Reads
+# hand out Record copies either way, so callers never see the difference.
+# A write the backend fails, or a batch that fails to flush, drops the indexes it may have left out of step with the
+# backend, so they are loaded from the backend again the next time they're used.
+class IndexedStorage(Storage):
+	def __init__(self, backend, hash_indexes=HASH_INDEXES, sorted_indexes=SORTED_INDEXES, text_indexes=TEXT_INDEXES, row_types=COMPACT_TYPES,
+			interval_indexes=INTERVAL_INDEXES):
+		self.backend = backend
+		self.row_types = row_types
+		self.interval_indexes = interval_indexes
+		self.hash_indexes = hash_indexes
+		self.sorted_indexes = sorted_indexes
+		self.text_indexes = text_indexes
+		self.tables = {}
+
+	# Returns the index of a table, loading the table from the backend the first time.
+	def table(self, table_name):
+		if table_name not in self.tables:
+			index = TableIndex(self.hash_indexes.get(table_name, []), self.sorted_indexes.get(table_name, []),
+				self.text_indexes.get(table_name, []), self.row_types.get(table_name, Record), self.interval_indexes.get(table_name, []))
+			for record in self.backend.all(table_name):
+				index.add(index.row_type(record, record.eid))
+			self.tables[table_name] = index
+		return self.tables[table_name]
+
+	# Drops the index of a table when the backend write inside the block raises.
+	@contextmanager
+	def _writing(self, table_name):
+		try:
+			yield
+		except:
+			self.tables.pop(table_name, None)
+			raise
+
+	def insert(self, table_name, record):
+		index = self.table(table_name)
+		with self._writing(table_name):
+			eid = self.backend.insert(table_name, record)
+		index.add(index.row_type(record, eid))
+		return eid
+
+	def insert_multiple(self, table_name, records):
+		index = self.table(table_name)
+		with self._writing(table_name):
+			eids = self.backend.insert_multiple(table_name, records)
+		for record, eid in zip(records, eids):
+			index.add(index.row_type(record, eid))
+		return eids
+
+	def search(self, table_name, **fields):
+		return [Record(record.items(), record.eid) for record in self.table(table_name).find(fields)]
+
+	def count(self, table_name):
+		return len(self.table(table_name).records)
+
+	# Walks the sorted index by bisection, so the first k records of a range cost O(log n + k).
+	def ordered(self, table_name, field, value_range=Range(), limit=None, after=None):
+		index = self.table(table_name)
+		if field not in index.sorted:
+			return super(IndexedStorage, self).ordered(table_name, field, value_range, limit, after)
+		return [Record(index.records[eid].items(), eid) for eid in index.range_eids(field, value_range, limit, after)]
+
+	# Walks the interval index, so finding the k overlapping records of a range costs about O(log n + k).
+	def overlapping(self, table_name, start_field, end_field, start, end):
+		index = self.table(table_name)
+		if (start_field, end_field) not in index.intervals:
+			return super(IndexedStorage, self).overlapping(table_name, start_field, end_field, start, end)
+		return [Record(index.records[eid].items(), eid) for _, _, eid in index.interval((start_field, end_field)).overlapping(start, end)]
+
+	def update(self, table_name, values, **fields):
+		eids = [record.eid for record in self.table(table_name).find(fields)]
+		self.update_ids(table_name, eids, values)
+		return len(eids)
+
+	def update_ids(self, table_name, eids, values):
+		index = self.table(table_name)
+		eids = [eid for eid in eids if eid in index.records]
+		if not eids:
+			return
+		with self._writing(table_name):
+			self.backend.update_ids(table_name, eids, values)
+		for eid in eids:
+			record = index.discard(eid, values)
+			record.update(values)
+			index.add(record, values)
+
+	def remove(self, table_name, **fields):
+		eids = [record.eid for record in self.table(table_name).find(fields)]
+		self.remove_ids(table_name, eids)
+		return len(eids)
+
+	def remove_ids(self, table_name, eids):
+		index = self.table(table_name)
+		eids = [eid for eid in eids if eid in index.records]
+		if not eids:
+			return
+		with self._writing(table_name):
+			self.backend.remove_ids(table_name, eids)
+		for eid in eids:
+			index.discard(eid)
+
+	# Returns the text index of a field (see search.py), i.e. storage.text_index("Event", "name").similar("Gmae Night").
+	def text_index(self, table_name, field):
+		return self.table(table_name).text(field)
+
+	# The writes of a batch may only reach the backend when it closes, so a batch that raises drops every index.
+	@contextmanager
+	def batch(self):
+		try:
+			with self.backend.batch():
+				yield
+		except:
+			self.tables = {}
+			raise
+
+	# A savepoint that raises undoes its writes in the backend, so every index is dropped with them.
+	@contextmanager
+	def savepoint(self):
+		try:
+			with self.backend.savepoint():
+				yield
+		except:
+			self.tables = {}
+			raise
+
+	def close(self):
+		self.backend.close()
@@ -0,0 +1,165 @@
+import random
+
+# Index over time ranges [start, end), i.e. the start_ts and end_ts of events, for overlap lookups.
+# It's a treap (a binary search tree kept balanced by random priorities) ordered by (start, key), where every node
+# also knows the latest end in its subtree. A lookup skips every subtree that ends before the range starts and stops
+# going right at the first start past its end, so it reads O(log n) nodes on the way down plus the subtrees that hold
+# overlapping ranges, however many ranges lie before or after it. Adds and removes are O(log n).
+# Ranges given to the constructor are sorted in and built into a tree at once, which is how a whole table is indexed.
+class IntervalTree:
+	def __init__(self, intervals=()):
+		nodes = [_Node(start, end, key) for start, end, key in sorted(intervals, key=lambda interval: (interval[0], interval[2]))]
+		self.root = _build(nodes)
+		self.size = len(nodes)
+
+	# Adds the range [start, end) of key. A key is added once for each range it has.
+	def add(self, start, end, key):
+		self.root = _insert(self.root, _Node(start, end, key))
+		self.size += 1
+
+	# Removes the range of key that starts at start. Returns whether there was one.
+	def remove(self, start, key):
+		self.root, removed = _remove(self.root, (start, key))
+		if removed:
+			self.size -= 1
+		return removed
+
+	# Returns the (start, end, key) of every range that overlaps [start, end), ordered by start and key.
+	# Ranges that only touch it, ending at start or starting at end, don't overlap it.
+	def overlapping(self, start, end):
+		found = []
+		_overlapping(self.root, start, end, found)
+		return found
+
+	def __len__(self):
+		return self.size
+
+class _Node:
+	__slots__ = ("start", "end", "key", "max_end", "priority", "left", "right")
+
+	def __init__(self, start, end, key):
+		self.start = start
+		self.end = end
+		self.key = key
+		self.max_end = end
+		self.priority = random.random()
+		self.left = None
+		self.right = None
+
+def _update(node):
+	max_end = node.end
+	if node.left is not None and node.left.max_end > max_end:
+		max_end = node.left.max_end
+	if node.right is not None and node.right.max_end > max_end:
+		max_end = node.right.max_end
+	node.max_end = max_end
+
+# Builds a treap from nodes sorted by (start, key) in O(n), keeping the right spine of the tree built so far on a stack.
+def _build(nodes):
+	spine = []
+	for node in nodes:
+		last = None
+		while spine and spine[-1].priority < node.priority:
+			last = spine.pop()
+			_update(last)
+		node.left = last
+		if spine:
+			spine[-1].right = node
+		spine.append(node)
+	for node in reversed(spine):
+		_update(node)
+	return spine[0] if spine else None
+
+def _rotate_right(node):
+	top = node.left
+	node.left = top.right
+	top.right = node
+	_update(node)
+	_update(top)
+	return top
+
+def _rotate_left(node):
+	top = node.right
+	node.right = top.left
+	top.left = node
+	_update(node)
+	_update(top)
+	return top
+
+def _insert(node, new):
+	if node is None:
+		return new
+	if (new.start, new.key) < (node.start, node.key):
+		node.left = _insert(node.left, new)
+		if node.left.priority > node.priority:
+			return _rotate_right(node)
+	else:
+		node.right = _insert(node.right, new)
+		if node.right.priority > node.priority:
+			return _rotate_left(node)
+	_update(node)
+	return node
+
+# Joins two treaps, every node of left ordering before every node of right.
+def _merge(left, right):
+	if left is None:
+		return right
+	if right is None:
+		return left
+	if left.priority > right.priority:
+		left.right = _merge(left.right, right)
+		_update(left)
+		return left
+	right.left = _merge(left, right.left)
+	_update(right)
+	return right
+
+def _remove(node, position):
+	if node is None:
+		return None, False
+	node_position = (node.start, node.key)
+	if position == node_position:
+		return _merge(node.left, node.right), True
+	if position < node_position:
+		node.left, removed = _remove(node.left, position)
+	else:
+		node.right, removed = _remove(node.right, position)
+	if removed:
+		_update(node)
+	return node, removed
+
+def _overlapping(node, start, end, found):
+	if node is None or node.max_end <= start:
+		return
+	_overlapping(node.left, start, end, found)
+	if node.start < end:
+		if node.end > start:
+			found.append((node.start, node.end, node.key))
+		_overlapping(node.right, start, end, found)
+
+# Splits [start, end) into busy windows, where at least one of the ranges falls, and the free windows between them.
+# Returns (window_start, window_end, items) triples in order, with the items of the ranges in each busy window and
+# None for free windows. Ranges that overlap or touch make one busy window.
+# @param: ranges [(start, end, item)], sorted by start
+def windows(ranges, start, end):
+	found = []
+	for range_start, range_end, item in ranges:
+		range_start, range_end = max(range_start, start), min(range_end, end)
+		if range_start >= range_end:
+			continue
+		if found and range_start <= found[-1][1]:
+			found[-1][1] = max(found[-1][1], range_end)
+			found[-1][2].append(item)
+		else:
+			found.append([range_start, range_end, [item]])
+
+	result = []
+	cursor = start
+	for busy_start, busy_end, items in found:
+		if busy_start > cursor:
+			result.append((cursor, busy_start, None))
+		result.append((busy_start, busy_end, items))
+		cursor = busy_end
+	if cursor < end:
+		result.append((cursor, end, None))
+	return result
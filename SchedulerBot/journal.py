@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+from contextlib import contextmanager
+
+from SchedulerBot.storage import Storage, Record
+from SchedulerBot.index import matches
+
+log = logging.getLogger(__name__)
+
+# Key of the snapshot entry that holds the journal's own bookkeeping. Every other key is a table.
+META = "_journal"
+
+# Storage that appends every write to a journal file instead of rewriting the whole database.
+# The tables live in memory. Each write appends one json line, i.e. {"seq": 12, "op": "insert", "table": "Reply", ...},
+# so a !reply costs a few hundred bytes no matter how big the database is.
+# Once the journal outgrows the snapshot (and is at least compact_bytes long) the tables are written to a fresh snapshot
+# and the journal starts over. Opening loads the snapshot and replays the journal lines written after it, so startup
+# work follows the size of the live data plus the journal tail, never the whole history of writes.
+# The snapshot has the layout of a TinyDB json file, so a copy of db.json works as the snapshot of a new journal.
+# Files: path is the journal, path + ".snapshot" the snapshot.
+class JournalStorage(Storage):
+	def __init__(self, path="db.journal", compact_bytes=4 * 1024 * 1024, fsync=False):
+		self.path = path
+		self.snapshot_path = path + ".snapshot"
+		self.compact_bytes = compact_bytes
+		self.fsync = fsync
+		self.tables = {}
+		self.next_ids = {}
+		self.seq = 0
+		self.snapshot_bytes = 0
+		self.depth = 0
+		self.pending = []
+		# Undo steps of the writes made inside the open savepoint, None outside of one.
+		self.undo = None
+		self._load()
+		self.journal = open(self.path, "ab")
+		self.journal_bytes = self.journal.tell()
+
+	# Loads the snapshot and replays the journal on top of it.
+	def _load(self):
+		if os.path.exists(self.snapshot_path):
+			with open(self.snapshot_path, "rb") as snapshot:
+				data = json.loads(snapshot.read().decode("utf-8"))
+			self.snapshot_bytes = os.path.getsize(self.snapshot_path)
+			meta = data.pop(META, {})
+			self.seq = meta.get("seq", 0)
+			for table_name, rows in data.items():
+				if table_name == "_default":
+					continue
+				self.tables[table_name] = {int(eid): record for eid, record in rows.items()}
+				self.next_ids[table_name] = meta.get("next_ids", {}).get(table_name, max(self.tables[table_name], default=0) + 1)
+
+		if os.path.exists(self.path):
+			self._replay()
+
+	# Applies the journal lines that are newer than the snapshot.
+	# A crash halfway through an append leaves a torn last line, which is cut off so the next append starts clean.
+	def _replay(self):
+		replayed = 0
+		good_bytes = 0
+		with open(self.path, "rb") as journal:
+			for line in journal:
+				if not line.endswith(b"\n"):
+					break
+				try:
+					entry = json.loads(line.decode("utf-8"))
+				except ValueError:
+					break
+				good_bytes += len(line)
+				# Lines up to the snapshot's seq are already in it: the process died after a compaction wrote the
+				# snapshot but before it emptied the journal.
+				if entry["seq"] > self.seq:
+					self._apply(entry)
+					self.seq = entry["seq"]
+					replayed += 1
+
+		if good_bytes < os.path.getsize(self.path):
+			log.warning("truncating torn journal path=%s bytes=%s", self.path, os.path.getsize(self.path) - good_bytes)
+			with open(self.path, "r+b") as journal:
+				journal.truncate(good_bytes)
+		log.info("journal replayed path=%s entries=%s", self.path, replayed)
+
+	def _table(self, table_name):
+		if table_name not in self.tables:
+			self.tables[table_name] = {}
+			self.next_ids[table_name] = 1
+		return self.tables[table_name]
+
+	# Applies a journal entry to the tables in memory.
+	def _apply(self, entry):
+		table = self._table(entry["table"])
+		if entry["op"] == "insert":
+			for eid, record in zip(entry["eids"], entry["records"]):
+				table[eid] = record
+				self.next_ids[entry["table"]] = max(self.next_ids[entry["table"]], eid + 1)
+		elif entry["op"] == "update":
+			for eid in entry["eids"]:
+				if eid in table:
+					table[eid].update(entry["values"])
+		elif entry["op"] == "remove":
+			for eid in entry["eids"]:
+				table.pop(eid, None)
+
+	# Returns the step that puts the tables back the way they are before entry is applied.
+	def _inverse(self, entry):
+		table_name = entry["table"]
+		table = self._table(table_name)
+		next_id = self.next_ids[table_name]
+		kept = dict((eid, dict(table[eid])) for eid in entry["eids"] if eid in table)
+		def step():
+			for eid in entry["eids"]:
+				table.pop(eid, None)
+			table.update(kept)
+			self.next_ids[table_name] = next_id
+		return step
+
+	# Applies a write in memory and appends it to the journal.
+	def _write(self, entry):
+		if self.undo is not None:
+			self.undo.append(self._inverse(entry))
+		self.seq += 1
+		entry["seq"] = self.seq
+		self._apply(entry)
+		self.pending.append(json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n")
+		if self.depth == 0:
+			self._flush()
+
+	# Appends the pending lines to the journal in one write and compacts once the journal has outgrown the snapshot.
+	def _flush(self):
+		if self.pending:
+			data = b"".join(self.pending)
+			self.pending = []
+			self.journal.write(data)
+			self.journal.flush()
+			if self.fsync:
+				os.fsync(self.journal.fileno())
+			self.journal_bytes += len(data)
+		if self.journal_bytes >= max(self.compact_bytes, self.snapshot_bytes):
+			self.compact()
+
+	# Writes the tables to a new snapshot and empties the journal.
+	# The snapshot is written to a temporary file and renamed over the old one, so a crash leaves either snapshot whole.
+	def compact(self):
+		data = {table_name: {str(eid): record for eid, record in rows.items()} for table_name, rows in self.tables.items()}
+		data[META] = {"seq": self.seq, "next_ids": self.next_ids}
+		temporary_path = self.snapshot_path + ".tmp"
+		with open(temporary_path, "wb") as snapshot:
+			snapshot.write(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+			snapshot.flush()
+			os.fsync(snapshot.fileno())
+		os.replace(temporary_path, self.snapshot_path)
+		self.snapshot_bytes = os.path.getsize(self.snapshot_path)
+
+		self.journal.truncate(0)
+		self.journal.seek(0)
+		self.journal_bytes = 0
+		log.info("journal compacted path=%s snapshot_bytes=%s", self.path, self.snapshot_bytes)
+
+	@contextmanager
+	def batch(self):
+		self.depth += 1
+		try:
+			yield
+		finally:
+			self.depth -= 1
+			if self.depth == 0:
+				self._flush()
+
+	# The writes of a savepoint are only pending lines until its batch closes, so undoing them drops their lines and
+	# puts the tables in memory back, newest write first.
+	@contextmanager
+	def savepoint(self):
+		with self.batch():
+			outer, self.undo = self.undo, []
+			pending, seq = len(self.pending), self.seq
+			try:
+				yield
+			except:
+				for step in reversed(self.undo):
+					step()
+				del self.pending[pending:]
+				self.seq = seq
+				self.undo = outer
+				raise
+			if outer is not None:
+				outer.extend(self.undo)
+			self.undo = outer
+
+	def _find(self, table_name, fields):
+		return [eid for eid, record in self._table(table_name).items() if matches(record, fields)]
+
+	def insert(self, table_name, record):
+		return self.insert_multiple(table_name, [record])[0]
+
+	def insert_multiple(self, table_name, records):
+		self._table(table_name)
+		first = self.next_ids[table_name]
+		eids = list(range(first, first + len(records)))
+		if eids:
+			self._write({"op": "insert", "table": table_name, "eids": eids, "records": [dict(record) for record in records]})
+		return eids
+
+	def search(self, table_name, **fields):
+		table = self._table(table_name)
+		return [Record(table[eid], eid) for eid in self._find(table_name, fields)]
+
+	def count(self, table_name):
+		return len(self._table(table_name))
+
+	def update(self, table_name, values, **fields):
+		eids = self._find(table_name, fields)
+		self.update_ids(table_name, eids, values)
+		return len(eids)
+
+	def remove(self, table_name, **fields):
+		eids = self._find(table_name, fields)
+		self.remove_ids(table_name, eids)
+		return len(eids)
+
+	def update_ids(self, table_name, eids, values):
+		eids = [eid for eid in eids if eid in self._table(table_name)]
+		if eids:
+			self._write({"op": "update", "table": table_name, "eids": eids, "values": dict(values)})
+
+	def remove_ids(self, table_name, eids):
+		eids = [eid for eid in eids if eid in self._table(table_name)]
+		if eids:
+			self._write({"op": "remove", "table": table_name, "eids": eids})
+
+	def close(self):
+		if not self.journal.closed:
+			self._flush()
+			self.journal.close()
@@ -0,0 +1,91 @@
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+log = logging.getLogger(__name__)
+
+# A named lease kept in a SQLite file that every process of the bot can reach, i.e. "shard-3" in leases.sqlite3.
+# One process at a time holds a lease. The holder renews it well within ttl seconds; once it stops renewing, because
+# it died or hung, the lease expires and the next process that asks takes it over.
+# Each change of holder increments token, so a holder that lost the lease can tell from a newer token.
+# A lease is checked and taken inside one BEGIN IMMEDIATE transaction, which SQLite serializes across processes.
+class Lease:
+	def __init__(self, path="leases.sqlite3", name="leader", holder=None, ttl=30):
+		self.path = path
+		self.name = name
+		self.ttl = ttl
+		# Identifies this process, i.e. "host:1234:9f2c01aa". The random part keeps a restarted process with a reused
+		# pid from mistaking its predecessor's lease for its own.
+		self.holder = holder if holder else "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+		self.token = None
+		# Monotonic time the lease is held until, as far as this process knows.
+		self.held_until = 0
+		self.lock = threading.Lock()
+		self.conn = sqlite3.connect(path, timeout=ttl, isolation_level=None, check_same_thread=False)
+		self.conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT, expires_at REAL, token INTEGER)")
+
+	# Takes the lease if it's free or expired, or renews it if this process holds it. Returns whether it's held.
+	# @param: now is the wall clock time the expiry is compared with, which every process on the host shares.
+	def acquire(self, now=None):
+		with self.lock:
+			started = time.monotonic()
+			now = time.time() if now is None else now
+			self.conn.execute("BEGIN IMMEDIATE")
+			try:
+				row = self.conn.execute("SELECT holder, expires_at, token FROM leases WHERE name = ?", (self.name,)).fetchone()
+				if row is None:
+					token = 1
+					self.conn.execute("INSERT INTO leases VALUES (?, ?, ?, ?)", (self.name, self.holder, now + self.ttl, token))
+				elif row[0] == self.holder or row[1] <= now:
+					token = row[2] if row[0] == self.holder else row[2] + 1
+					self.conn.execute("UPDATE leases SET holder = ?, expires_at = ?, token = ? WHERE name = ?",
+						(self.holder, now + self.ttl, token, self.name))
+				else:
+					token = None
+				self.conn.execute("COMMIT")
+			except:
+				self.conn.execute("ROLLBACK")
+				raise
+
+			if token is None:
+				if self.token is not None:
+					log.warning("lease lost name=%s holder=%s", self.name, row[0])
+				self.token = None
+				self.held_until = 0
+				return False
+			if token != self.token:
+				log.info("lease taken name=%s holder=%s token=%s", self.name, self.holder, token)
+			self.token = token
+			# Counted from before the transaction, so this process gives up on the lease before anyone else can take it.
+			self.held_until = started + self.ttl
+			return True
+
+	# Blocks until the lease is held, trying every interval seconds. A process that waits here is a standby.
+	def wait(self, interval=None):
+		interval = self.ttl / 3 if interval is None else interval
+		while not self.acquire():
+			log.info("waiting for lease name=%s holder=%s", self.name, self.current()[0])
+			time.sleep(interval)
+
+	# Returns whether this process still holds the lease, by its own clock since the last successful acquire().
+	def held(self):
+		return self.token is not None and time.monotonic() < self.held_until
+
+	# Returns (holder, expires_at, token) of the lease, or None if it was never taken.
+	def current(self):
+		with self.lock:
+			return self.conn.execute("SELECT holder, expires_at, token FROM leases WHERE name = ?", (self.name,)).fetchone()
+
+	# Gives the lease up, so a standby can take over right away. The row stays, so tokens keep counting up.
+	def release(self):
+		with self.lock:
+			self.conn.execute("UPDATE leases SET expires_at = 0 WHERE name = ? AND holder = ?", (self.name, self.holder))
+			self.token = None
+			self.held_until = 0
+
+	def close(self):
+		self.conn.close()
@@ -0,0 +1,64 @@
+import asyncio
+
+# Locks that are taken by key, i.e. ("Event", guild_id, "Game Night"), so commands on the same event run one after
+# another while commands on other events go ahead in parallel.
+# Every storage call already runs alone on the writer thread (see async_storage.py), but a command that checks in one
+# call and writes in the next could interleave with another command in between. Holding the event's key across those
+# calls closes that gap without serializing the whole bot.
+# A key's lock only lives while someone holds or waits for it, so the table stays as small as the commands in flight.
+class KeyedLocks:
+	def __init__(self):
+		# @format: {key: [asyncio.Lock, number of holders and waiters]}
+		self.locks = {}
+		self.acquired = 0
+		self.contended = 0
+
+	# Acquires the locks of every key and returns a context manager that releases them.
+	# Keys are taken in sorted order, so two commands locking the same pair of events can't deadlock.
+	# @usage: with (yield from locks.acquire(("Event", guild_id, "Game Night"))):
+	@asyncio.coroutine
+	def acquire(self, *keys):
+		keys = sorted(set(keys), key=repr)
+		taken = []
+		try:
+			for key in keys:
+				entry = self.locks.setdefault(key, [asyncio.Lock(), 0])
+				entry[1] += 1
+				taken.append(key)
+				if entry[0].locked():
+					self.contended += 1
+				yield from entry[0].acquire()
+		except BaseException:
+			# The last key's lock was never acquired when its wait was cancelled.
+			self._release(taken, held=len(taken) - 1)
+			raise
+		self.acquired += 1
+		return _Held(self, keys)
+
+	# Releases the first held of keys and forgets their locks once nobody holds or waits for them anymore.
+	def _release(self, keys, held=None):
+		for position, key in enumerate(keys):
+			entry = self.locks[key]
+			if held is None or position < held:
+				entry[0].release()
+			entry[1] -= 1
+			if entry[1] == 0:
+				del self.locks[key]
+
+	def locked(self, key):
+		return key in self.locks and self.locks[key][0].locked()
+
+	def stats(self):
+		return {"keys": len(self.locks), "acquired": self.acquired, "contended": self.contended}
+
+class _Held:
+	def __init__(self, locks, keys):
+		self.locks = locks
+		self.keys = keys
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.locks._release(self.keys)
+		return False
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+log = logging.getLogger(__name__)
+
+# Histogram bucket bounds in seconds. Command phases and storage operations take milliseconds, reminders lag by seconds.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Returns the asyncio task that is running right now, or None outside of one.
+def current_task():
+	get_task = getattr(asyncio, "current_task", None) or asyncio.Task.current_task
+	try:
+		return get_task()
+	except RuntimeError:
+		return None
+
+def _escape(value):
+	return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=()):
+	pairs = list(zip(names, values)) + list(extra)
+	if not pairs:
+		return ""
+	return "{" + ",".join("{}=\"{}\"".format(name, _escape(value)) for name, value in pairs) + "}"
+
+def _number(value):
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+# A metric with one value per combination of label values. Updates may come from any thread.
+class Metric:
+	kind = None
+
+	def __init__(self, name, help_text, labels=()):
+		self.name = name
+		self.help_text = help_text
+		self.label_names = tuple(labels)
+		self.values = {}
+		self.lock = threading.Lock()
+
+	def _key(self, labels):
+		return tuple(labels.get(name, "") for name in self.label_names)
+
+	# Returns the lines of the metric in the Prometheus text format.
+	def render(self):
+		lines = ["# HELP {} {}".format(self.name, self.help_text), "# TYPE {} {}".format(self.name, self.kind)]
+		with self.lock:
+			values = sorted(self.values.items())
+		for key, value in values:
+			lines.extend(self._render_value(key, value))
+		return lines
+
+	def _render_value(self, key, value):
+		return ["{}{} {}".format(self.name, _labels(self.label_names, key), _number(value))]
+
+class Counter(Metric):
+	kind = "counter"
+
+	def inc(self, amount=1, **labels):
+		key = self._key(labels)
+		with self.lock:
+			self.values[key] = self.values.get(key, 0) + amount
+
+# A gauge whose value is read from fn when the metrics are scraped, so nothing is recorded in between.
+# fn returns a number, or a dict of label value tuples to numbers.
+class Gauge(Metric):
+	kind = "gauge"
+
+	def __init__(self, name, help_text, fn, labels=()):
+		super(Gauge, self).__init__(name, help_text, labels)
+		self.fn = fn
+
+	def render(self):
+		value = self.fn()
+		with self.lock:
+			self.values = value if isinstance(value, dict) else {(): value}
+		return super(Gauge, self).render()
+
+# Counts observations into cumulative buckets, plus their sum and count.
+class Histogram(Metric):
+	kind = "histogram"
+
+	def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+		super(Histogram, self).__init__(name, help_text, labels)
+		self.buckets = tuple(buckets)
+
+	def observe(self, value, **labels):
+		key = self._key(labels)
+		with self.lock:
+			counts = self.values.get(key)
+			if counts is None:
+				# One count per bucket, then the +Inf bucket, then the sum.
+				counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+			counts[bisect_left(self.buckets, value)] += 1
+			counts[-1] += value
+
+	def _render_value(self, key, counts):
+		lines = []
+		cumulative = 0
+		for bound, count in zip(self.buckets + (float("inf"),), counts):
+			cumulative += count
+			lines.append("{}_bucket{} {}".format(self.name, _labels(self.label_names, key, [("le", _number(bound))]), cumulative))
+		lines.append("{}_sum{} {}".format(self.name, _labels(self.label_names, key), _number(counts[-1])))
+		lines.append("{}_count{} {}".format(self.name, _labels(self.label_names, key), cumulative))
+		return lines
+
+# Holds the metrics of the bot and renders all of them for a scrape.
+class Registry:
+	def __init__(self):
+		self.metrics = []
+
+	def register(self, metric):
+		self.metrics.append(metric)
+		return metric
+
+	def counter(self, name, help_text, labels=()):
+		return self.register(Counter(name, help_text, labels))
+
+	def gauge(self, name, help_text, fn, labels=()):
+		return self.register(Gauge(name, help_text, fn, labels))
+
+	def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+		return self.register(Histogram(name, help_text, labels, buckets))
+
+	def render(self):
+		lines = []
+		for metric in self.metrics:
+			lines.extend(metric.render())
+		return "\n".join(lines) + "\n"
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+# Serves the metrics of a registry in the Prometheus text format on http://host:port/metrics, from a thread of its own.
+class MetricsServer:
+	def __init__(self, registry, port, host="127.0.0.1"):
+		self.registry = registry
+		self.port = port
+		self.host = host
+		self.server = None
+		self.thread = None
+
+	def start(self):
+		registry = self.registry
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path.split("?")[0] != "/metrics":
+					self.send_error(404)
+					return
+				body = registry.render().encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				log.debug("metrics request " + format, *args)
+
+		self.server = _ThreadingHTTPServer((self.host, self.port), Handler)
+		self.port = self.server.server_address[1]
+		self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+		self.thread.start()
+		log.info("serving metrics address=%s port=%s", self.host, self.port)
+
+	def stop(self):
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+			self.thread = None
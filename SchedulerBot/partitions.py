@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager, ExitStack
+
+from SchedulerBot.storage import open_storage
+from SchedulerBot.index import IndexedStorage
+
+# Returns a factory that keeps each partition in its own file inside directory, i.e. guilds/1234.json.
+# The factory opens the storage of a partition key, and factory.keys() lists the partitions that exist on disk.
+def directory_factory(directory, extension=".json"):
+	def factory(key):
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		return open_storage(os.path.join(directory, "{}{}".format(key, extension)))
+
+	def keys():
+		if not os.path.isdir(directory):
+			return []
+		return [name[:-len(extension)] for name in os.listdir(directory) if name.endswith(extension)]
+
+	factory.keys = keys
+	return factory
+
+# Returns the shard a partition key belongs to, the way Discord assigns guilds to gateway shards.
+# Keys of channel partitions ("guild-channel") belong to their guild's shard, and the default partition to shard 0,
+# which is the one direct messages arrive on. Keys that aren't Discord ids are spread by a checksum.
+def shard_of(key, shard_count):
+	if key is None:
+		return 0
+	guild_id = str(key).split("-")[0]
+	if not guild_id.isdigit():
+		return zlib.crc32(guild_id.encode("utf-8")) % shard_count
+	return (int(guild_id) >> 22) % shard_count
+
+# Keeps the data of every guild in a partition of its own.
+# A partition is opened (and indexed in memory) the first time its guild is used and closed again once it has been idle
+# for idle_seconds, so memory follows the active guilds and a huge guild never slows the lookups of a small one.
+# The None partition is the default storage, used for direct messages and for data from before partitioning.
+# on_open, when given, is called with every partition's storage right after it is opened.
+# owns, when given, tells the partitions of this process from those of the other shards, which keys() and scan() skip.
+class PartitionManager:
+	def __init__(self, default, factory, idle_seconds=600, on_open=None, owns=None):
+		self.default = IndexedStorage(default)
+		self.factory = factory
+		self.idle_seconds = idle_seconds
+		self.on_open = on_open
+		self.owns = owns
+		self.partitions = {}
+		self.last_used = {}
+		self.lock = threading.RLock()
+		self.batch_stack = None
+		self.batched = set()
+		self.savepoint_stack = None
+		self.savepointed = set()
+		if on_open:
+			on_open(self.default)
+
+	# Returns the storage of a partition, opening it if needed.
+	# Inside a batch or a savepoint, the partition joins it the first time it is used.
+	def get(self, key=None):
+		with self.lock:
+			if key is None:
+				storage = self.default
+			else:
+				if key not in self.partitions:
+					self.partitions[key] = IndexedStorage(self.factory(key))
+					if self.on_open:
+						self.on_open(self.partitions[key])
+				self.last_used[key] = time.monotonic()
+				storage = self.partitions[key]
+
+			if self.batch_stack is not None and key not in self.batched:
+				self.batched.add(key)
+				self.batch_stack.enter_context(storage.batch())
+			if self.savepoint_stack is not None and key not in self.savepointed:
+				self.savepointed.add(key)
+				self.savepoint_stack.enter_context(storage.savepoint())
+			return storage
+
+	# Returns the keys of every partition, open or not, including the default one.
+	def keys(self):
+		with self.lock:
+			keys = [None] + sorted(set(self.factory.keys()) | set(self.partitions.keys()))
+		return [key for key in keys if self.owns is None or self.owns(key)]
+
+	# Returns read(storage) for a partition without opening it: an open partition is read as it is, a closed one
+	# straight from its backend, which is closed again right after. Nothing gets indexed or backfilled.
+	def peek(self, key, read):
+		with self.lock:
+			storage = self.partitions.get(key) if key is not None else self.default
+		if storage is not None:
+			return read(storage)
+		backend = self.factory(key)
+		try:
+			return read(backend)
+		finally:
+			backend.close()
+
+	# Searches a table in every partition without keeping the closed ones open. Yields (key, records).
+	def scan(self, table_name, **fields):
+		for key in self.keys():
+			yield key, self.peek(key, lambda storage: storage.search(table_name, **fields))
+
+	# Moves every record of tables out of the default partition into the partition key, once.
+	# Data from before partitioning has no guild of its own, so it's handed to the guild it was written in.
+	# Records are written to the partition before they are removed, and the move is noted in the default partition's
+	# Migration table, so records written to the default partition later (i.e. by direct messages) stay there.
+	# Returns how many records were moved, by table.
+	def migrate_default(self, key, tables=("Event", "Reply", "Reminder")):
+		with self.lock:
+			if self.default.search("Migration", name="partitions"):
+				return {}
+			moved = {}
+			records = dict((table_name, self.default.all(table_name)) for table_name in tables)
+			storage = self.get(key)
+			with storage.batch():
+				for table_name, table_records in records.items():
+					if table_records:
+						storage.insert_multiple(table_name, [dict(record) for record in table_records])
+			with self.default.batch():
+				for table_name, table_records in records.items():
+					if table_records:
+						self.default.remove_ids(table_name, [record.eid for record in table_records])
+					moved[table_name] = len(table_records)
+				self.default.insert("Migration", {"name": "partitions", "key": key})
+			return moved
+
+	# Closes the partitions that haven't been used for idle_seconds. Returns the keys that were closed.
+	def evict_idle(self, now=None):
+		now = time.monotonic() if now is None else now
+		evicted = []
+		with self.lock:
+			if self.batch_stack is not None:
+				return evicted
+			for key, last_used in list(self.last_used.items()):
+				if now - last_used >= self.idle_seconds:
+					self.partitions.pop(key).close()
+					del self.last_used[key]
+					evicted.append(key)
+		return evicted
+
+	# Groups the writes of every partition used inside the block, so each one is flushed once.
+	@contextmanager
+	def batch(self):
+		with self.lock:
+			with ExitStack() as stack:
+				self.batch_stack = stack
+				try:
+					yield
+				finally:
+					self.batch_stack = None
+					self.batched = set()
+
+	# Undoes the writes of every partition used inside the block if the block raises, see Storage.savepoint.
+	@contextmanager
+	def savepoint(self):
+		with self.lock:
+			if self.savepoint_stack is not None:
+				yield
+				return
+			with ExitStack() as stack:
+				self.savepoint_stack = stack
+				try:
+					yield
+				finally:
+					self.savepoint_stack = None
+					self.savepointed = set()
+
+	def close(self):
+		with self.lock:
+			for storage in self.partitions.values():
+				storage.close()
+			self.partitions = {}
+			self.last_used = {}
+			self.default.close()
@@ -0,0 +1,83 @@
+import cProfile
+import io
+import json
+import logging
+import logging.handlers
+import pstats
+import random
+import time
+
+log = logging.getLogger(__name__)
+
+# Profiles a sample of the commands the bot handles and writes the slow ones to a rotating file.
+# Sampling is off until sample_rate is above 0, and then only one command is profiled at a time, since cProfile can only
+# profile one thing per thread. A profile covers the event loop thread while the command is handled, so other tasks that
+# run meanwhile show up in it too, and storage work done on the writer thread doesn't (its time shows in the storage phase).
+# Commands slower than slow_seconds are written as one json object per line, sampled or not; sampled ones include their
+# top call stacks.
+class CommandProfiler:
+	def __init__(self, sample_rate=0.0, slow_seconds=2.0, path="slow_commands.log", max_bytes=1024 * 1024, backup_count=3, top=15):
+		self.sample_rate = sample_rate
+		self.slow_seconds = slow_seconds
+		self.path = path
+		self.max_bytes = max_bytes
+		self.backup_count = backup_count
+		self.top = top
+		self.active = None
+		self.slow_log = None
+		self.sampled = 0
+		self.slow = 0
+
+	# Returns a running profile when this command is picked for sampling, None otherwise.
+	def maybe_start(self):
+		if self.sample_rate <= 0 or self.active is not None or random.random() >= self.sample_rate:
+			return None
+		profile = cProfile.Profile()
+		try:
+			profile.enable()
+		except ValueError:
+			# Another profiler is running on this thread.
+			return None
+		self.active = profile
+		self.sampled += 1
+		return profile
+
+	def stop(self, profile):
+		profile.disable()
+		if self.active is profile:
+			self.active = None
+
+	def is_slow(self, seconds):
+		return self.slow_seconds is not None and seconds >= self.slow_seconds
+
+	# Returns the functions of a profile with the most cumulative time, as pstats prints them.
+	def top_stacks(self, profile):
+		stream = io.StringIO()
+		pstats.Stats(profile, stream=stream).sort_stats("cumulative").print_stats(self.top)
+		return stream.getvalue()
+
+	# Writes a slow command to the rotating file, with the top call stacks of its profile if it was sampled.
+	# @param: entry {"command": "!events", "content": "!events week", "guild_id": "1234", "seconds": 2.5, ...}
+	def record_slow(self, entry, profile=None):
+		if self.slow_log is None:
+			self.slow_log = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backup_count)
+
+		entry = dict(entry, time=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), sampled=profile is not None)
+		if profile is not None:
+			entry["profile"] = self.top_stacks(profile)
+		self.slow += 1
+		self.slow_log.handle(logging.makeLogRecord({"msg": json.dumps(entry, default=str), "levelno": logging.INFO, "levelname": "INFO"}))
+		log.warning("slow command command=%s guild_id=%s seconds=%.3f", entry.get("command"), entry.get("guild_id"), entry.get("seconds", 0))
+
+	def close(self):
+		if self.slow_log is not None:
+			self.slow_log.close()
+			self.slow_log = None
+
+	def stats(self):
+		return {
+			"sample_rate": self.sample_rate,
+			"slow_seconds": self.slow_seconds,
+			"sampled": self.sampled,
+			"slow": self.slow
+		}
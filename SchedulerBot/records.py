@@ -0,0 +1,171 @@
+import sys
+import time
+from operator import attrgetter
+
+# Returns the date, time and time zone a record is created at, which the tables keep for logging purposes.
+# Multi-word time zone names such as "Pacific Standard Time" are shortened to their initials when shorten is set.
+def created_at(time_format="%I:%M%p", shorten=True):
+	now_tz = time.tzname[0]
+	now_tz_tokens = now_tz.split(" ")
+	if shorten and len(now_tz_tokens) > 1:
+		now_tz = "".join([token[0] for token in now_tz_tokens])
+	return time.strftime("%Y-%m-%d"), time.strftime(time_format), now_tz
+
+# How long events scheduled without a duration are taken to last when looking for overlaps, in seconds.
+DEFAULT_DURATION = 60 * 60
+
+# Returns a new record of the Event table, as !schedule creates it.
+# @param: duration is the number of seconds the event lasts, or None when it wasn't given.
+def new_event_record(name, date, time_str, timezone, description, author, start_ts, duration=None):
+	now_date, now_time, now_tz = created_at()
+	return {
+		'name': name, 'date': date, 'time': time_str, 'timezone': timezone,
+		'description': description, 'author': author, 'created_date': now_date,
+		'created_time': now_time, 'created_timezone': now_tz, 'start_ts': start_ts,
+		'duration': duration, 'end_ts': event_end(duration, start_ts)
+	}
+
+# Returns the UTC timestamp an event that starts at start_ts ends at, or None if it has no start time.
+def event_end(duration, start_ts):
+	if start_ts is None:
+		return None
+	return start_ts + (duration or DEFAULT_DURATION)
+
+# Returns the people an event counts on: everyone who replied yes, and its host unless they replied otherwise.
+def attendees(event):
+	rsvps = event.get("rsvps") or {}
+	going = set(author for author, status in rsvps.items() if status == "yes")
+	if rsvps.get(event.get("author"), "yes") == "yes":
+		going.add(event.get("author"))
+	return going
+
+# Returns a new record of the Reply table, as !reply creates it.
+def new_reply_record(event_name, status, author):
+	now_date, now_time, now_tz = created_at("%I:%M %p", shorten=False)
+	return {
+		'event_name': event_name, 'status': status, 'author': author,
+		'created_date': now_date, 'created_time': now_time, 'created_timezone': now_tz
+	}
+
+REPLY_STATUSES = ("yes", "no", "maybe")
+
+# Returns the RSVP fields an event keeps next to its Reply rows, built from those rows.
+# rsvps maps every author to their latest status and rsvp_counts counts the authors by status, so checking whether
+# someone said yes or drawing !event never has to read the Reply table.
+# @format: {"rsvps": {"dave": "yes", "anna": "maybe"}, "rsvp_counts": {"yes": 1, "no": 0, "maybe": 1}}
+def rsvp_fields(replies):
+	return updated_rsvps({}, {reply["author"]: reply["status"] for reply in replies})
+
+# Returns the RSVP fields of an event after the given authors replied, i.e. {"dave": "no"}.
+# Only the counts of the statuses that changed are touched.
+def updated_rsvps(event, statuses):
+	rsvps = dict(event.get("rsvps") or {})
+	counts = dict(event.get("rsvp_counts") or {status: 0 for status in REPLY_STATUSES})
+	for author, status in statuses.items():
+		old_status = rsvps.get(author)
+		if old_status == status:
+			continue
+		if old_status is not None:
+			counts[old_status] -= 1
+		counts[status] = counts.get(status, 0) + 1
+		rsvps[author] = status
+	return {"rsvps": rsvps, "rsvp_counts": counts}
+
+# Fields every row of a table is expected to carry, which compact rows keep in slots instead of a dict per row.
+# Rows may carry fields of their own beyond these (imports, older databases); those go into a small dict on the side.
+TABLE_FIELDS = {
+	"Event": (
+		"name", "date", "time", "timezone", "description", "author", "created_date", "created_time",
+		"created_timezone", "start_ts", "rsvps", "rsvp_counts", "recurrence", "recurrence_start_ts",
+		"recurrence_until_ts", "recurrence_count", "exceptions", "duration", "end_ts"
+	),
+	"Reply": ("event_name", "status", "author", "created_date", "created_time", "created_timezone"),
+	"Reminder": (
+		"event_name", "attendie", "attendie_id", "reminder_datetime", "reminder_ts", "time_metric", "diff_value",
+		"is_sent", "occurrence_ts"
+	)
+}
+
+# Fields whose strings repeat across the rows of a table: names, authors, statuses and creation dates.
+# Rows decoded from storage get a fresh copy of each of them, so compact rows swap those for one shared copy.
+INTERNED_FIELDS = {
+	"Event": ("name", "date", "time", "timezone", "author", "created_date", "created_time", "created_timezone", "recurrence"),
+	"Reply": ("event_name", "status", "author", "created_date", "created_time", "created_timezone"),
+	"Reminder": ("event_name", "attendie", "attendie_id", "reminder_datetime", "time_metric")
+}
+
+_MISSING = object()
+
+# Base of the compact row types, which hold a table's rows in memory (see index.py) at a fraction of a dict's size.
+# A row reads like the dict it was built from: get, [], in, keys and items work, so dict(row) gives the dict back.
+# A field a row doesn't carry holds _MISSING, which tells it apart from a field that is None.
+class CompactRecord:
+	__slots__ = ("eid", "extra")
+	fields = frozenset()
+	interned = frozenset()
+
+	def __init__(self, data, eid):
+		self.eid = eid
+		self.extra = None
+		for field in self.__slots__:
+			setattr(self, field, _MISSING)
+		self.update(data)
+
+	def update(self, values):
+		for field, value in values.items():
+			if field in self.interned and type(value) is str:
+				value = sys.intern(value)
+			if field in self.fields:
+				setattr(self, field, value)
+			else:
+				if self.extra is None:
+					self.extra = {}
+				self.extra[field] = value
+
+	def get(self, field, default=None):
+		if field in self.fields:
+			value = getattr(self, field)
+			return default if value is _MISSING else value
+		return self.extra.get(field, default) if self.extra else default
+
+	def __getitem__(self, field):
+		value = self.get(field, _MISSING)
+		if value is _MISSING:
+			raise KeyError(field)
+		return value
+
+	def __contains__(self, field):
+		return self.get(field, _MISSING) is not _MISSING
+
+	def keys(self):
+		return [field for field, value in self.items()]
+
+	# Returns the (field, value) pairs of the row, which is the fast way to copy it: Record(row.items(), row.eid).
+	def items(self):
+		items = [item for item in zip(self.__slots__, self.values_of(self)) if item[1] is not _MISSING]
+		return items + list(self.extra.items()) if self.extra else items
+
+	def __len__(self):
+		return len(self.items())
+
+	def __iter__(self):
+		return iter(self.keys())
+
+	def __eq__(self, other):
+		return dict(self.items()) == (dict(other.items()) if isinstance(other, CompactRecord) else other)
+
+	def __repr__(self):
+		return "{}({!r}, {!r})".format(type(self).__name__, dict(self.items()), self.eid)
+
+# Returns a compact row type with a slot for each of fields, i.e. compact_type("Reply", TABLE_FIELDS["Reply"]).
+def compact_type(table_name, fields, interned=()):
+	return type(table_name + "Record", (CompactRecord,), {
+		"__slots__": tuple(fields), "fields": frozenset(fields), "interned": frozenset(interned),
+		"values_of": staticmethod(attrgetter(*fields))
+	})
+
+# @format: {"Reply": ReplyRecord}
+COMPACT_TYPES = {
+	table_name: compact_type(table_name, fields, INTERNED_FIELDS.get(table_name, ()))
+	for table_name, fields in TABLE_FIELDS.items()
+}
@@ -0,0 +1,140 @@
+import calendar
+import heapq
+import time
+
+from SchedulerBot.storage import Record
+from SchedulerBot.records import event_end
+from SchedulerBot.timeutil import TIMEZONE_OFFSETS, DATE_FORMAT, TIME_FORMAT, SECONDS_PER_DAY
+
+# Rules a series of events can repeat by, with the days between two occurrences.
+# Monthly series repeat on the same day of the month, in the event's time zone, and skip the months too short for it.
+RULE_DAYS = {"weekly": 7, "biweekly": 14, "monthly": None}
+
+# Fields a series keeps on its Event row, next to the usual event fields. Its start_ts and end_ts are None, so the series
+# itself never shows up in start time or overlap lookups; its occurrences are expanded on the fly instead.
+# recurrence: "weekly", "biweekly" or "monthly"
+# recurrence_start_ts: UTC timestamp of the first occurrence
+# recurrence_until_ts: UTC timestamp no occurrence starts at or after, or None
+# recurrence_count: number of weeks (or months) the series runs for, or None. Skipped months count too.
+# exceptions: {"<original start_ts>": {"cancelled": True}} or {"<original start_ts>": {"start_ts": ..., "date": ..., "time": ...}}
+SERIES_FIELDS = ("recurrence", "recurrence_start_ts", "recurrence_until_ts", "recurrence_count", "exceptions")
+
+# Returns the fields that turn an event into a series whose first occurrence starts at start_ts, without exceptions.
+# @param: until_ts is the UTC midnight of the last day the series runs on, count the number of weeks or months it runs for.
+def series_fields(event, rule, start_ts, until_ts=None, count=None):
+	return {
+		"start_ts": None, "end_ts": None, "recurrence": rule, "recurrence_start_ts": start_ts, "recurrence_count": count,
+		"recurrence_until_ts": None if until_ts is None else until_ts + SECONDS_PER_DAY - tz_offset(event), "exceptions": {}
+	}
+
+def tz_offset(event):
+	return TIMEZONE_OFFSETS.get(event.get("timezone"), 0) * 60
+
+# Returns the "YYYY-MM-DD" date and "HH:MMPP" time a UTC timestamp has in an event's time zone.
+def local_date_time(timestamp, event):
+	local = time.gmtime(timestamp + tz_offset(event))
+	return time.strftime(DATE_FORMAT, local), time.strftime(TIME_FORMAT, local)
+
+# Returns the UTC timestamp of the index-th occurrence of a series, or None when that occurrence doesn't exist
+# (a monthly series on the 31st has none in June).
+def nth_occurrence(series, index):
+	first_ts = series["recurrence_start_ts"]
+	days = RULE_DAYS[series["recurrence"]]
+	if days is not None:
+		return first_ts + index * days * SECONDS_PER_DAY
+
+	offset = tz_offset(series)
+	local = time.gmtime(first_ts + offset)
+	months = local.tm_mon - 1 + index
+	year, month = local.tm_year + months // 12, months % 12 + 1
+	if local.tm_mday > calendar.monthrange(year, month)[1]:
+		return None
+	return calendar.timegm((year, month, local.tm_mday, local.tm_hour, local.tm_min, local.tm_sec)) - offset
+
+# Returns an index no later than the first occurrence starting at or after timestamp, so expansion can jump straight
+# to a window instead of walking every occurrence before it.
+def first_index(series, timestamp):
+	first_ts = series["recurrence_start_ts"]
+	if timestamp is None or timestamp <= first_ts:
+		return 0
+	days = RULE_DAYS[series["recurrence"]]
+	if days is not None:
+		return (timestamp - first_ts) // (days * SECONDS_PER_DAY)
+	first, target = time.gmtime(first_ts + tz_offset(series)), time.gmtime(timestamp + tz_offset(series))
+	return max(0, (target.tm_year - first.tm_year) * 12 + target.tm_mon - first.tm_mon - 1)
+
+# Lazily yields the original start times of a series' occurrences from start on (every one when start is None),
+# ignoring its exceptions. Series without an end never stop, so callers bound the walk themselves.
+def original_times(series, start=None):
+	index = first_index(series, start)
+	count = series.get("recurrence_count")
+	until = series.get("recurrence_until_ts")
+	while count is None or index < count:
+		timestamp = nth_occurrence(series, index)
+		index += 1
+		if timestamp is None or (start is not None and timestamp < start):
+			continue
+		if until is not None and timestamp >= until:
+			return
+		yield timestamp
+
+# Returns the original start time of the occurrence of a series on a local "YYYY-MM-DD" date, parsed to the UTC
+# timestamp of its midnight, or None if the series has none that day.
+def find_occurrence(series, date_ts):
+	day_start = date_ts - tz_offset(series)
+	for timestamp in original_times(series, day_start):
+		return timestamp if timestamp < day_start + SECONDS_PER_DAY else None
+	return None
+
+# Returns one occurrence of a series as an event record. It keeps the series' eid, and occurrence_ts holds the
+# original start time its exception would be keyed by. It lasts as long as the series' duration says.
+def occurrence(series, original_ts, exception=None):
+	if exception:
+		start_ts, date, time_str = exception["start_ts"], exception["date"], exception["time"]
+	else:
+		start_ts = original_ts
+		date, time_str = local_date_time(start_ts, series)
+	record = {field: value for field, value in series.items() if field != "exceptions"}
+	record.update({"start_ts": start_ts, "end_ts": event_end(series.get("duration"), start_ts), "date": date, "time": time_str, "occurrence_ts": original_ts})
+	return Record(record, series.eid)
+
+# Lazily yields the occurrences of a series that start in [start, end), ordered by start time, with cancelled
+# occurrences left out and moved ones at their new time.
+# after=(start_ts, eid) skips every occurrence up to and including that one, like Storage.ordered.
+def expand(series, start=None, end=None, after=None):
+	if after is not None and (start is None or after[0] > start):
+		start = after[0]
+	exceptions = series.get("exceptions") or {}
+
+	def in_window(timestamp):
+		return (start is None or timestamp >= start) and (end is None or timestamp < end)
+
+	def regular():
+		for original_ts in original_times(series, start):
+			if end is not None and original_ts >= end:
+				return
+			if str(original_ts) not in exceptions:
+				yield original_ts, original_ts
+
+	moved = sorted((exception["start_ts"], int(original)) for original, exception in exceptions.items()
+		if "start_ts" in exception and in_window(exception["start_ts"]))
+
+	for start_ts, original_ts in heapq.merge(regular(), moved):
+		if after is not None and (start_ts, series.eid) <= tuple(after):
+			continue
+		yield occurrence(series, original_ts, exceptions.get(str(original_ts)))
+
+# Returns the next occurrence of a series that starts after timestamp, or None once the series is over.
+def next_occurrence(series, timestamp):
+	for event in expand(series, timestamp + 1):
+		return event
+	return None
+
+# Describes how a series repeats, i.e. "weekly until 2017-12-31" or "monthly, 6 times".
+def describe(series):
+	description = series["recurrence"]
+	if series.get("recurrence_until_ts") is not None:
+		description += " until {}".format(local_date_time(series["recurrence_until_ts"] - SECONDS_PER_DAY, series)[0])
+	if series.get("recurrence_count") is not None:
+		description += ", {} times".format(series["recurrence_count"])
+	return description
@@ -0,0 +1,131 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Format reminders are stored with, i.e. "2017-06-01 05:30:PM".
+REMINDER_DATETIME_FORMAT = "%Y-%m-%d %I:%M:%p"
+
+# How late a reminder may still go out once the bot starts. Reminders that were due longer ago than this, or whose
+# occurrence already started, are left over from while the bot was down (or from before it polled reminders at all).
+STALE_REMINDER_SECONDS = 60 * 60
+
+# Returns the epoch time a reminder is due at.
+# Reminders carry a UTC timestamp in reminder_ts; older ones only have the local reminder_datetime string.
+def reminder_due_time(reminder):
+	if reminder.get("reminder_ts") is not None:
+		return reminder["reminder_ts"]
+	return time.mktime(datetime.strptime(reminder["reminder_datetime"], REMINDER_DATETIME_FORMAT).timetuple())
+
+# Returns the key a reminder is scheduled under. Reminder eids are only unique within the partition of their guild.
+def reminder_key(reminder):
+	return (reminder.get("guild_id"), reminder.eid)
+
+# Schedules reminders with a min-heap of due times.
+# The run loop sleeps exactly until the next reminder is due (or until a new reminder comes in earlier than that),
+# so an idle bot doesn't wake up or touch storage. Cancelled and rescheduled reminders are dropped lazily from the heap.
+# add and cancel may be called from the storage writer thread, so the heap is guarded by a lock.
+class ReminderScheduler:
+	def __init__(self, callback):
+		# Coroutine function called with the list of reminders that became due.
+		self.callback = callback
+		self.heap = []
+		self.entries = {}
+		self.counter = itertools.count()
+		self.lock = threading.RLock()
+		self.wakeup = asyncio.Event()
+		self.loop = None
+
+	# Wakes the run loop up so it can look at the heap again.
+	def _wake(self):
+		if self.loop is not None:
+			self.loop.call_soon_threadsafe(self.wakeup.set)
+		else:
+			self.wakeup.set()
+
+	# Loads the reminders that haven't been sent yet, i.e. from storage when the bot starts.
+	# Given the time now, reminders that are too late to send (see STALE_REMINDER_SECONDS) aren't scheduled but
+	# returned, so they can be marked as sent without going out.
+	def load(self, reminders, now=None):
+		stale = []
+		with self.lock:
+			for reminder in reminders:
+				if reminder.get("is_sent"):
+					continue
+				due = reminder_due_time(reminder)
+				started = reminder.get("occurrence_ts")
+				if now is not None and (due < now - STALE_REMINDER_SECONDS or (started is not None and started <= now)):
+					stale.append(reminder)
+					continue
+				self.entries[reminder_key(reminder)] = (due, reminder)
+			self.heap = [(due, next(self.counter), key) for key, (due, reminder) in self.entries.items()]
+			heapq.heapify(self.heap)
+		self._wake()
+		return stale
+
+	# Schedules a reminder, replacing the one with the same key if it was already scheduled.
+	def add(self, reminder):
+		due = reminder_due_time(reminder)
+		key = reminder_key(reminder)
+		with self.lock:
+			self.entries[key] = (due, reminder)
+			entry = (due, next(self.counter), key)
+			heapq.heappush(self.heap, entry)
+			earliest = self.heap[0] is entry
+		if earliest:
+			self._wake()
+
+	# Unschedules the reminder with the given key, see reminder_key.
+	def cancel(self, key):
+		with self.lock:
+			self.entries.pop(key, None)
+
+	def __len__(self):
+		return len(self.entries)
+
+	# Drops heap entries that were cancelled or rescheduled.
+	def _prune(self):
+		while self.heap:
+			due, _, key = self.heap[0]
+			if key in self.entries and self.entries[key][0] == due:
+				return
+			heapq.heappop(self.heap)
+
+	# Returns the epoch time of the next reminder, or None when nothing is scheduled.
+	def next_due(self):
+		with self.lock:
+			self._prune()
+			return self.heap[0][0] if self.heap else None
+
+	# Removes and returns every reminder due at or before now.
+	def pop_due(self, now):
+		due_reminders = []
+		with self.lock:
+			while self.next_due() is not None and self.heap[0][0] <= now:
+				due, _, key = heapq.heappop(self.heap)
+				due_reminders.append(self.entries.pop(key)[1])
+		return due_reminders
+
+	@asyncio.coroutine
+	def run(self):
+		self.loop = asyncio.get_event_loop()
+		while True:
+			due = self.next_due()
+			timeout = None if due is None else max(0, due - time.time())
+			try:
+				yield from asyncio.wait_for(self.wakeup.wait(), timeout)
+			except asyncio.TimeoutError:
+				pass
+			self.wakeup.clear()
+
+			reminders = self.pop_due(time.time())
+			if reminders:
+				try:
+					yield from self.callback(reminders)
+				except Exception:
+					log.exception("failed to handle reminders count=%s", len(reminders))
@@ -0,0 +1,145 @@
+from bisect import bisect_left, insort
+from collections import Counter
+
+# Folds a name for matching: case-insensitive, with runs of whitespace collapsed.
+# @param: name "Game  NIGHT" -> "game night"
+def fold(name):
+	return " ".join(str(name).casefold().split())
+
+# Returns the trigrams of a folded name, padded so the first and last letters get trigrams of their own.
+# @param: folded "raid" -> {"  r", " ra", "rai", "aid", "id "}
+def trigrams(folded):
+	padded = "  {} ".format(folded)
+	return set(padded[position:position + 3] for position in range(len(padded) - 2))
+
+# Returns the Levenshtein distance between two strings, or limit + 1 if their lengths alone put it over limit.
+# Uses the bit-parallel algorithm of Myers (as given by Hyyrö): a column of the distance matrix is kept as bits of
+# an int, so the work is a few int operations per letter of b instead of one step per cell.
+def edit_distance(a, b, limit=None):
+	if limit is not None and abs(len(a) - len(b)) > limit:
+		return limit + 1
+	if not a or not b:
+		return len(a) + len(b)
+	masks = {}
+	for position, char in enumerate(a):
+		masks[char] = masks.get(char, 0) | (1 << position)
+	all_bits = (1 << len(a)) - 1
+	last_bit = 1 << (len(a) - 1)
+	positive, negative, distance = all_bits, 0, len(a)
+	for char in b:
+		matched = masks.get(char, 0) | negative
+		diagonal = (((matched & positive) + positive) ^ positive) | matched
+		horizontal_positive = negative | ~(diagonal | positive) & all_bits
+		horizontal_negative = positive & diagonal
+		if horizontal_positive & last_bit:
+			distance += 1
+		elif horizontal_negative & last_bit:
+			distance -= 1
+		horizontal_positive = ((horizontal_positive << 1) | 1) & all_bits
+		horizontal_negative = (horizontal_negative << 1) & all_bits
+		positive = horizontal_negative | ~(diagonal | horizontal_positive) & all_bits
+		negative = horizontal_positive & diagonal
+	return distance
+
+# Index over the values of a text field, i.e. event names, for case-insensitive, prefix and fuzzy lookups.
+# Names are folded first (see fold). Prefix lookups bisect a sorted list of every word start of every name, so
+# "night" finds "Game Night" in O(log n + k). Fuzzy lookups gather candidates from a trigram index and rank them by
+# edit distance.
+# Names given to the constructor are sorted in once, which is how a whole table is indexed.
+class NameIndex:
+	def __init__(self, names=()):
+		# @format: {"game night": {"Game Night": 1}}, how many records carry each spelling of a folded name
+		self.names = {}
+		# @format: [("game night", "game night"), ("night", "game night")], sorted
+		self.word_starts = []
+		# @format: {"gam": {"game night"}}
+		self.grams = {}
+		self.unsorted = True
+		for name in names:
+			self.add(name)
+		self.word_starts.sort()
+		self.unsorted = False
+
+	def add(self, name):
+		folded = fold(name)
+		spellings = self.names.get(folded)
+		if spellings is None:
+			spellings = self.names[folded] = {}
+			for start in _word_starts(folded):
+				if self.unsorted:
+					self.word_starts.append((folded[start:], folded))
+				else:
+					insort(self.word_starts, (folded[start:], folded))
+			for gram in trigrams(folded):
+				self.grams.setdefault(gram, set()).add(folded)
+		spellings[name] = spellings.get(name, 0) + 1
+
+	def discard(self, name):
+		folded = fold(name)
+		spellings = self.names[folded]
+		spellings[name] -= 1
+		if spellings[name] == 0:
+			del spellings[name]
+		if spellings:
+			return
+		del self.names[folded]
+		for start in _word_starts(folded):
+			del self.word_starts[bisect_left(self.word_starts, (folded[start:], folded))]
+		for gram in trigrams(folded):
+			self.grams[gram].discard(folded)
+			if not self.grams[gram]:
+				del self.grams[gram]
+
+	# Returns the spellings of the names that match text case-insensitively.
+	def matching(self, text):
+		return sorted(self.names.get(fold(text), ()))
+
+	# Returns up to limit names that start with text, or have a word that does, in alphabetical order.
+	def prefix(self, text, limit=10):
+		folded = fold(text)
+		found = []
+		position = bisect_left(self.word_starts, (folded,))
+		while position < len(self.word_starts) and len(found) < limit:
+			suffix, name = self.word_starts[position]
+			if not suffix.startswith(folded):
+				break
+			if name not in found:
+				found.append(name)
+			position += 1
+		return [spelling for name in sorted(found) for spelling in sorted(self.names[name])]
+
+	# Returns up to limit (distance, name) pairs of the names within max_distance edits of text, closest first.
+	# max_distance defaults to one edit for every four letters, up to three.
+	# An edit changes at most three trigrams, so a name within k edits shares one of any 3k + 1 trigrams of text.
+	# Candidates come from the postings of the rarest of those, and trigrams no name has count as the rarest of all.
+	# Postings are read rarest first until budget names were counted, since a trigram most names share tells them
+	# apart no better than no trigram at all. The candidates sharing the most trigrams are then checked, at most
+	# max_checks of them, so a lookup stays well under a millisecond however many names there are.
+	def similar(self, text, limit=3, max_distance=None, max_checks=64, budget=2000):
+		folded = fold(text)
+		if not folded:
+			return []
+		if max_distance is None:
+			max_distance = min(3, max(1, len(folded) // 4))
+		postings = sorted((self.grams.get(gram, ()) for gram in trigrams(folded)), key=len)
+
+		counts = Counter()
+		counted = 0
+		for posting in postings[:3 * max_distance + 1]:
+			if counted and counted + len(posting) > budget:
+				break
+			counts.update(posting)
+			counted += len(posting)
+
+		found = []
+		for name, count in counts.most_common(max_checks):
+			distance = edit_distance(folded, name, max_distance)
+			if distance <= max_distance:
+				found.extend((distance, spelling) for spelling in self.names[name])
+		return sorted(found)[:limit]
+
+	def __len__(self):
+		return len(self.names)
+
+def _word_starts(folded):
+	return [0] + [position + 1 for position, char in enumerate(folded) if char == " "]
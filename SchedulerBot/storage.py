@@ -0,0 +1,456 @@
+import json
+import operator
+import os
+import re
+import sqlite3
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import reduce
+
+from tinydb import TinyDB, Query
+from tinydb.table import Document
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import JSONStorage
+
+# Fields that each table is looked up by. Backends that support real indexes build one per entry.
+INDEXES = {
+	"Event": [("name",), ("start_ts",), ("recurrence",)],
+	"Reply": [("event_name", "author")],
+	"Reminder": [("reminder_datetime",)]
+}
+
+# Field names end up inside SQL json paths, so only plain identifiers are allowed.
+FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# A range predicate for search. Matches values with start <= value < end; either bound may be None.
+# i.e. storage.search("Event", date=Range("2017-06-01", "2017-07-01"))
+class Range(namedtuple("Range", ["start", "end"])):
+	def __new__(cls, start=None, end=None):
+		return super(Range, cls).__new__(cls, start, end)
+
+	def matches(self, value):
+		if value is None:
+			return False
+		if self.start is not None and value < self.start:
+			return False
+		if self.end is not None and value >= self.end:
+			return False
+		return True
+
+# A single row handed back by a storage backend.
+# Behaves like the dict TinyDB returns and keeps the row id in eid.
+class Record(dict):
+	def __init__(self, data, eid):
+		super(Record, self).__init__(data)
+		self.eid = eid
+
+# Interface that every storage backend of the bot implements.
+# Tables are addressed by name and rows are plain dicts.
+# Lookups match every given field: plain values are equality matches and Range values are range matches.
+class Storage:
+	# Inserts a record and returns its eid.
+	def insert(self, table_name, record):
+		raise NotImplementedError
+
+	# Inserts many records at once and returns their eids.
+	def insert_multiple(self, table_name, records):
+		return [self.insert(table_name, record) for record in records]
+
+	# Returns every record of the table that matches all the given fields.
+	def search(self, table_name, **fields):
+		raise NotImplementedError
+
+	# Returns every record of the table.
+	def all(self, table_name):
+		return self.search(table_name)
+
+	# Returns the number of records in the table.
+	def count(self, table_name):
+		return len(self.all(table_name))
+
+	# Returns the records whose field falls in the range, ordered by that field and then eid. Records without the field are left out.
+	# after=(value, eid) skips every record up to and including that one, which is how pages continue.
+	# i.e. storage.ordered("Event", "start_ts", Range(now, None), limit=5) -> the next five events
+	def ordered(self, table_name, field, value_range=Range(), limit=None, after=None):
+		records = sorted(self.search(table_name, **{field: value_range}), key=lambda record: (record[field], record.eid))
+		if after is not None:
+			records = [record for record in records if (record[field], record.eid) > tuple(after)]
+		return records if limit is None else records[:limit]
+
+	# Returns the records whose [start_field, end_field) range overlaps [start, end), ordered by start_field and eid.
+	# Records without either field are left out. i.e. overlapping("Event", "start_ts", "end_ts", 1496275200, 1496361600)
+	def overlapping(self, table_name, start_field, end_field, start, end):
+		records = self.ordered(table_name, start_field, Range(None, end))
+		return [record for record in records if record.get(end_field) is not None and record[end_field] > start]
+
+	# Sets values on every record matching the fields. Returns the number of updated records.
+	def update(self, table_name, values, **fields):
+		raise NotImplementedError
+
+	# Removes every record matching the fields. Returns the number of removed records.
+	def remove(self, table_name, **fields):
+		raise NotImplementedError
+
+	# Sets values on the records with the given eids.
+	def update_ids(self, table_name, eids, values):
+		raise NotImplementedError
+
+	# Removes the records with the given eids.
+	def remove_ids(self, table_name, eids):
+		raise NotImplementedError
+
+	# Sets values on the records matching the fields, or inserts one made of the fields, defaults and values if none does.
+	# The lookup and the write happen inside one batch, so on the writer thread nothing can slip in between.
+	# Returns True if a record was inserted.
+	# i.e. storage.upsert("Reply", {"status": "no"}, new_reply_record(...), event_name="Game Night", author="dave")
+	def upsert(self, table_name, values, defaults=None, **fields):
+		with self.batch():
+			eids = [record.eid for record in self.search(table_name, **fields)]
+			if eids:
+				self.update_ids(table_name, eids, values)
+				return False
+			record = dict(defaults or {})
+			record.update(fields)
+			record.update(values)
+			self.insert(table_name, record)
+			return True
+
+	# Inserts a record unless one with the same values for the unique fields exists. Returns its eid, or None if not inserted.
+	# i.e. storage.insert_unique("Event", event_record, "name")
+	def insert_unique(self, table_name, record, *unique_fields):
+		with self.batch():
+			if self.search(table_name, **{field: record[field] for field in unique_fields}):
+				return None
+			return self.insert(table_name, record)
+
+	# Groups every write made inside the block into a single flush to disk.
+	@contextmanager
+	def batch(self):
+		yield
+
+	# Undoes every write made inside the block if the block raises, so a call that fails halfway leaves nothing behind.
+	# It is a batch as well. Backends without savepoints keep the writes made before the failure.
+	@contextmanager
+	def savepoint(self):
+		with self.batch():
+			yield
+
+	def close(self):
+		pass
+
+# Storage backed by TinyDB. This is what the bot always used: the whole json file is rewritten on every write.
+# The file is parsed once and kept in a write cache, so writes inside a batch cost a single rewrite.
+class TinyDBStorage(Storage):
+	def __init__(self, path="db.json"):
+		self.cache = CachingMiddleware(JSONStorage)
+		self.db = TinyDB(path, storage=self.cache)
+		self.depth = 0
+		# Undo steps of the writes made inside the open savepoint, None outside of one.
+		self.undo = None
+
+	# Writes the cache to the file, unless a batch is still open.
+	def _written(self):
+		if self.depth == 0:
+			self.cache.flush()
+
+	@contextmanager
+	def batch(self):
+		self.depth += 1
+		try:
+			yield
+		finally:
+			self.depth -= 1
+			self._written()
+
+	# Writes live in the cache until the batch closes, so a savepoint undoes them in the cache by putting the documents
+	# they touched back, newest write first.
+	@contextmanager
+	def savepoint(self):
+		with self.batch():
+			outer, self.undo = self.undo, []
+			try:
+				yield
+			except:
+				for step in reversed(self.undo):
+					step()
+				self.undo = outer
+				raise
+			if outer is not None:
+				outer.extend(self.undo)
+			self.undo = outer
+
+	# Notes how to undo a write inside a savepoint that is about to change documents, or that inserted the ids inserted.
+	def _keep(self, table_name, documents=(), inserted=()):
+		table = self.db.table(table_name)
+		documents = [Document(dict(document), document.doc_id) for document in documents]
+		def step():
+			table.remove(doc_ids=[doc_id for doc_id in list(inserted) + [document.doc_id for document in documents] if table.contains(doc_id=doc_id)])
+			if documents:
+				table.insert_multiple(documents)
+		self.undo.append(step)
+
+	# Builds a TinyDB query that matches all the given fields.
+	def _query(self, fields):
+		conditions = []
+		for field, value in fields.items():
+			if isinstance(value, Range):
+				conditions.append(Query()[field].test(value.matches))
+			else:
+				conditions.append(Query()[field] == value)
+		return reduce(operator.and_, conditions)
+
+	def _records(self, documents):
+		return [Record(document, document.doc_id) for document in documents]
+
+	def insert(self, table_name, record):
+		eid = self.db.table(table_name).insert(record)
+		if self.undo is not None:
+			self._keep(table_name, inserted=[eid])
+		self._written()
+		return eid
+
+	def insert_multiple(self, table_name, records):
+		eids = self.db.table(table_name).insert_multiple(records)
+		if self.undo is not None:
+			self._keep(table_name, inserted=eids)
+		self._written()
+		return eids
+
+	def search(self, table_name, **fields):
+		table = self.db.table(table_name)
+		if fields:
+			return self._records(table.search(self._query(fields)))
+		return self._records(table.all())
+
+	def update(self, table_name, values, **fields):
+		table = self.db.table(table_name)
+		if self.undo is not None:
+			self._keep(table_name, table.search(self._query(fields)) if fields else table.all())
+		if fields:
+			updated = len(table.update(values, self._query(fields)))
+		else:
+			updated = len(table.update(values))
+		self._written()
+		return updated
+
+	def remove(self, table_name, **fields):
+		table = self.db.table(table_name)
+		if self.undo is not None:
+			self._keep(table_name, table.search(self._query(fields)) if fields else table.all())
+		if fields:
+			removed = len(table.remove(self._query(fields)))
+		else:
+			removed = len(table.remove(doc_ids=[document.doc_id for document in table.all()]))
+		self._written()
+		return removed
+
+	def update_ids(self, table_name, eids, values):
+		if eids:
+			table = self.db.table(table_name)
+			if self.undo is not None:
+				self._keep(table_name, [table.get(doc_id=eid) for eid in eids if table.contains(doc_id=eid)])
+			table.update(values, doc_ids=list(eids))
+			self._written()
+
+	def remove_ids(self, table_name, eids):
+		if eids:
+			table = self.db.table(table_name)
+			if self.undo is not None:
+				self._keep(table_name, [table.get(doc_id=eid) for eid in eids if table.contains(doc_id=eid)])
+			table.remove(doc_ids=list(eids))
+			self._written()
+
+	def close(self):
+		self.db.close()
+
+# Storage backed by SQLite in WAL mode.
+# Every row is kept as a json document, and the fields in INDEXES get real expression indexes,
+# so a lookup such as a reply by event name and author is an index seek instead of a table scan.
+class SQLiteStorage(Storage):
+	def __init__(self, path="db.sqlite3", indexes=INDEXES):
+		self.path = path
+		self.indexes = indexes
+		self.conn = sqlite3.connect(path, check_same_thread=False)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("PRAGMA synchronous=NORMAL")
+		self.tables = set()
+		self.depth = 0
+
+	# Commits the work of a write, unless a batch is still open.
+	@contextmanager
+	def _transaction(self):
+		if self.depth > 0:
+			yield
+		else:
+			with self.conn:
+				yield
+
+	@contextmanager
+	def batch(self):
+		self.depth += 1
+		try:
+			yield
+		except:
+			self.depth -= 1
+			if self.depth == 0:
+				self.conn.rollback()
+				# Tables created inside the batch are gone again.
+				self.tables = set()
+			raise
+		else:
+			self.depth -= 1
+			if self.depth == 0:
+				self.conn.commit()
+
+	# Runs the block inside an SQLite savepoint of the open transaction, rolled back to if the block raises.
+	@contextmanager
+	def savepoint(self):
+		with self.batch():
+			name = "call_{}".format(self.depth)
+			self.conn.execute("SAVEPOINT {}".format(name))
+			try:
+				yield
+			except:
+				self.conn.execute("ROLLBACK TO {}".format(name))
+				self.conn.execute("RELEASE {}".format(name))
+				self.tables = set()
+				raise
+			self.conn.execute("RELEASE {}".format(name))
+
+	# Returns the SQL expression that extracts a field from the stored json document.
+	def _field(self, field):
+		if not FIELD_NAME.match(field):
+			raise ValueError("Invalid field name: {}".format(field))
+		return "json_extract(data, '$.{}')".format(field)
+
+	# Creates the table and its indexes the first time it is used.
+	def _table(self, table_name):
+		if table_name not in self.tables:
+			if not FIELD_NAME.match(table_name):
+				raise ValueError("Invalid table name: {}".format(table_name))
+			with self._transaction():
+				self.conn.execute("CREATE TABLE IF NOT EXISTS \"{}\" (eid INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)".format(table_name))
+				for fields in self.indexes.get(table_name, []):
+					self.conn.execute("CREATE INDEX IF NOT EXISTS \"{}_{}\" ON \"{}\" ({})".format(
+						table_name, "_".join(fields), table_name, ", ".join(self._field(field) for field in fields)))
+			self.tables.add(table_name)
+		return "\"{}\"".format(table_name)
+
+	# Builds the WHERE clause and its parameters that match every field.
+	def _where(self, fields):
+		if not fields:
+			return "", []
+		clauses = []
+		params = []
+		for field, value in fields.items():
+			if isinstance(value, Range):
+				if value.start is not None:
+					clauses.append("{} >= ?".format(self._field(field)))
+					params.append(value.start)
+				if value.end is not None:
+					clauses.append("{} < ?".format(self._field(field)))
+					params.append(value.end)
+				if value.start is None and value.end is None:
+					clauses.append("{} IS NOT NULL".format(self._field(field)))
+			else:
+				clauses.append("{} = ?".format(self._field(field)))
+				params.append(value)
+		return " WHERE " + " AND ".join(clauses), params
+
+	def _rows(self, table_name, fields):
+		table = self._table(table_name)
+		where, params = self._where(fields)
+		return self.conn.execute("SELECT eid, data FROM {}{}".format(table, where), params).fetchall()
+
+	def insert(self, table_name, record):
+		table = self._table(table_name)
+		with self._transaction():
+			cursor = self.conn.execute("INSERT INTO {} (data) VALUES (?)".format(table), (json.dumps(record),))
+		return cursor.lastrowid
+
+	def insert_multiple(self, table_name, records):
+		table = self._table(table_name)
+		eids = []
+		with self._transaction():
+			for record in records:
+				cursor = self.conn.execute("INSERT INTO {} (data) VALUES (?)".format(table), (json.dumps(record),))
+				eids.append(cursor.lastrowid)
+		return eids
+
+	def search(self, table_name, **fields):
+		return [Record(json.loads(data), eid) for eid, data in self._rows(table_name, fields)]
+
+	def update(self, table_name, values, **fields):
+		table = self._table(table_name)
+		rows = self._rows(table_name, fields)
+		with self._transaction():
+			for eid, data in rows:
+				record = json.loads(data)
+				record.update(values)
+				self.conn.execute("UPDATE {} SET data = ? WHERE eid = ?".format(table), (json.dumps(record), eid))
+		return len(rows)
+
+	def update_ids(self, table_name, eids, values):
+		table = self._table(table_name)
+		rows = [self.conn.execute("SELECT eid, data FROM {} WHERE eid = ?".format(table), (eid,)).fetchone() for eid in eids]
+		with self._transaction():
+			for eid, data in [row for row in rows if row]:
+				record = json.loads(data)
+				record.update(values)
+				self.conn.execute("UPDATE {} SET data = ? WHERE eid = ?".format(table), (json.dumps(record), eid))
+
+	def remove(self, table_name, **fields):
+		table = self._table(table_name)
+		where, params = self._where(fields)
+		with self._transaction():
+			cursor = self.conn.execute("DELETE FROM {}{}".format(table, where), params)
+		return cursor.rowcount
+
+	def remove_ids(self, table_name, eids):
+		table = self._table(table_name)
+		with self._transaction():
+			self.conn.executemany("DELETE FROM {} WHERE eid = ?".format(table), [(eid,) for eid in eids])
+
+	def close(self):
+		self.conn.close()
+
+# Opens the storage backend that fits the file: SQLite for .sqlite3/.sqlite/.db files, a journal for .journal files,
+# TinyDB otherwise.
+def open_storage(path):
+	extension = os.path.splitext(path)[1]
+	if extension in (".sqlite3", ".sqlite", ".db"):
+		return SQLiteStorage(path)
+	if extension == ".journal":
+		# journal.py builds on this module, so it's imported here.
+		from SchedulerBot.journal import JournalStorage
+		return JournalStorage(path)
+	return TinyDBStorage(path)
+
+# One-shot migration of an existing TinyDB json file into a SQLite database.
+# Record ids are kept, so anything that refers to an eid stays valid. Returns the number of rows copied per table.
+def migrate_json_to_sqlite(json_path, sqlite_path):
+	with open(json_path) as jfile:
+		data = json.load(jfile)
+
+	storage = SQLiteStorage(sqlite_path)
+	copied = {}
+	try:
+		for table_name, rows in data.items():
+			if table_name == "_default":
+				continue
+			table = storage._table(table_name)
+			with storage.conn:
+				storage.conn.executemany("INSERT INTO {} (eid, data) VALUES (?, ?)".format(table),
+					[(int(eid), json.dumps(record)) for eid, record in rows.items()])
+			copied[table_name] = len(rows)
+	finally:
+		storage.close()
+	return copied
+
+if __name__ == "__main__":
+	if len(sys.argv) != 3:
+		print("Usage: python -m SchedulerBot.storage db.json db.sqlite3")
+		sys.exit(1)
+	for table_name, count in migrate_json_to_sqlite(sys.argv[1], sys.argv[2]).items():
+		print("{}: {} records migrated.".format(table_name, count))
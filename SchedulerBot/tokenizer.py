@@ -0,0 +1,26 @@
+import re
+
+# Prefix that every bot command starts with.
+COMMAND_PREFIX = "!"
+
+# A token is either a phrase in quotes (the closing quote may be missing) or a run of characters without spaces or quotes.
+TOKEN = re.compile(r'"([^"]*)(?:"|$)|([^\s"]+)')
+
+# Splits a message into tokens in one pass. Tokens captured within quotations are treated as a single token.
+# i.e. '"Game Night" yes' -> ["Game Night", "yes"]
+def tokenize(text):
+	tokens = []
+	for match in TOKEN.finditer(text):
+		word = match.group(2)
+		tokens.append(word if word is not None else match.group(1).strip())
+	return tokens
+
+# Splits a message into its lowercased command name and the rest of the message.
+# Returns (None, None) right away for ordinary chat that isn't a command.
+def split_command(content):
+	if not content.startswith(COMMAND_PREFIX):
+		return None, None
+	parts = content.split(None, 1)
+	if not parts:
+		return None, None
+	return parts[0].lower(), (parts[1] if len(parts) > 1 else "")
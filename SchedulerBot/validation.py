@@ -0,0 +1,204 @@
+import calendar
+import re
+
+from SchedulerBot.timeutil import TIMEZONE_OFFSETS, SECONDS_PER_DAY
+
+# Class that represents a rule in order to check discord command inputs.
+# InputRule checks if the arguments of those discord commands pass or fail.
+# And then provides a fail message if it fails.
+# Rules built with a parse function also hand back the parsed value of an argument, so it's never parsed twice.
+# parse raises ValueError for arguments that fail the rule.
+class InputRule:
+	def __init__(self, cond, fail_msg, parse=None):
+		self.cond = cond
+		self.fail_msg = fail_msg
+		self.parse_arg = parse
+
+	def passes(self, args):
+		if self.parse_arg is not None:
+			try:
+				self.parse_arg(args)
+				return True
+			except ValueError:
+				return False
+		if isinstance(args, list):
+			return self.cond(*args)
+		else:
+			return self.cond(args)
+
+	# Returns the parsed value of an argument, raising ValueError if it fails the rule.
+	def parse(self, arg):
+		if self.parse_arg is not None:
+			return self.parse_arg(arg)
+		if not self.passes(arg):
+			raise ValueError(self.fail_msg)
+		return arg
+
+# Checks the positional arguments of a command against a schema of (name, InputRule) pairs.
+# The schema is built once when the bot starts and every argument is checked in one pass.
+class InputRuleChecker:
+	def __init__(self, schema=()):
+		self.schema = list(schema)
+
+	# Returns the parsed arguments by name and the fail messages of every argument that failed.
+	# @param: args ["Game Night", "2017-06-01"] -> ({"name": "Game Night", "date": 1496275200}, [])
+	def check(self, args):
+		values = {}
+		errors = []
+		for (name, rule), arg in zip(self.schema, args):
+			try:
+				values[name] = rule.parse(arg)
+			except ValueError:
+				errors.append(rule.fail_msg)
+		return values, errors
+
+	# Checks "field value" pairs, i.e. the arguments of !edit-event, in one pass.
+	# field_rule checks the field names and value_rules maps a field to the rule of its value. Other values are kept as given.
+	# Returns the values as given, the parsed values by field and the fail messages.
+	def check_pairs(self, args, field_rule, value_rules):
+		values = {}
+		parsed = {}
+		errors = []
+		for position in range(0, len(args) - 1, 2):
+			field, value = args[position], args[position + 1]
+			if not field_rule.passes(field):
+				errors.append(field_rule.fail_msg)
+				continue
+			field = field.lower()
+			values[field] = value
+			if field in value_rules:
+				try:
+					parsed[field] = value_rules[field].parse(value)
+				except ValueError:
+					errors.append(value_rules[field].fail_msg)
+		return values, parsed, errors
+
+DATE_PATTERN = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
+MONTH_PATTERN = re.compile(r"^(\d{4})-(\d{1,2})$")
+TIME_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})([ap]m)$", re.IGNORECASE)
+DURATION_PATTERN = re.compile(r"^(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?$", re.IGNORECASE)
+
+# Parses a "YYYY-MM-DD" date into the UTC timestamp of its midnight.
+def parse_date(date):
+	match = DATE_PATTERN.match(date)
+	if not match:
+		raise ValueError(date)
+	year, month, day = (int(group) for group in match.groups())
+	if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+		raise ValueError(date)
+	return calendar.timegm((year, month, day, 0, 0, 0))
+
+# Parses a "YYYY-MM" month into its "YYYY-MM" form with a zero padded month.
+def parse_month(month):
+	match = MONTH_PATTERN.match(month)
+	if not match or not 1 <= int(match.group(2)) <= 12:
+		raise ValueError(month)
+	return "{}-{:02d}".format(match.group(1), int(match.group(2)))
+
+# Parses a "HH:MMPP" time into seconds after midnight.
+def parse_time(time_str):
+	match = TIME_PATTERN.match(time_str)
+	if not match:
+		raise ValueError(time_str)
+	hour, minute = int(match.group(1)), int(match.group(2))
+	if not 1 <= hour <= 12 or minute > 59:
+		raise ValueError(time_str)
+	return ((hour % 12) + (12 if match.group(3).lower() == "pm" else 0)) * 3600 + minute * 60
+
+# Parses a time zone abbreviation into its offset from UTC in seconds.
+def parse_timezone(tz_str):
+	if tz_str not in TIMEZONE_OFFSETS:
+		raise ValueError(tz_str)
+	return TIMEZONE_OFFSETS[tz_str] * 60
+
+# Parses "YYYY-MM-DD..YYYY-MM-DD" into the UTC timestamps the range starts and ends at. The last day is included.
+def parse_date_range(date_range):
+	dates = date_range.split("..")
+	if len(dates) != 2:
+		raise ValueError(date_range)
+	start, last = parse_date(dates[0]), parse_date(dates[1])
+	if start > last:
+		raise ValueError(date_range)
+	return start, last + SECONDS_PER_DAY
+
+# Returns a parser that accepts one of the given words, case-insensitively, and returns it lowercased.
+def one_of(words):
+	words = frozenset(words)
+	def parse(word):
+		if word.lower() not in words:
+			raise ValueError(word)
+		return word.lower()
+	return parse
+
+# Parses a "1h30m" duration, in days, hours and minutes, into seconds.
+def parse_duration(duration):
+	match = DURATION_PATTERN.match(duration)
+	if not match or not any(match.groups()):
+		raise ValueError(duration)
+	days, hours, minutes = (int(group or 0) for group in match.groups())
+	seconds = days * SECONDS_PER_DAY + hours * 3600 + minutes * 60
+	if seconds <= 0:
+		raise ValueError(duration)
+	return seconds
+
+def parse_number(number):
+	if not number.isdigit():
+		raise ValueError(number)
+	return int(number)
+
+def parse_count(count):
+	if parse_number(count) <= 0:
+		raise ValueError(count)
+	return int(count)
+
+def parse_rate(rate):
+	value = float(rate)
+	if not 0 < value <= 1:
+		raise ValueError(rate)
+	return value
+
+def parse_seconds(seconds):
+	value = float(seconds)
+	if value <= 0:
+		raise ValueError(seconds)
+	return value
+
+# Fields of the Event table. Events always have these, apart from derived fields such as start_ts.
+# duration is optional, events scheduled without one don't have it.
+EVENT_FIELDS = frozenset(["name", "date", "time", "timezone", "description", "author", "created_date", "created_time", "created_timezone", "duration"])
+
+# Fields !edit-event may change. The author stays the host, whose replies and reminders follow from it.
+EDITABLE_EVENT_FIELDS = EVENT_FIELDS - {"author"}
+
+TEXT_RULE = InputRule(lambda x: True, "")
+DATE_RULE = InputRule(None, "Invalid date format. Use: YYYY-MM-DD i.e. 2017-01-01", parse_date)
+TIME_RULE = InputRule(None, "Invalid time format. Use: HH:MMPP i.e. 07:58PM", parse_time)
+DURATION_RULE = InputRule(None, "Invalid duration. Use: 90m, 2h or 1h30m", parse_duration)
+TIMEZONE_RULE = InputRule(None, "Invalid timezone abbreviation.", parse_timezone)
+DATE_RANGE_RULE = InputRule(None, "Invalid date range. Use: YYYY-MM-DD..YYYY-MM-DD i.e. 2017-06-01..2017-06-30", parse_date_range)
+DAY_RULE = InputRule(None, "Invalid day format. Use: today, tomorrow, week or next.", one_of(["today", "tomorrow", "week"]))
+MONTH_RULE = InputRule(None, "Invalid month format. Use: YYYY-MM i.e. 2017-06", parse_month)
+RECURRENCE_RULE = InputRule(None, "Invalid repeat rule. Use: weekly, biweekly or monthly.", one_of(["weekly", "biweekly", "monthly"]))
+REPEAT_END_RULE = InputRule(lambda x: x.lower() in ("until", "count"), "Invalid input: Use until YYYY-MM-DD or count 6.")
+REPEAT_COUNT_RULE = InputRule(None, "Invalid input: Use a number of times i.e. count 6", parse_count)
+COUNT_RULE = InputRule(None, "Invalid input: Use a number of events i.e. !events next 5", parse_count)
+REPLY_STATUS_RULE = InputRule(None, "Invalid input. Use: yes, no, or maybe.", one_of(["yes", "no", "maybe"]))
+NUMBER_RULE = InputRule(None, "Invalid input: bad numeric.", parse_number)
+TIME_METRIC_RULE = InputRule(None, "Invalid input: did not use 'minutes','hours', or 'days'.", one_of(["minutes", "hours", "days"]))
+RATE_RULE = InputRule(None, "Invalid input: Use a sample rate above 0 and up to 1 i.e. 0.1", parse_rate)
+SECONDS_RULE = InputRule(None, "Invalid input: Use a number of seconds i.e. 1.5", parse_seconds)
+EVENT_FIELD_RULE = InputRule(lambda x: x.lower() in EDITABLE_EVENT_FIELDS, "Field does not exist or can't be edited.")
+
+# Arguments of !schedule and !reply. Imported rows are checked against them too.
+SCHEDULE_SCHEMA = [("name", TEXT_RULE), ("date", DATE_RULE), ("time", TIME_RULE), ("timezone", TIMEZONE_RULE), ("description", TEXT_RULE)]
+REPLY_SCHEMA = [("event_name", TEXT_RULE), ("status", REPLY_STATUS_RULE)]
+
+# Rules of the event fields whose values have a format, used by !edit-event.
+EVENT_FIELD_RULES = {"date": DATE_RULE, "time": TIME_RULE, "timezone": TIMEZONE_RULE, "duration": DURATION_RULE}
+
+# Rules of the ways a series can end, used by !repeat.
+REPEAT_END_RULES = {"until": DATE_RULE, "count": REPEAT_COUNT_RULE}
+
+# Returns the UTC timestamp an event starts at from its parsed date, time and time zone.
+def event_timestamp(date_ts, time_seconds, tz_offset):
+	return date_ts + time_seconds - tz_offset
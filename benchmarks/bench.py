@@ -0,0 +1,223 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from SchedulerBot import bot
+from SchedulerBot import validation
+from SchedulerBot.partitions import directory_factory
+from SchedulerBot.archive import ArchiveStore
+from SchedulerBot.storage import TinyDBStorage, SQLiteStorage
+from SchedulerBot.journal import JournalStorage
+from SchedulerBot.timeutil import SECONDS_PER_DAY
+
+# Microbenchmarks of the bot's hot functions against synthetic databases of different sizes.
+# The bot is built without logging into Discord; commands are timed by calling the functions behind them directly.
+# Usage: python -m benchmarks.bench --sizes 1000,100000,1000000 --backends tinydb,sqlite --output results.json
+
+BACKENDS = {
+	"tinydb": (TinyDBStorage, ".json"),
+	"sqlite": (SQLiteStorage, ".sqlite3"),
+	"journal": (JournalStorage, ".journal")
+}
+
+TIMEZONES = ["PST", "EST", "UTC", "CET", "JST"]
+STATUSES = ["yes", "no", "maybe"]
+
+# Each size is a number of records, split between the tables like a busy guild's database.
+EVENT_SHARE = 0.1
+REPLY_SHARE = 0.6
+
+START = validation.DATE_RULE.parse("2030-01-01")
+
+# Returns the event, reply and reminder records of a synthetic database with size records in total.
+def synthetic_records(size):
+	event_count = max(1, int(size * EVENT_SHARE))
+	reply_count = int(size * REPLY_SHARE)
+	reminder_count = size - event_count - reply_count
+
+	events = []
+	for i in range(event_count):
+		start_ts = START + (i * 3571) % (365 * 24 * 60 * 60) // 60 * 60
+		events.append({
+			"name": "Event {}".format(i), "date": time.strftime("%Y-%m-%d", time.gmtime(start_ts)),
+			"time": time.strftime("%I:%M%p", time.gmtime(start_ts)), "timezone": "UTC", "description": "Synthetic event.",
+			"author": "user{}".format(i % 500), "created_date": "2017-06-01", "created_time": "05:30PM", "created_timezone": "UTC",
+			"start_ts": start_ts, "duration": (i % 4 + 1) * 3600, "end_ts": start_ts + (i % 4 + 1) * 3600
+		})
+	replies = [{
+		"event_name": "Event {}".format(i % event_count), "status": STATUSES[i % 3], "author": "user{}".format(i // event_count),
+		"created_date": "2017-06-01", "created_time": "05:30 PM", "created_timezone": "UTC"
+	} for i in range(reply_count)]
+	reminders = [{
+		"event_name": "Event {}".format(i % event_count), "attendie": "user{}".format(i // event_count), "attendie_id": str(i),
+		"reminder_datetime": "2030-01-01 05:00:PM", "reminder_ts": START + i, "time_metric": "minutes", "diff_value": 30,
+		"is_sent": i % 2 == 0
+	} for i in range(reminder_count)]
+	return events, replies, reminders
+
+# Writes a synthetic database of the given size to path with the backend and returns the backend, opened.
+def build_database(backend_name, path, size):
+	backend = BACKENDS[backend_name][0](path)
+	events, replies, reminders = synthetic_records(size)
+	with backend.batch():
+		backend.insert_multiple("Event", events)
+		backend.insert_multiple("Reply", replies)
+		backend.insert_multiple("Reminder", reminders)
+	return backend
+
+# Times fn until it ran iterations times or budget seconds went by, whichever comes first. fn gets the iteration number.
+# setup, when given, runs untimed before every call. Returns the latency of every call in seconds.
+def time_calls(fn, iterations, budget, setup=None):
+	samples = []
+	deadline = time.perf_counter() + budget
+	for i in range(iterations):
+		if setup:
+			setup(i)
+		started = time.perf_counter()
+		fn(i)
+		samples.append(time.perf_counter() - started)
+		if time.perf_counter() > deadline:
+			break
+	return samples
+
+# Returns the peak memory, in bytes, that fn allocated while it ran once.
+def peak_memory(fn, *args, setup=None):
+	if setup:
+		setup(*args)
+	tracemalloc.start()
+	try:
+		fn(*args)
+		return tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+def summarize(backend_name, size, operation, samples, peak_bytes):
+	ordered = sorted(samples)
+	total = sum(samples)
+	return {
+		"backend": backend_name,
+		"size": size,
+		"operation": operation,
+		"iterations": len(samples),
+		"mean_s": total / len(samples),
+		"p50_s": ordered[len(ordered) // 2],
+		"p95_s": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+		"max_s": ordered[-1],
+		"ops_per_s": len(samples) / total if total else None,
+		"peak_bytes": peak_bytes
+	}
+
+# Returns the operations to time as (name, fn, iterations, setup) tuples. Every fn and setup takes the iteration number.
+# Write operations use names of their own, so they neither collide with the synthetic data nor with each other.
+def operations(scheduler_bot, size, iterations):
+	event_count = max(1, int(size * EVENT_SHARE))
+	event = scheduler_bot.get_data("Event", "name", "Event 0")[0]
+	replies = scheduler_bot.get_data("Reply", "event_name", "Event 0")
+	page, _ = scheduler_bot.get_events_page({"start": None, "end": None, "remaining": None})
+	schedule_checker = scheduler_bot.commands["!schedule"]["arguments"]
+	schedule_args = ["Game Night", "2017-06-01", "05:30PM", "PST", "Bring your own beer."]
+	writes = max(1, iterations // 5)
+
+	return [
+		("handle_quotations", lambda i: scheduler_bot.handle_quotations(["\"Overwatch", "Night\"", "yes"]), iterations, None),
+		("validate_date", lambda i: validation.DATE_RULE.passes("2017-06-01"), iterations, None),
+		("validate_time", lambda i: validation.TIME_RULE.passes("05:30PM"), iterations, None),
+		("validate_timezone", lambda i: validation.TIMEZONE_RULE.passes(TIMEZONES[i % len(TIMEZONES)]), iterations, None),
+		("check_schedule_arguments", lambda i: schedule_checker.check(schedule_args), iterations, None),
+		("format_events", lambda i: scheduler_bot.format_events(page), iterations, None),
+		("format_single_event", lambda i: scheduler_bot.format_single_event(event, replies), iterations, None),
+		("get_event", lambda i: scheduler_bot.get_data("Event", "name", "Event {}".format(i % event_count)), iterations, None),
+		("suggest_event_name", lambda i: scheduler_bot.find_event_name("Evnt {}".format(i % event_count)), iterations, None),
+		("get_events_page", lambda i: scheduler_bot.get_events_page({"start": START + i * 3600, "end": None, "remaining": None}), iterations, None),
+		("find_overlapping_events", lambda i: scheduler_bot.find_overlapping_events(START + i * 3600, START + i * 3600 + 3 * 3600), iterations, None),
+		("get_availability", lambda i: scheduler_bot.get_availability(START + i * SECONDS_PER_DAY, START + (i + 1) * SECONDS_PER_DAY, "user{}".format(i % 500)), iterations, None),
+		("get_reminders_by_event", lambda i: scheduler_bot.get_data("Reminder", event_name="Event {}".format(i % event_count)), iterations, None),
+		("get_pending_reminders", lambda i: scheduler_bot.get_pending_reminders(), max(1, iterations // 10), None),
+		("create_event", lambda i: scheduler_bot.create_event("Bench {}".format(i), "2030-06-01", "05:30PM", "UTC", "Benchmark.", "bench"), writes, None),
+		("create_reply", lambda i: scheduler_bot.create_reply("Bench 0", STATUSES[i % 3], "bench{}".format(i)), writes, None),
+		("delete_event", lambda i: scheduler_bot.delete_event("Doomed {}".format(i), "bench"), writes,
+			lambda i: scheduler_bot.create_event("Doomed {}".format(i), "2030-06-01", "05:30PM", "UTC", "Benchmark.", "bench"))
+	]
+
+# Runs every operation against a database of the given size and returns their summaries.
+def run_size(backend_name, size, iterations, budget, directory):
+	path = os.path.join(directory, "bench-{}{}".format(size, BACKENDS[backend_name][1]))
+	results = []
+
+	started = time.perf_counter()
+	backend = build_database(backend_name, path, size)
+	build_seconds = time.perf_counter() - started
+
+	# Loading covers opening the partition, building its in-memory indexes and backfilling start times.
+	# It runs once, under tracemalloc, so its time includes the tracing overhead.
+	scheduler_bot = None
+	def load():
+		nonlocal scheduler_bot
+		scheduler_bot = bot.SchedulerBot("benchmark", backend, directory_factory(os.path.join(directory, "guilds")),
+			ArchiveStore(os.path.join(directory, "archive")))
+		for table_name in ("Event", "Reply", "Reminder"):
+			scheduler_bot.storage.table(table_name)
+	load_started = time.perf_counter()
+	load_peak = peak_memory(load)
+	results.append(summarize(backend_name, size, "load", [time.perf_counter() - load_started], load_peak))
+	results[-1]["build_s"] = build_seconds
+
+	for name, fn, count, setup in operations(scheduler_bot, size, iterations):
+		# Collect the garbage of the previous operation, so it isn't charged to this one.
+		gc.collect()
+		samples = time_calls(fn, count, budget, setup)
+		peak = peak_memory(fn, len(samples), setup=setup)
+		results.append(summarize(backend_name, size, name, samples, peak))
+		print("{:8} {:>9} {:26} {:>10.1f} us/op {:>12.0f} ops/s {:>12} bytes peak".format(
+			backend_name, size, name, results[-1]["mean_s"] * 1e6, results[-1]["ops_per_s"] or 0, peak))
+
+	scheduler_bot.data.stop()
+	scheduler_bot.partitions.close()
+	return results
+
+# Returns the commit the benchmarks ran on, if the tree is a git checkout.
+def git_commit():
+	try:
+		return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmarks SchedulerBot against synthetic databases.")
+	parser.add_argument("--sizes", default="1000,100000,1000000", help="Comma separated database sizes, in records.")
+	parser.add_argument("--backends", default="tinydb,sqlite", help="Comma separated storage backends: tinydb, sqlite, journal.")
+	parser.add_argument("--iterations", type=int, default=200, help="Calls per read operation. Writes get a fifth of it.")
+	parser.add_argument("--budget", type=float, default=5.0, help="Seconds each operation may run for before it stops early.")
+	parser.add_argument("--output", default="benchmark-results.json", help="File the results are written to as JSON.")
+	args = parser.parse_args(argv)
+
+	results = []
+	with tempfile.TemporaryDirectory(prefix="schedulerbot-bench-") as directory:
+		for backend_name in args.backends.split(","):
+			for size in [int(size) for size in args.sizes.split(",")]:
+				results.extend(run_size(backend_name, size, args.iterations, args.budget, directory))
+
+	report = {
+		"meta": {
+			"commit": git_commit(),
+			"python": platform.python_version(),
+			"platform": platform.platform(),
+			"time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+			"iterations": args.iterations,
+			"budget_s": args.budget
+		},
+		"results": results
+	}
+	with open(args.output, "w") as output:
+		json.dump(report, output, indent=2)
+	print("Results written to {}".format(args.output))
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
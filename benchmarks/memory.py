@@ -0,0 +1,59 @@
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+from SchedulerBot.index import TableIndex, HASH_INDEXES, SORTED_INDEXES
+from SchedulerBot.records import COMPACT_TYPES
+from SchedulerBot.storage import Record
+
+# Measures how much memory the in-memory indexes of index.py hold per Reply row, with rows kept as dicts (Record)
+# and as compact rows (see records.py).
+# Rows are decoded from JSON one by one, like a storage backend hands them over, so every row brings its own copy
+# of each string. Only what the index keeps once loading is done counts.
+# Usage: python -m benchmarks.memory --rows 1000000
+
+STATUSES = ["yes", "no", "maybe"]
+
+# Returns the index-th synthetic reply: 5000 events and 20000 authors, who reply over a month.
+# Authors reply once per event, as !reply keeps it, so each event gets up to 200 replies from different authors.
+def synthetic_reply(index):
+	author = (index // 5000 + index * 37) % 20000
+	return {
+		"event_name": "Event {}".format(index % 5000), "status": STATUSES[index % 3],
+		"author": "user{}#{:04}".format(author, author % 9973), "created_date": "2017-06-{:02}".format(index % 30 + 1),
+		"created_time": "{:02}:{:02} PM".format(index % 12 + 1, index % 60), "created_timezone": "Coordinated Universal Time"
+	}
+
+# Loads rows replies into a Reply index of row_type and returns (bytes held, seconds taken).
+def measure(row_type, rows):
+	gc.collect()
+	tracemalloc.start()
+	started = time.perf_counter()
+	try:
+		index = TableIndex(HASH_INDEXES["Reply"], SORTED_INDEXES.get("Reply", []), row_type=row_type)
+		for eid in range(1, rows + 1):
+			index.add(row_type(json.loads(json.dumps(synthetic_reply(eid))), eid))
+		seconds = time.perf_counter() - started
+		gc.collect()
+		return tracemalloc.get_traced_memory()[0], seconds
+	finally:
+		tracemalloc.stop()
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Measures the memory SchedulerBot's indexes hold per Reply row.")
+	parser.add_argument("--rows", type=int, default=1000000, help="Number of Reply rows to load.")
+	args = parser.parse_args(argv)
+
+	results = {}
+	for label, row_type in (("dict", Record), ("compact", COMPACT_TYPES["Reply"])):
+		held, seconds = measure(row_type, args.rows)
+		results[label] = held
+		print("{:8} {:>10} rows {:>8.0f} bytes/row {:>8.1f} MiB {:>6.1f} s".format(
+			label, args.rows, held / args.rows, held / 2 ** 20, seconds))
+	print("compact rows hold {:.1f}x less".format(results["dict"] / results["compact"]))
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
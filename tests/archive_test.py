@@ -0,0 +1,45 @@
+import unittest
+import shutil
+import tempfile
+from SchedulerBot import archive
+from SchedulerBot.index import IndexedStorage
+from SchedulerBot.storage import SQLiteStorage
+
+JUNE_1 = 1496275200
+JULY_1 = 1498867200
+
+class ArchiveStoreTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.archive = archive.ArchiveStore(self.directory, ".json")
+        self.storage = IndexedStorage(SQLiteStorage(":memory:"))
+        for name, start_ts in (("Game Night", JUNE_1), ("Movie Night", JULY_1), ("Board Games", JULY_1 + 86400), ("Undated", None)):
+            self.storage.insert("Event", {"name": name, "start_ts": start_ts})
+            self.storage.insert("Reply", {"event_name": name, "author": "dave", "status": "yes"})
+            self.storage.insert("Reminder", {"event_name": name, "attendie": "dave", "is_sent": True})
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.directory)
+
+    def test_move_in_batches(self):
+        events, reminders = self.archive.move(self.storage, "1234", JULY_1 + 2 * 86400, 2)
+        self.assertEqual([event["name"] for event in events], ["Game Night", "Movie Night"], "Oldest events not moved first.")
+        self.assertEqual(len(reminders), 2, "Reminders not moved with their events.")
+        self.assertEqual(sorted(event["name"] for event in self.storage.all("Event")), ["Board Games", "Undated"], "Wrong events left.")
+        self.assertEqual(len(self.storage.all("Reply")), 2, "Replies not moved with their events.")
+
+        events, reminders = self.archive.move(self.storage, "1234", JULY_1 + 2 * 86400, 2)
+        self.assertEqual([event["name"] for event in events], ["Board Games"], "Wrong second batch.")
+        self.assertEqual(self.archive.move(self.storage, "1234", JULY_1 + 2 * 86400, 2), ([], []), "Undated event moved.")
+        self.assertEqual(self.archive.months("1234"), ["2017-06", "2017-07"], "Wrong archived months.")
+
+    def test_read_archived_month(self):
+        self.archive.move(self.storage, None, JULY_1 + 2 * 86400, 10)
+        events = self.archive.ordered(None, "2017-07", "Event", "start_ts")
+        self.assertEqual([event["name"] for event in events], ["Movie Night", "Board Games"], "Wrong archived events.")
+        self.assertEqual(self.archive.ordered(None, "2017-08", "Event", "start_ts"), [], "Missing month not empty.")
+        self.assertEqual(self.archive.months(None), ["2017-06", "2017-07"], "Missing month created.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+import asyncio
+from SchedulerBot import storage
+from SchedulerBot import async_storage
+
+class AsyncStorageTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.data = async_storage.AsyncStorage(storage.SQLiteStorage(":memory:"), window=0.05)
+
+    def tearDown(self):
+        self.data.stop()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_group_commit(self):
+        writes = [self.data.run(self.data.storage.insert, "Reply", {"author": str(i)}) for i in range(200)]
+        eids = self.loop.run_until_complete(asyncio.gather(*writes))
+        self.assertEqual(len(set(eids)), 200, "Not every write returned its eid.")
+        self.assertLess(self.data.flushes, 10, "Writes were not grouped into a few flushes.")
+        self.assertEqual(len(self.data.storage.all("Reply")), 200, "Writes missing from storage.")
+
+    def test_errors_reach_the_caller(self):
+        def broken():
+            raise ValueError("broken")
+        with self.assertRaises(ValueError):
+            self.loop.run_until_complete(self.data.run(broken))
+
+    def test_failed_call_leaves_no_writes(self):
+        def half_written():
+            self.data.storage.insert("Reply", {"author": "dave"})
+            raise ValueError("broken")
+        calls = [self.data.run(self.data.storage.insert, "Reply", {"author": "anna"}), self.data.run(half_written)]
+        results = self.loop.run_until_complete(asyncio.gather(*calls, return_exceptions=True))
+        self.assertIsInstance(results[1], ValueError, "Error not reported.")
+        self.assertEqual([reply["author"] for reply in self.data.storage.all("Reply")], ["anna"], "Failed call left writes behind.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 from SchedulerBot import bot
+from SchedulerBot.storage import SQLiteStorage
 import json
 
 class BotTestSuite(unittest.TestCase):
@@ -36,5 +37,72 @@ class BotTestSuite(unittest.TestCase):
     def test_has_digit(self):
         self.assertEqual(self.bot.has_digit("wwwoooo0wwww"), True, "Invalid check for digit.")
 
+# Runs on in-memory storage, without tokens.json.
+class ConflictsTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.bot = bot.SchedulerBot("token", storage=SQLiteStorage(":memory:"), partition_factory=lambda key: SQLiteStorage(":memory:"))
+
+    def test_conflicts_and_availability(self):
+        parsed = {"duration": 3 * 3600}
+        self.bot.create_event("Game Night", "2030-01-05", "07:00PM", "UTC", "Fun.", "dave", parsed=parsed)
+        self.bot.create_event("Brunch", "2030-01-05", "10:00AM", "UTC", "Food.", "anna")
+        response = self.bot.create_event("Raid", "2030-01-05", "09:00PM", "UTC", "Boss.", "anna")
+        self.assertNotIn("Heads up", response, "Conflict reported without shared attendees.")
+        response = self.bot.create_reply("Raid", "yes", "dave")
+        self.assertIn("Game Night on 2030-01-05 07:00PM UTC, with dave going", response, "Conflict not reported on reply.")
+        response = self.bot.create_event("Late Raid", "2030-01-05", "09:30PM", "UTC", "Boss.", "dave")
+        self.assertIn("Game Night", response, "Conflict not reported on schedule.")
+        self.assertIn("Raid on", response, "Conflict with a replied event not reported.")
+
+        day = bot.DATE_RULE.parse("2030-01-05")
+        found = self.bot.get_availability(day, day + bot.SECONDS_PER_DAY, "anna")
+        self.assertEqual([(start - day, end - day, [event["name"] for event in events] if events else None) for start, end, events in found], [
+            (0, 10 * 3600, None), (10 * 3600, 11 * 3600, ["Brunch"]), (11 * 3600, 21 * 3600, None), (21 * 3600, 22 * 3600, ["Raid"]),
+            (22 * 3600, 24 * 3600, None)], "Wrong windows.")
+        busy = [window for window in self.bot.get_availability(day, day + bot.SECONDS_PER_DAY) if window[2]]
+        self.assertEqual([(start - day, end - day) for start, end, events in busy], [(10 * 3600, 11 * 3600), (19 * 3600, 22 * 3600 + 30 * 60)], "Wrong busy windows.")
+
+class EventsPageTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.bot = bot.SchedulerBot("token", storage=SQLiteStorage(":memory:"), partition_factory=lambda key: SQLiteStorage(":memory:"))
+
+    def test_dates_are_local(self):
+        self.bot.create_event("Game Night", "2030-06-01", "05:30PM", "PST", "Fun.", "dave")
+        self.bot.create_event("Brunch", "2030-06-02", "01:00AM", "UTC", "Food.", "anna")
+        day = bot.DATE_RULE.parse("2030-06-01")
+        events, has_more = self.bot.get_events_page(self.bot.local_dates_query(day, day + bot.SECONDS_PER_DAY))
+        self.assertEqual([event["name"] for event in events], ["Game Night"], "Events not picked by their local date.")
+        events, has_more = self.bot.get_events_page(self.bot.local_dates_query(day + bot.SECONDS_PER_DAY, day + 2 * bot.SECONDS_PER_DAY))
+        self.assertEqual([event["name"] for event in events], ["Brunch"], "Event listed under its UTC date.")
+
+class RemindersTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.bot = bot.SchedulerBot("token", storage=SQLiteStorage(":memory:"), partition_factory=lambda key: SQLiteStorage(":memory:"))
+        self.addCleanup(self.bot.data.stop)
+        self.bot.create_event("Game Night", "2030-06-01", "05:30PM", "PST", "Fun.", "dave")
+        self.bot.create_reply("Game Night", "yes", "dave")
+        self.bot.create_reminder("Game Night", "dave", "hours", 1)
+
+    def test_reminder_of_unknown_member_marked_sent(self):
+        reminders = self.bot.reminder_scheduler.pop_due(float("inf"))
+        self.bot.loop.run_until_complete(self.bot.handle_reminders(reminders))
+        self.assertEqual([reminder["is_sent"] for reminder in self.bot.get_data("Reminder")], [True], "Undeliverable reminder dropped.")
+
+    def test_rename_and_retime_moves_reminders(self):
+        self.bot.edit_event("Game Night", "dave", {"name": "Board Games", "time": "06:30PM"})
+        reminders = self.bot.get_data("Reminder")
+        self.assertEqual([reminder["event_name"] for reminder in reminders], ["Board Games"], "Reminder not renamed with its event.")
+        self.assertEqual(reminders[0]["reminder_ts"], self.bot.get_data("Event", "name", "Board Games")[0]["start_ts"] - 3600, "Reminder not moved.")
+        self.assertEqual(self.bot.reminder_scheduler.pop_due(float("inf"))[0]["event_name"], "Board Games", "Scheduled reminder not renamed.")
+
+    def test_rename_carries_replies_and_reminders(self):
+        self.bot.create_reply("Game Night", "maybe", "anna")
+        self.bot.edit_event("Game Night", "dave", {"name": "Board Games"})
+        self.assertEqual(sorted(reply["author"] for reply in self.bot.get_data("Reply", event_name="Board Games")), ["anna", "dave"], "Replies not renamed.")
+        self.assertIn("anna", self.bot.format_single_event(self.bot.get_data("Event", "name", "Board Games")[0]), "Replies missing from !event.")
+        self.assertEqual(self.bot.get_data("Reminder", event_name="Game Night"), [], "Reminder left under the old name.")
+        self.assertEqual(self.bot.delete_event("Board Games", "dave"), "Event successfully deleted.", "Renamed event not deleted.")
+        self.assertEqual((self.bot.get_data("Reminder"), len(self.bot.reminder_scheduler)), ([], 0), "Reminders outlived their renamed event.")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from SchedulerBot import cache
+
+class RenderCacheTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.cache = cache.RenderCache(2)
+
+    def test_bump_invalidates_only_its_scope(self):
+        game_night = self.cache.key("event Game Night", ("Event", "g1", "Game Night"))
+        raid = self.cache.key("event Raid", ("Event", "g1", "Raid"))
+        self.cache.put(game_night, "game night")
+        self.cache.put(raid, "raid")
+        self.cache.bump(("Event", "g1", "Game Night"))
+        self.assertIsNone(self.cache.get(self.cache.key("event Game Night", ("Event", "g1", "Game Night"))), "Stale entry served.")
+        self.assertEqual(self.cache.get(self.cache.key("event Raid", ("Event", "g1", "Raid"))), "raid", "Untouched entry invalidated.")
+
+    def test_lru_eviction(self):
+        self.cache.put("a", 1)
+        self.cache.put("b", 2)
+        self.cache.get("a")
+        self.cache.put("c", 3)
+        self.assertIsNone(self.cache.get("b"), "Least recently used entry kept.")
+        self.assertEqual(self.cache.get("a"), 1, "Recently used entry evicted.")
+        stats = self.cache.stats()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"], stats["evictions"]), (2, 2, 1, 1), "Wrong stats.")
+
+if __name__ == '__main__':
+    unittest.main()
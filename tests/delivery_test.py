@@ -0,0 +1,50 @@
+import unittest
+import asyncio
+from collections import namedtuple
+from SchedulerBot import delivery
+
+Member = namedtuple("Member", ["id", "name"])
+
+class MemberIndexTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.members = delivery.MemberIndex()
+        self.members.load([Member("1", "dave"), Member("2", "anna")])
+
+    def test_find(self):
+        self.assertEqual(self.members.find("2", "nobody"), Member("2", "anna"), "Member not found by id.")
+        self.assertEqual(self.members.find(None, "dave"), Member("1", "dave"), "Member not found by name.")
+
+    def test_update_and_remove(self):
+        self.members.update(Member("1", "dave"), Member("1", "david"))
+        self.assertEqual(self.members.find(None, "dave"), None, "Old name still indexed.")
+        self.assertEqual(self.members.find(None, "david"), Member("1", "david"), "New name not indexed.")
+        self.members.remove(Member("2", "anna"))
+        self.assertEqual(len(self.members), 1, "Member not removed.")
+
+    def test_remove_from_one_guild(self):
+        self.members.load([Member("1", "dave"), Member("1", "dave"), Member("2", "anna")])
+        self.members.remove(Member("1", "dave"))
+        self.assertEqual(self.members.find("1", "dave"), Member("1", "dave"), "Member forgotten while still in another guild.")
+        self.members.remove(Member("1", "dave"))
+        self.assertEqual(self.members.find("1", "dave"), None, "Member kept after leaving every guild.")
+
+class SendAllTestSuite(unittest.TestCase):
+    def test_send_all_returns_sent_keys(self):
+        sent = []
+
+        @asyncio.coroutine
+        def send(destination, content):
+            if destination == "broken":
+                raise RuntimeError("Cannot send.")
+            sent.append(content)
+            yield from asyncio.sleep(0)
+
+        jobs = [("dave", "one", 1), ("broken", "two", 2), ("anna", "three", 3)]
+        loop = asyncio.new_event_loop()
+        sent_keys = loop.run_until_complete(delivery.send_all(send, jobs, limit=2))
+        loop.close()
+        self.assertEqual(sent_keys, [1, 3], "Wrong messages reported as sent.")
+        self.assertEqual(sorted(sent), ["one", "three"], "Wrong messages sent.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import asyncio
+from SchedulerBot import dispatcher
+
+class RateLimited(Exception):
+    status = 429
+    retry_after = 0.01
+
+# Local stand-in for discord.Client that answers the first rate_limits sends with a 429.
+class FakeClient:
+    def __init__(self, rate_limits=0):
+        self.rate_limits = rate_limits
+        self.sent = []
+
+    @asyncio.coroutine
+    def send_message(self, destination, content):
+        yield from asyncio.sleep(0)
+        if self.rate_limits > 0:
+            self.rate_limits -= 1
+            raise RateLimited()
+        self.sent.append((destination, content))
+        return content
+
+class MessageDispatcherTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.workers = []
+
+    # Stops the run loops of the test, which cancel the deliveries they still have in flight.
+    def tearDown(self):
+        for worker in self.workers:
+            worker.cancel()
+        if self.workers:
+            self.loop.run_until_complete(asyncio.wait(self.workers))
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def start(self, queue):
+        self.workers.append(self.loop.create_task(queue.run()))
+
+    def run_dispatcher(self, client, messages, **kwargs):
+        queue = dispatcher.MessageDispatcher(client.send_message, backoff=0.01, **kwargs)
+        futures = [queue.enqueue(*message) for message in messages]
+        self.start(queue)
+        self.loop.run_until_complete(asyncio.wait(futures, timeout=5))
+        return queue, futures
+
+    def test_retries_rate_limited_sends(self):
+        client = FakeClient(rate_limits=2)
+        queue, futures = self.run_dispatcher(client, [("general", "hello")])
+        self.assertEqual(futures[0].result(), "hello", "Message not sent after rate limits.")
+        self.assertEqual(queue.stats()["rate_limited"], 2, "Rate limits not counted.")
+
+    def test_coalesces_messages_to_same_channel(self):
+        client = FakeClient()
+        queue, futures = self.run_dispatcher(client, [("general", "one"), ("general", "two"), ("random", "three")])
+        self.assertIn(("general", "one\ntwo"), client.sent, "Messages to the same channel not joined.")
+        self.assertEqual(queue.stats()["coalesced"], 1, "Coalesced messages not counted.")
+
+    def test_does_not_coalesce_past_length_limit(self):
+        client = FakeClient()
+        long_message = "x" * 1500
+        self.run_dispatcher(client, [("general", long_message), ("general", long_message)])
+        self.assertEqual(len(client.sent), 2, "Messages over the length limit were joined.")
+
+    def test_commands_go_before_reminders(self):
+        client = FakeClient()
+        self.run_dispatcher(client, [
+            ("dave", "reminder", dispatcher.PRIORITY_REMINDER),
+            ("general", "reply", dispatcher.PRIORITY_COMMAND)
+        ])
+        self.assertEqual([content for _, content in client.sent], ["reply", "reminder"], "Reminder sent before command reply.")
+
+    def test_cancelled_waiters_do_not_stop_the_queue(self):
+        client = FakeClient(rate_limits=1)
+        queue = dispatcher.MessageDispatcher(client.send_message, backoff=0.01)
+        cancelled = [queue.enqueue("general", "one"), queue.enqueue("random", "two")]
+        for future in cancelled:
+            future.cancel()
+        future = queue.enqueue("other", "three")
+        self.start(queue)
+        self.loop.run_until_complete(asyncio.wait([future], timeout=5))
+        self.assertEqual(future.result(), "three", "Message after cancelled waiters not sent.")
+
+    def test_token_bucket_delay(self):
+        now = [0.0]
+        bucket = dispatcher.TokenBucket(rate=1, capacity=1, clock=lambda: now[0])
+        self.assertEqual(bucket.delay(), 0, "Full bucket should not wait.")
+        bucket.take()
+        self.assertAlmostEqual(bucket.delay(), 1.0, msg="Empty bucket should wait for a token.")
+        now[0] = 1.0
+        self.assertEqual(bucket.delay(), 0, "Bucket not refilled.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import io
+from SchedulerBot import importer
+from SchedulerBot.index import IndexedStorage
+from SchedulerBot.storage import SQLiteStorage
+
+EVENTS_CSV = """name,date,time,timezone,description,author,duration
+Game Night,2017-06-01,05:30PM,PST,Bring your own beer.,dave,3h
+Raid,2017-06-02,08:00PM,UTC,Weekly raid.,,
+Game Night,2017-06-03,05:30PM,PST,Duplicate.,dave,
+Broken,2017-02-30,25:00PM,XXX,Bad values.,dave,
+"""
+
+REPLIES_CSV = """event_name,status,author
+Game Night,yes,anna
+Game Night,no,anna
+Raid,maybe,dave
+Nothing,yes,dave
+"""
+
+ICS = """BEGIN:VCALENDAR
+BEGIN:VEVENT
+SUMMARY:Movie Night
+DTSTART;TZID=PST:20170610T193000
+DTEND;TZID=PST:20170610T220000
+RRULE:FREQ=WEEKLY;INTERVAL=2;COUNT=4
+DESCRIPTION:Popcorn\\, snacks
+  and drinks.
+ORGANIZER;CN="Anna":mailto:anna@example.com
+ATTENDEE;CN=dave;PARTSTAT=ACCEPTED:mailto:dave@example.com
+ATTENDEE;CN=bob;PARTSTAT=NEEDS-ACTION:mailto:bob@example.com
+END:VEVENT
+BEGIN:VEVENT
+SUMMARY:Somewhere Else
+DTSTART;TZID=Europe/Paris:20170610T193000
+END:VEVENT
+END:VCALENDAR
+"""
+
+class ImporterTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.storage = IndexedStorage(SQLiteStorage(":memory:"))
+        self.importer = importer.Importer("admin", chunk_size=2)
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_csv_events_and_replies(self):
+        self.importer.run(self.storage, importer.read_csv(io.StringIO(EVENTS_CSV)))
+        self.importer.run(self.storage, importer.read_csv(io.StringIO(REPLIES_CSV)))
+
+        events = {event["name"]: event for event in self.storage.all("Event")}
+        self.assertEqual(sorted(events), ["Game Night", "Raid"], "Wrong events imported.")
+        self.assertEqual(events["Raid"]["author"], "admin", "Default author not used.")
+        self.assertEqual(events["Game Night"]["start_ts"], 1496367000, "Start time not computed.")
+        self.assertEqual(events["Game Night"]["end_ts"], 1496367000 + 3 * 3600, "End time not computed from the duration.")
+        self.assertIsNone(events["Raid"]["duration"], "Missing duration not left empty.")
+        replies = {reply["author"]: reply["status"] for reply in self.storage.all("Reply")}
+        self.assertEqual(replies, {"anna": "no", "dave": "maybe"}, "Wrong replies imported.")
+        self.assertEqual(events["Game Night"]["rsvps"], {"anna": "no"}, "RSVP aggregates not updated.")
+        self.assertEqual(events["Raid"]["rsvp_counts"], {"yes": 0, "no": 0, "maybe": 1}, "RSVP counts not updated.")
+        self.assertEqual((self.importer.events, self.importer.replies, self.importer.error_count), (2, 2, 3), "Wrong counts.")
+        self.assertEqual([line for line, message in self.importer.errors], [4, 5, 5], "Wrong error lines.")
+        self.assertIn("Event Game Night already created.", self.importer.errors[0][1], "Duplicate not reported.")
+
+    def test_ics(self):
+        rows = list(importer.read_ics(io.StringIO(ICS)))
+        self.assertEqual([kind for line, kind, fields in rows], ["event", "reply", "error"], "Wrong rows read.")
+        self.assertEqual(rows[0][2]["description"], "Popcorn, snacks and drinks.", "Folded text not unfolded.")
+
+        self.importer.run(self.storage, rows)
+        event = self.storage.all("Event")[0]
+        self.assertEqual((event["name"], event["author"], event["date"], event["time"], event["timezone"]),
+                         ("Movie Night", "Anna", "2017-06-10", "07:30PM", "PST"), "Wrong event imported.")
+        self.assertEqual((event["recurrence"], event["recurrence_count"]), ("biweekly", 4), "Repeat rule not imported.")
+        self.assertEqual(event["duration"], 9000, "Duration not taken from DTEND.")
+        self.assertEqual(self.storage.all("Reply")[0]["author"], "dave", "Attendee not imported.")
+        self.assertEqual(self.importer.errors, [(13, "Unknown time zone Europe/Paris.")], "Wrong errors.")
+
+    def test_report_keeps_first_errors(self):
+        rows = [(line, "error", {"error": "Bad row."}) for line in range(5)]
+        report = importer.Importer("admin", max_errors=2).run(self.storage, rows)
+        self.assertEqual(report.splitlines(), ["Imported 0 events and 0 replies. 5 rows failed.", "Line 0: Bad row.",
+                                               "Line 1: Bad row.", "... and 3 more errors."], "Wrong report.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from SchedulerBot import storage
+from SchedulerBot import index
+
+class IndexedStorageTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.storage = index.IndexedStorage(storage.SQLiteStorage(":memory:"))
+        self.storage.insert("Reply", {"event_name": "Game Night", "author": "dave", "status": "yes"})
+        self.storage.insert("Reply", {"event_name": "Game Night", "author": "anna", "status": "maybe"})
+        self.storage.insert("Reply", {"event_name": "Raid", "author": "dave", "status": "no"})
+
+    def test_multi_field_search(self):
+        replies = self.storage.search("Reply", event_name="Game Night", author="dave", status="yes")
+        self.assertEqual(len(replies), 1, "Wrong replies returned.")
+        self.assertEqual(self.storage.search("Reply", event_name="Game Night", author="dave", status="no"), [], "Status not checked.")
+
+    def test_update_keeps_indexes_in_sync(self):
+        self.storage.update("Reply", {"event_name": "Raid"}, author="anna")
+        self.assertEqual(len(self.storage.search("Reply", event_name="Raid")), 2, "Index not updated.")
+        self.assertEqual(len(self.storage.search("Reply", event_name="Game Night")), 1, "Stale index entry left.")
+        self.assertEqual(len(self.storage.backend.search("Reply", event_name="Raid")), 2, "Backend not updated.")
+
+    def test_text_index_kept_in_sync(self):
+        eid = self.storage.insert("Event", {"name": "Game Night"})
+        names = self.storage.text_index("Event", "name")
+        self.assertEqual(names.matching("game night"), ["Game Night"], "Existing name not indexed.")
+        self.storage.update_ids("Event", [eid], {"name": "Board Night"})
+        self.storage.insert("Event", {"name": "Raid"})
+        self.assertEqual(names.prefix("game"), [], "Word prefixes of the old name are kept.")
+        self.assertEqual(names.similar("Bord Night"), [(1, "Board Night")], "Renamed event not indexed.")
+        self.storage.remove("Event", name="Raid")
+        self.assertEqual(names.matching("raid"), [], "Removed event still indexed.")
+
+    def test_single_eid_buckets(self):
+        hashes = self.storage.table("Reply").hashes
+        self.assertIsInstance(hashes[("event_name", "author")][("Raid", "dave")], int, "Single eid kept in a set.")
+        eid = self.storage.insert("Reply", {"event_name": "Raid", "author": "dave", "status": "yes"})
+        self.assertEqual(len(self.storage.search("Reply", event_name="Raid", author="dave")), 2, "Second eid lost.")
+        self.storage.remove_ids("Reply", [eid])
+        self.assertIsInstance(hashes[("event_name", "author")][("Raid", "dave")], int, "Bucket not collapsed.")
+        self.assertEqual(self.storage.search("Reply", event_name="Raid", author="dave")[0]["status"], "no", "Wrong eid left.")
+        self.storage.remove("Reply", event_name="Raid")
+        self.assertNotIn(("Raid",), hashes[("event_name",)], "Empty bucket left.")
+
+    def test_overlapping_kept_in_sync(self):
+        game_night = self.storage.insert("Event", {"name": "Game Night", "start_ts": 100, "end_ts": 200})
+        self.storage.insert("Event", {"name": "Raid", "start_ts": 150, "end_ts": 300})
+        self.storage.insert("Event", {"name": "Series", "start_ts": None, "end_ts": None})
+        names = lambda start, end: [event["name"] for event in self.storage.overlapping("Event", "start_ts", "end_ts", start, end)]
+        self.assertEqual(names(180, 190), ["Game Night", "Raid"], "Overlaps not found.")
+        self.storage.update_ids("Event", [game_night], {"start_ts": 400, "end_ts": 500})
+        self.storage.insert("Event", {"name": "Brunch", "start_ts": 0, "end_ts": 120})
+        self.assertEqual(names(100, 160), ["Brunch", "Raid"], "Moved event still found at its old time.")
+        self.assertEqual(names(450, 460), ["Game Night"], "Moved event not found at its new time.")
+        self.storage.remove("Event", name="Raid")
+        self.assertEqual(names(100, 160), ["Brunch"], "Removed event found.")
+        self.assertEqual(storage.Storage.overlapping(self.storage, "Event", "start_ts", "end_ts", 100, 460), [
+            event for event in self.storage.overlapping("Event", "start_ts", "end_ts", 100, 460)], "Differs from a scan.")
+
+    def test_range_search(self):
+        for reminder_datetime in ("2017-06-01 07:00:PM", "2017-06-02 07:00:PM", "2017-06-03 07:00:PM"):
+            self.storage.insert("Reminder", {"event_name": "Raid", "reminder_datetime": reminder_datetime})
+        reminders = self.storage.search("Reminder", reminder_datetime=storage.Range("2017-06-02", "2017-06-03"))
+        self.assertEqual([reminder["reminder_datetime"] for reminder in reminders], ["2017-06-02 07:00:PM"], "Wrong range returned.")
+
+    def test_ordered_range(self):
+        for name, start_ts in (("Raid", 300), ("Game Night", 100), ("Movie", 200), ("Draft", None)):
+            self.storage.insert("Event", {"name": name, "start_ts": start_ts})
+        events = self.storage.ordered("Event", "start_ts", storage.Range(150, None), limit=1)
+        self.assertEqual([event["name"] for event in events], ["Movie"], "Wrong events returned.")
+        events = self.storage.ordered("Event", "start_ts")
+        self.assertEqual([event["name"] for event in events], ["Game Night", "Movie", "Raid"], "Events not in order.")
+        events = self.storage.ordered("Event", "start_ts", limit=2, after=(events[0]["start_ts"], events[0].eid))
+        self.assertEqual([event["name"] for event in events], ["Movie", "Raid"], "Page did not continue after the cursor.")
+
+    def test_remove(self):
+        self.storage.remove("Reply", event_name="Game Night")
+        self.assertEqual(len(self.storage.all("Reply")), 1, "Records not removed.")
+        self.assertEqual(self.storage.search("Reply", author="anna"), [], "Index entry left after removal.")
+
+    def test_failed_batch_reloads_indexes(self):
+        with self.assertRaises(RuntimeError):
+            with self.storage.batch():
+                self.storage.insert("Reply", {"event_name": "Raid", "author": "anna", "status": "yes"})
+                self.storage.update("Reply", {"status": "yes"}, event_name="Raid", author="dave")
+                raise RuntimeError("Flush failed.")
+        self.assertEqual(self.storage.search("Reply", author="anna", event_name="Raid"), [], "Rolled back insert still indexed.")
+        self.assertEqual(self.storage.search("Reply", event_name="Raid")[0]["status"], "no", "Rolled back update still indexed.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import random
+import unittest
+from SchedulerBot import intervals
+
+class IntervalTreeTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.tree = intervals.IntervalTree([(10, 20, "a"), (15, 40, "b"), (30, 35, "c")])
+
+    def test_overlapping(self):
+        self.assertEqual(self.tree.overlapping(18, 32), [(10, 20, "a"), (15, 40, "b"), (30, 35, "c")], "Overlaps not found.")
+        self.assertEqual(self.tree.overlapping(36, 50), [(15, 40, "b")], "Long range not found.")
+        self.assertEqual(self.tree.overlapping(20, 30), [(15, 40, "b")], "Touching ranges counted.")
+        self.assertEqual(self.tree.overlapping(0, 10), [], "Range before every start matched.")
+
+    def test_add_and_remove(self):
+        self.tree.add(5, 12, "d")
+        self.assertEqual(self.tree.overlapping(0, 11), [(5, 12, "d"), (10, 20, "a")], "Added range not found.")
+        self.assertTrue(self.tree.remove(15, "b"), "Range not removed.")
+        self.assertFalse(self.tree.remove(15, "b"), "Range removed twice.")
+        self.assertEqual(self.tree.overlapping(36, 50), [], "Removed range found.")
+        self.assertEqual(len(self.tree), 3, "Wrong size.")
+
+    def test_matches_scan(self):
+        generator = random.Random(7)
+        ranges = set()
+        tree = intervals.IntervalTree()
+        for key in range(2000):
+            start = generator.randint(0, 10000)
+            added = (start, start + generator.randint(1, 500), key)
+            ranges.add(added)
+            tree.add(*added)
+        for start, end, key in generator.sample(sorted(ranges), 700):
+            tree.remove(start, key)
+            ranges.discard((start, end, key))
+        for _ in range(300):
+            start = generator.randint(-100, 10600)
+            end = start + generator.randint(1, 800)
+            expected = sorted((found for found in ranges if found[0] < end and found[1] > start), key=lambda found: (found[0], found[2]))
+            self.assertEqual(tree.overlapping(start, end), expected, "Overlaps of {}..{} differ from a scan.".format(start, end))
+
+    def test_windows(self):
+        found = intervals.windows([(0, 10, "a"), (5, 20, "b"), (20, 25, "c"), (30, 40, "d")], 2, 35)
+        self.assertEqual(found, [(2, 25, ["a", "b", "c"]), (25, 30, None), (30, 35, ["d"])], "Wrong windows.")
+        self.assertEqual(intervals.windows([], 0, 10), [(0, 10, None)], "Free day not returned.")
+
+if __name__ == '__main__':
+    unittest.main()
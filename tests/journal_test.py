@@ -0,0 +1,106 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from SchedulerBot import journal
+from SchedulerBot.storage import Range, open_storage
+
+class JournalStorageTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "db.journal")
+        self.storage = journal.JournalStorage(self.path)
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.directory)
+
+    def reopen(self, **kwargs):
+        self.storage.close()
+        self.storage = journal.JournalStorage(self.path, **kwargs)
+
+    def test_insert_update_remove_survive_reopen(self):
+        eid = self.storage.insert("Event", {"name": "Game Night", "date": "2017-06-01"})
+        self.storage.insert("Reply", {"event_name": "Game Night", "author": "dave", "status": "yes"})
+        self.storage.update("Event", {"date": "2017-06-02"}, name="Game Night")
+        self.storage.remove("Reply", author="dave")
+        self.reopen()
+
+        self.assertEqual(self.storage.search("Event", name="Game Night")[0]["date"], "2017-06-02", "Update not replayed.")
+        self.assertEqual(self.storage.search("Event", name="Game Night")[0].eid, eid, "Record id not kept.")
+        self.assertEqual(self.storage.all("Reply"), [], "Remove not replayed.")
+        self.assertEqual(self.storage.search("Event", date=Range("2017-06-02", None))[0]["name"], "Game Night", "Range search failed.")
+
+    def test_write_appends_one_line(self):
+        self.storage.insert("Event", {"name": "Game Night"})
+        size = os.path.getsize(self.path)
+        self.storage.insert("Reply", {"event_name": "Game Night", "author": "dave", "status": "yes"})
+        appended = os.path.getsize(self.path) - size
+        self.assertTrue(0 < appended < 300, "Reply should append a few hundred bytes at most.")
+
+    def test_batch_writes_once(self):
+        with self.storage.batch():
+            self.storage.insert("Event", {"name": "Game Night"})
+            self.assertEqual(os.path.getsize(self.path), 0, "Batch should not write before it ends.")
+            self.storage.insert("Event", {"name": "Movie Night"})
+        with open(self.path) as jfile:
+            self.assertEqual(len(jfile.readlines()), 2, "Wrong number of journal lines.")
+
+    def test_savepoint(self):
+        eid = self.storage.insert("Event", {"name": "Game Night"})
+        with self.assertRaises(RuntimeError):
+            with self.storage.savepoint():
+                self.storage.insert("Reply", {"event_name": "Game Night"})
+                self.storage.update_ids("Event", [eid], {"name": "Raid"})
+                raise RuntimeError("Call failed.")
+        self.reopen()
+        self.assertEqual((self.storage.count("Reply"), self.storage.all("Event")), (0, [{"name": "Game Night"}]), "Savepoint not undone.")
+        self.assertEqual(self.storage.insert("Reply", {"event_name": "Game Night"}), 1, "Undone insert used up an id.")
+
+    def test_compaction(self):
+        self.reopen(compact_bytes=500)
+        for i in range(20):
+            self.storage.insert("Event", {"name": "Event {}".format(i)})
+        self.assertTrue(os.path.exists(self.path + ".snapshot"), "Journal not compacted.")
+        self.assertTrue(os.path.getsize(self.path) < 500, "Journal not emptied by compaction.")
+        self.storage.remove("Event", name="Event 19")
+        self.reopen()
+        self.assertEqual(self.storage.count("Event"), 19, "Wrong records after compaction.")
+        self.assertEqual(self.storage.insert("Event", {"name": "New"}), 21, "Record ids reused after compaction.")
+
+    def test_torn_tail_is_dropped(self):
+        self.storage.insert("Event", {"name": "Game Night"})
+        self.storage.close()
+        with open(self.path, "ab") as jfile:
+            jfile.write(b"{\"seq\": 2, \"op\": \"ins")
+        self.reopen()
+        self.assertEqual([event["name"] for event in self.storage.all("Event")], ["Game Night"], "Wrong records after recovery.")
+        self.storage.insert("Event", {"name": "Movie Night"})
+        self.reopen()
+        self.assertEqual(self.storage.count("Event"), 2, "Append after recovery lost.")
+
+    def test_crash_between_snapshot_and_truncate(self):
+        self.storage.insert("Event", {"name": "Game Night"})
+        with open(self.path, "rb") as jfile:
+            lines = jfile.read()
+        self.storage.compact()
+        self.storage.close()
+        # Puts back the journal lines the snapshot already holds, as if the journal was never emptied.
+        with open(self.path, "wb") as jfile:
+            jfile.write(lines)
+        self.reopen()
+        self.assertEqual(self.storage.count("Event"), 1, "Journal replayed twice.")
+
+    def test_tinydb_file_as_snapshot(self):
+        self.storage.close()
+        os.remove(self.path)
+        with open(self.path + ".snapshot", "w") as jfile:
+            json.dump({"_default": {}, "Event": {"3": {"name": "Game Night"}}}, jfile)
+        self.storage = open_storage(self.path)
+        self.assertIsInstance(self.storage, journal.JournalStorage, "Wrong backend opened.")
+        self.assertEqual(self.storage.all("Event")[0].eid, 3, "Record id not kept.")
+        self.assertEqual(self.storage.insert("Event", {"name": "Movie Night"}), 4, "Wrong next record id.")
+
+if __name__ == '__main__':
+    unittest.main()
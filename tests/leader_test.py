@@ -0,0 +1,92 @@
+import unittest
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from SchedulerBot import leader
+from SchedulerBot import partitions
+
+# A shard process against a fake gateway: every process is handed every due reminder, like each one would find it in
+# storage, but only the lease holder sends it. Answers (reminder, pid, token) when it sent it and (reminder, pid, None) if not.
+def run_shard(path, ttl, gateway):
+    lease = leader.Lease(path, "shard-0", ttl=ttl)
+    while True:
+        lease.acquire()
+        if gateway.poll(ttl / 5):
+            reminder = gateway.recv()
+            gateway.send((reminder, os.getpid(), lease.token if lease.held() else None))
+
+class LeaseTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "leases.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_single_holder(self):
+        first = leader.Lease(self.path, "shard-0", ttl=30)
+        second = leader.Lease(self.path, "shard-0", ttl=30)
+        self.assertTrue(first.acquire(now=100), "Free lease not taken.")
+        self.assertFalse(second.acquire(now=110), "Held lease taken.")
+        self.assertTrue(first.acquire(now=120), "Lease not renewed.")
+        self.assertFalse(second.acquire(now=140), "Renewed lease taken.")
+        self.assertTrue(second.acquire(now=150), "Expired lease not taken over.")
+        self.assertEqual(second.token, 2, "Token not incremented on takeover.")
+        self.assertFalse(first.acquire(now=151), "Old holder kept the lease.")
+        self.assertFalse(first.held(), "Old holder thinks it holds the lease.")
+
+        second.release()
+        self.assertTrue(first.acquire(now=152), "Released lease not taken.")
+        self.assertEqual(first.token, 3, "Token reset by release.")
+        self.assertTrue(leader.Lease(self.path, "shard-1").acquire(), "Leases of other shards not separate.")
+        first.close()
+        second.close()
+
+    def test_failover_across_processes(self):
+        ttl = 0.3
+        shards = []
+        for _ in range(3):
+            gateway, connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=run_shard, args=(self.path, ttl, connection), daemon=True)
+            process.start()
+            shards.append((process, gateway))
+
+        sent = []
+        try:
+            for reminder in range(20):
+                if reminder == 10:
+                    holder = [process for process, gateway in shards if process.pid == sent[-1][1]][0]
+                    holder.terminate()
+                    holder.join()
+                    shards = [(process, gateway) for process, gateway in shards if process is not holder]
+                # A reminder stays due until someone sends it, like an unsent reminder stays in storage.
+                deadline = time.monotonic() + 10 * ttl
+                while not [answer for answer in sent if answer[0] == reminder] and time.monotonic() < deadline:
+                    for process, gateway in shards:
+                        gateway.send(reminder)
+                    for process, gateway in shards:
+                        answer = gateway.recv()
+                        if answer[2] is not None:
+                            sent.append(answer)
+        finally:
+            for process, gateway in shards:
+                process.terminate()
+                process.join()
+
+        self.assertEqual([answer[0] for answer in sent], list(range(20)), "Reminders not sent exactly once.")
+        holders = [(pid, token) for reminder, pid, token in sent]
+        self.assertEqual(len(set(holders[:10])), 1, "More than one holder before the failover.")
+        self.assertEqual(len(set(holders[10:])), 1, "More than one holder after the failover.")
+        self.assertNotEqual(holders[0][0], holders[-1][0], "No standby took over.")
+        self.assertGreater(holders[-1][1], holders[0][1], "Token not incremented on failover.")
+
+class ShardTestSuite(unittest.TestCase):
+    def test_shard_of(self):
+        self.assertEqual(partitions.shard_of(None, 4), 0, "Direct messages not on shard 0.")
+        self.assertEqual(partitions.shard_of("81384788765712384", 4), (81384788765712384 >> 22) % 4, "Wrong shard.")
+        self.assertEqual(partitions.shard_of("81384788765712384-123", 4), partitions.shard_of("81384788765712384", 4), "Channel not on its guild's shard.")
+
+if __name__ == '__main__':
+    unittest.main()
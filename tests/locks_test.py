@@ -0,0 +1,63 @@
+import unittest
+import asyncio
+from SchedulerBot import locks
+from SchedulerBot import storage
+from SchedulerBot import async_storage
+
+class KeyedLocksTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.locks = locks.KeyedLocks()
+        self.data = async_storage.AsyncStorage(storage.SQLiteStorage(":memory:"), window=0.001)
+
+    def tearDown(self):
+        self.data.stop()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    # Checks in one storage call and writes in the next, like !reply does.
+    @asyncio.coroutine
+    def reply(self, event_name, author):
+        with (yield from self.locks.acquire(("Event", 1, event_name))):
+            if not (yield from self.data.run(self.data.storage.search, "Reply", event_name=event_name, author=author)):
+                yield from self.data.run(self.data.storage.insert, "Reply", {"event_name": event_name, "author": author})
+
+    def test_concurrent_commands(self):
+        commands = [self.reply("Event {}".format(i % 50), "user {}".format(i % 100)) for i in range(500)]
+        self.loop.run_until_complete(asyncio.gather(*commands))
+        replies = set((reply["event_name"], reply["author"]) for reply in self.data.storage.all("Reply"))
+        self.assertEqual(self.data.storage.count("Reply"), 100, "Duplicate replies were written.")
+        self.assertEqual(len(replies), 100, "Replies missing.")
+        self.assertEqual(self.locks.stats()["keys"], 0, "Locks not forgotten once released.")
+        self.assertEqual(self.locks.stats()["acquired"], 500, "Wrong number of acquisitions.")
+
+    def test_other_keys_do_not_wait(self):
+        @asyncio.coroutine
+        def run():
+            held = yield from self.locks.acquire("a")
+            other = yield from asyncio.wait_for(self.locks.acquire("b"), 1)
+            waiting = asyncio.ensure_future(self.locks.acquire("a", "b"))
+            yield from asyncio.sleep(0.01)
+            self.assertFalse(waiting.done(), "Lock taken twice.")
+            held.__exit__(None, None, None)
+            other.__exit__(None, None, None)
+            with (yield from waiting):
+                self.assertTrue(self.locks.locked("a") and self.locks.locked("b"), "Keys not locked.")
+        self.loop.run_until_complete(run())
+        self.assertEqual(self.locks.locks, {}, "Locks not forgotten once released.")
+
+    def test_cancelled_wait(self):
+        @asyncio.coroutine
+        def run():
+            with (yield from self.locks.acquire("a")):
+                waiting = asyncio.ensure_future(self.locks.acquire("b", "a"))
+                yield from asyncio.sleep(0.01)
+                waiting.cancel()
+                yield from asyncio.sleep(0.01)
+                self.assertFalse(self.locks.locked("b"), "Lock kept by a cancelled wait.")
+        self.loop.run_until_complete(run())
+        self.assertEqual(self.locks.locks, {}, "Locks not forgotten once released.")
+
+if __name__ == '__main__':
+    unittest.main()
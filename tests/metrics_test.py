@@ -0,0 +1,40 @@
+import unittest
+import urllib.request
+from SchedulerBot import metrics
+
+class MetricsTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("command_seconds", "Command latency.", ["command"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, command="!events")
+        histogram.observe(0.5, command="!events")
+        histogram.observe(2.0, command="!events")
+        lines = self.registry.render().splitlines()
+        self.assertIn('command_seconds_bucket{command="!events",le="0.1"} 1', lines, "Wrong bucket count.")
+        self.assertIn('command_seconds_bucket{command="!events",le="1.0"} 2', lines, "Buckets not cumulative.")
+        self.assertIn('command_seconds_bucket{command="!events",le="+Inf"} 3', lines, "Wrong +Inf bucket.")
+        self.assertIn('command_seconds_sum{command="!events"} 2.55', lines, "Wrong sum.")
+        self.assertIn('command_seconds_count{command="!events"} 3', lines, "Wrong count.")
+
+    def test_counter_and_gauge(self):
+        self.registry.counter("operations_total", "Operations.", ["operation"]).inc(operation="insert")
+        self.registry.gauge("queue_depth", "Queue depth.", lambda: 4)
+        lines = self.registry.render().splitlines()
+        self.assertIn('# TYPE operations_total counter', lines, "Missing type.")
+        self.assertIn('operations_total{operation="insert"} 1', lines, "Wrong counter.")
+        self.assertIn('queue_depth 4', lines, "Wrong gauge.")
+
+    def test_server(self):
+        self.registry.gauge("queue_depth", "Queue depth.", lambda: 4)
+        server = metrics.MetricsServer(self.registry, 0)
+        server.start()
+        try:
+            body = urllib.request.urlopen("http://127.0.0.1:{}/metrics".format(server.port)).read().decode("utf-8")
+        finally:
+            server.stop()
+        self.assertIn("queue_depth 4", body, "Metrics not served.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import shutil
+import tempfile
+from SchedulerBot import partitions
+from SchedulerBot import storage
+
+class PartitionManagerTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.partitions = partitions.PartitionManager(storage.SQLiteStorage(":memory:"),
+            partitions.directory_factory(self.directory, ".sqlite3"), idle_seconds=60)
+
+    def tearDown(self):
+        self.partitions.close()
+        shutil.rmtree(self.directory)
+
+    def test_guilds_are_separate(self):
+        self.partitions.get("1").insert("Event", {"name": "Game Night"})
+        self.assertEqual(self.partitions.get("2").search("Event", name="Game Night"), [], "Event leaked into another guild.")
+        self.assertEqual(len(self.partitions.get("1").search("Event", name="Game Night")), 1, "Event missing from its guild.")
+
+    def test_evict_idle(self):
+        self.partitions.get("1").insert("Event", {"name": "Game Night"})
+        self.assertEqual(self.partitions.evict_idle(now=0), [], "Busy partition evicted.")
+        self.assertEqual(self.partitions.evict_idle(now=float("inf")), ["1"], "Idle partition not evicted.")
+        self.assertEqual(len(self.partitions.get("1").all("Event")), 1, "Partition not reloaded from disk.")
+
+    def test_scan(self):
+        self.partitions.get("1").insert("Reminder", {"is_sent": False})
+        self.partitions.get("2").insert("Reminder", {"is_sent": True})
+        self.partitions.evict_idle(now=float("inf"))
+        found = dict((key, len(records)) for key, records in self.partitions.scan("Reminder", is_sent=False))
+        self.assertEqual(found, {None: 0, "1": 1, "2": 0}, "Wrong reminders found across partitions.")
+
+    def test_migrate_default(self):
+        self.partitions.get().insert("Event", {"name": "Game Night"})
+        self.partitions.get().insert("Reply", {"event_name": "Game Night", "status": "yes"})
+        self.assertEqual(self.partitions.migrate_default("1"), {"Event": 1, "Reply": 1, "Reminder": 0}, "Wrong records moved.")
+        self.assertEqual(len(self.partitions.get("1").search("Event", name="Game Night")), 1, "Event not moved into the guild.")
+        self.assertEqual(self.partitions.get().all("Event"), [], "Event left in the default partition.")
+
+        self.partitions.get().insert("Event", {"name": "Direct"})
+        self.assertEqual(self.partitions.migrate_default("1"), {}, "Migration ran twice.")
+        self.assertEqual(len(self.partitions.get().all("Event")), 1, "Later record moved out of the default partition.")
+
+    def test_peek_leaves_partition_closed(self):
+        self.partitions.get("1").insert("Event", {"name": "Game Night"})
+        self.partitions.evict_idle(now=float("inf"))
+        self.assertEqual(self.partitions.peek("1", lambda storage: storage.count("Event")), 1, "Closed partition not read.")
+        self.assertNotIn("1", self.partitions.partitions, "Peeked partition left open.")
+
+    def test_other_shards_skipped(self):
+        self.partitions.get("1").insert("Reminder", {"is_sent": False})
+        self.partitions.get("2").insert("Reminder", {"is_sent": False})
+        self.partitions.owns = lambda key: key != "2"
+        self.assertEqual(self.partitions.keys(), [None, "1"], "Partition of another shard listed.")
+        self.assertEqual([key for key, records in self.partitions.scan("Reminder")], [None, "1"], "Partition of another shard scanned.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from SchedulerBot import profiling
+
+class CommandProfilerTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = profiling.CommandProfiler(path=os.path.join(self.directory, "slow.log"), slow_seconds=1.0)
+
+    def tearDown(self):
+        self.profiler.close()
+        shutil.rmtree(self.directory)
+
+    def test_off_by_default(self):
+        self.assertIsNone(self.profiler.maybe_start(), "Profiled while off.")
+        self.assertFalse(self.profiler.is_slow(0.5), "Fast command counted as slow.")
+        self.assertTrue(self.profiler.is_slow(1.5), "Slow command not caught.")
+
+    def test_slow_command_with_profile(self):
+        self.profiler.sample_rate = 1.0
+        profile = self.profiler.maybe_start()
+        self.assertIsNotNone(profile, "Command not sampled.")
+        self.assertIsNone(self.profiler.maybe_start(), "Two commands profiled at once.")
+        sorted(range(1000))
+        self.profiler.stop(profile)
+
+        self.profiler.record_slow({"command": "!events", "content": "!events week", "guild_id": "1", "seconds": 1.5}, profile)
+        with open(os.path.join(self.directory, "slow.log")) as slow_log:
+            entry = json.loads(slow_log.readline())
+        self.assertEqual((entry["command"], entry["sampled"]), ("!events", True), "Wrong slow command entry.")
+        self.assertIn("cumulative", entry["profile"], "Call stacks missing.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import sys
+import unittest
+from SchedulerBot import records
+
+class RecordsTestSuite(unittest.TestCase):
+    def test_rsvp_fields(self):
+        fields = records.rsvp_fields([{"author": "dave", "status": "yes"}, {"author": "anna", "status": "maybe"}])
+        self.assertEqual(fields["rsvps"], {"dave": "yes", "anna": "maybe"}, "Wrong rsvps.")
+        self.assertEqual(fields["rsvp_counts"], {"yes": 1, "no": 0, "maybe": 1}, "Wrong counts.")
+        self.assertEqual(records.rsvp_fields([])["rsvp_counts"], {"yes": 0, "no": 0, "maybe": 0}, "Empty counts missing.")
+
+    def test_updated_rsvps(self):
+        event = records.rsvp_fields([{"author": "dave", "status": "yes"}])
+        updated = records.updated_rsvps(event, {"dave": "no", "anna": "yes"})
+        self.assertEqual(updated["rsvps"], {"dave": "no", "anna": "yes"}, "Wrong rsvps.")
+        self.assertEqual(updated["rsvp_counts"], {"yes": 1, "no": 1, "maybe": 0}, "Changed status not moved.")
+        self.assertEqual(event["rsvps"], {"dave": "yes"}, "Event modified in place.")
+        self.assertEqual(records.updated_rsvps(updated, {"dave": "no"}), updated, "Same status counted twice.")
+
+    def test_attendees(self):
+        event = dict(records.rsvp_fields([{"author": "anna", "status": "yes"}, {"author": "bob", "status": "maybe"}]), author="dave")
+        self.assertEqual(records.attendees(event), {"anna", "dave"}, "Host or yes replies missing.")
+        event["rsvps"]["dave"] = "no"
+        self.assertEqual(records.attendees(event), {"anna"}, "Host who said no counted.")
+
+    def test_compact_record(self):
+        data = {"event_name": "Game" + " Night", "status": "yes", "author": "dave", "created_date": None, "imported_from": "csv"}
+        row = records.COMPACT_TYPES["Reply"](data, 7)
+        self.assertEqual(dict(row), data, "Fields lost.")
+        self.assertEqual(row.eid, 7, "Wrong eid.")
+        self.assertIs(row["event_name"], sys.intern("Game Night"), "Name not interned.")
+        self.assertIn("created_date", row, "Field set to None is missing.")
+        self.assertNotIn("created_time", row, "Unset field is present.")
+        self.assertEqual(row.get("created_time", "-"), "-", "Wrong default.")
+        self.assertRaises(KeyError, lambda: row["created_time"])
+        self.assertFalse(hasattr(row, "__dict__"), "Row has a dict of its own.")
+        row.update({"status": "no", "note": "late"})
+        self.assertEqual((row["status"], row["note"]), ("no", "late"), "Update not applied.")
+
+if __name__ == '__main__':
+    unittest.main()
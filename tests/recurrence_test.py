@@ -0,0 +1,53 @@
+import unittest
+from SchedulerBot import recurrence
+from SchedulerBot.storage import Record
+
+DAY = 24 * 60 * 60
+# 2017-06-01 04:30PM PST
+FIRST = 1496363400
+
+def series(rule, **fields):
+    record = {"name": "Game Night", "timezone": "PST", "start_ts": None, "recurrence": rule, "recurrence_start_ts": FIRST,
+              "recurrence_until_ts": None, "recurrence_count": None, "exceptions": {}}
+    record.update(fields)
+    return Record(record, 7)
+
+class RecurrenceTestSuite(unittest.TestCase):
+    def test_expand_window(self):
+        weekly = series("weekly")
+        occurrences = list(recurrence.expand(weekly, FIRST + 300 * 7 * DAY - 1, FIRST + 302 * 7 * DAY))
+        self.assertEqual([event["start_ts"] for event in occurrences], [FIRST + 300 * 7 * DAY, FIRST + 301 * 7 * DAY], "Wrong occurrences.")
+        self.assertEqual(occurrences[0].eid, 7, "Occurrence lost the series eid.")
+        self.assertEqual((occurrences[0]["date"], occurrences[0]["time"]), recurrence.local_date_time(FIRST + 300 * 7 * DAY, weekly), "Wrong local date.")
+        self.assertEqual(occurrences[0]["end_ts"] - occurrences[0]["start_ts"], 3600, "Occurrence without a duration doesn't last an hour.")
+        occurrence = next(recurrence.expand(series("weekly", duration=5400)))
+        self.assertEqual(occurrence["end_ts"], FIRST + 5400, "Occurrence doesn't last the series' duration.")
+
+    def test_count_and_until(self):
+        self.assertEqual(len(list(recurrence.expand(series("biweekly", recurrence_count=3)))), 3, "Count not applied.")
+        until = series("weekly", recurrence_until_ts=FIRST + 14 * DAY)
+        self.assertEqual([event["date"] for event in recurrence.expand(until)], ["2017-06-01", "2017-06-08"], "Until not applied.")
+
+    def test_monthly_skips_short_months(self):
+        # 2017-01-31 07:00PM UTC
+        monthly = series("monthly", timezone="UTC", recurrence_start_ts=1485889200, recurrence_count=4)
+        self.assertEqual([event["date"] for event in recurrence.expand(monthly)], ["2017-01-31", "2017-03-31"], "Short months not skipped.")
+        self.assertEqual([event["date"] for event in recurrence.expand(monthly, 1488326400)], ["2017-03-31"], "Window jump failed.")
+
+    def test_exceptions(self):
+        moved = {"start_ts": FIRST + 8 * DAY, "date": "2017-06-09", "time": "05:30PM"}
+        weekly = series("weekly", recurrence_count=3, exceptions={str(FIRST): {"cancelled": True}, str(FIRST + 7 * DAY): moved})
+        self.assertEqual([event["date"] for event in recurrence.expand(weekly)], ["2017-06-09", "2017-06-15"], "Exceptions not applied.")
+        self.assertEqual([event["date"] for event in recurrence.expand(weekly, FIRST + 8 * DAY, FIRST + 9 * DAY)], ["2017-06-09"], "Moved occurrence missing.")
+        self.assertEqual(recurrence.find_occurrence(weekly, 1496880000), FIRST + 7 * DAY, "Occurrence of 2017-06-08 not found.")
+        self.assertIsNone(recurrence.find_occurrence(weekly, 1496966400), "Found an occurrence on 2017-06-09.")
+
+    def test_after_and_next(self):
+        weekly = series("weekly")
+        occurrences = list(recurrence.expand(weekly, None, FIRST + 21 * DAY, after=(FIRST + 7 * DAY, 7)))
+        self.assertEqual([event["start_ts"] for event in occurrences], [FIRST + 14 * DAY], "Cursor not applied.")
+        self.assertEqual(recurrence.next_occurrence(weekly, FIRST)["start_ts"], FIRST + 7 * DAY, "Wrong next occurrence.")
+        self.assertIsNone(recurrence.next_occurrence(series("weekly", recurrence_count=1), FIRST), "Series should be over.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from SchedulerBot import scheduler
+from SchedulerBot.storage import Record
+
+class ReminderSchedulerTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = scheduler.ReminderScheduler(None)
+        self.scheduler.load([
+            Record({"reminder_datetime": "2017-06-01 05:30:PM", "is_sent": False}, 1),
+            Record({"reminder_datetime": "2017-06-01 04:30:PM", "is_sent": False}, 2),
+            Record({"reminder_datetime": "2017-06-01 03:30:PM", "is_sent": True}, 3)
+        ])
+
+    def test_load_skips_sent_reminders(self):
+        self.assertEqual(len(self.scheduler), 2, "Sent reminder was scheduled.")
+
+    def test_next_due(self):
+        due = scheduler.reminder_due_time({"reminder_datetime": "2017-06-01 04:30:PM"})
+        self.assertEqual(self.scheduler.next_due(), due, "Wrong next due time.")
+
+    def test_pop_due_in_order(self):
+        now = scheduler.reminder_due_time({"reminder_datetime": "2017-06-01 06:00:PM"})
+        self.assertEqual([reminder.eid for reminder in self.scheduler.pop_due(now)], [2, 1], "Reminders not popped in order.")
+        self.assertEqual(self.scheduler.next_due(), None, "Popped reminders still scheduled.")
+
+    def test_load_skips_stale_reminders(self):
+        now = scheduler.reminder_due_time({"reminder_datetime": "2017-06-01 06:00:PM"})
+        reminders = [
+            Record({"reminder_ts": now - scheduler.STALE_REMINDER_SECONDS - 1, "is_sent": False}, 1),
+            Record({"reminder_ts": now - 60, "is_sent": False}, 2),
+            Record({"reminder_ts": now - 60, "occurrence_ts": now - 30, "is_sent": False}, 3),
+            Record({"reminder_ts": now + 60, "is_sent": False}, 4)
+        ]
+        reminder_scheduler = scheduler.ReminderScheduler(None)
+        stale = reminder_scheduler.load(reminders, now)
+        self.assertEqual([reminder.eid for reminder in stale], [1, 3], "Overdue reminders not left out.")
+        self.assertEqual([reminder.eid for reminder in reminder_scheduler.pop_due(now + 60)], [2, 4], "Timely reminders not scheduled.")
+
+    def test_cancel_and_reschedule(self):
+        self.scheduler.cancel((None, 2))
+        self.scheduler.add(Record({"reminder_datetime": "2017-06-01 06:30:PM"}, 1))
+        due = scheduler.reminder_due_time({"reminder_datetime": "2017-06-01 06:30:PM"})
+        self.assertEqual(self.scheduler.next_due(), due, "Cancelled or rescheduled reminder still due.")
+        self.assertEqual(len(self.scheduler), 1, "Wrong number of scheduled reminders.")
+
+if __name__ == '__main__':
+    unittest.main()
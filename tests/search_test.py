@@ -0,0 +1,45 @@
+import unittest
+from SchedulerBot import search
+
+class NameIndexTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.names = search.NameIndex(["Game Night", "Night Raid", "Movie Night", "Raid"])
+
+    def test_edit_distance(self):
+        self.assertEqual(search.edit_distance("game night", "gmae night"), 2, "Wrong distance.")
+        self.assertEqual(search.edit_distance("raid", "raids"), 1, "Wrong distance.")
+        self.assertEqual(search.edit_distance("", "raid"), 4, "Wrong distance to an empty string.")
+        self.assertEqual(search.edit_distance("raid", "overwatch night", 2), 3, "Length bound not applied.")
+
+    def test_matching(self):
+        self.assertEqual(self.names.matching("GAME  night"), ["Game Night"], "Case-insensitive match not found.")
+        self.names.add("game night")
+        self.assertEqual(self.names.matching("Game Night"), ["Game Night", "game night"], "Both spellings not found.")
+
+    def test_prefix(self):
+        self.assertEqual(self.names.prefix("nig"), ["Game Night", "Movie Night", "Night Raid"], "Word prefixes not found.")
+        self.assertEqual(self.names.prefix("raid"), ["Night Raid", "Raid"], "Wrong prefix matches.")
+        self.assertEqual(self.names.prefix("nig", limit=1), ["Game Night"], "Limit not applied.")
+
+    def test_similar(self):
+        self.assertEqual(self.names.similar("Gmae Night"), [(2, "Game Night")], "Typo not matched.")
+        self.assertEqual(self.names.similar("Raud"), [(1, "Raid")], "Short name not matched.")
+        self.assertEqual(self.names.similar("Riad"), [], "Short name matched with two edits.")
+        self.assertEqual(self.names.similar("Overwatch"), [], "Unrelated name matched.")
+
+    def test_discard(self):
+        self.names.add("Game Night")
+        self.names.discard("Game Night")
+        self.assertEqual(self.names.matching("game night"), ["Game Night"], "Name dropped while a record still has it.")
+        self.names.discard("Game Night")
+        self.assertEqual(self.names.matching("game night"), [], "Name kept.")
+        self.assertEqual(self.names.prefix("game"), [], "Prefix entry kept.")
+        self.assertEqual(self.names.similar("Gmae Night"), [], "Trigrams kept.")
+
+    def test_large_index(self):
+        names = search.NameIndex("Event {}".format(number) for number in range(20000))
+        self.assertEqual(names.similar("Evnt 12345")[0], (1, "Event 12345"), "Closest name not found.")
+        self.assertEqual(names.prefix("event 1999")[:2], ["Event 1999", "Event 19990"], "Wrong prefix matches.")
+
+if __name__ == '__main__':
+    unittest.main()
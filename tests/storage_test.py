@@ -0,0 +1,88 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from SchedulerBot import storage
+
+# Checks that a savepoint of the storage undoes its writes when it raises and keeps them when it doesn't.
+def check_savepoint(test, backend):
+    eid = backend.insert("Event", {"name": "Game Night", "date": "2017-06-01"})
+    backend.insert("Event", {"name": "Raid", "date": "2017-06-03"})
+    with test.assertRaises(RuntimeError):
+        with backend.savepoint():
+            backend.insert("Reply", {"event_name": "Game Night", "author": "dave"})
+            backend.update_ids("Event", [eid], {"date": "2017-06-02"})
+            backend.remove("Event", name="Raid")
+            raise RuntimeError("Call failed.")
+    test.assertEqual(backend.all("Reply"), [], "Insert not undone.")
+    test.assertEqual(sorted((event["name"], event["date"]) for event in backend.all("Event")),
+        [("Game Night", "2017-06-01"), ("Raid", "2017-06-03")], "Update or removal not undone.")
+    with backend.savepoint():
+        backend.update("Event", {"date": "2017-06-02"}, name="Game Night")
+    test.assertEqual(backend.search("Event", name="Game Night")[0]["date"], "2017-06-02", "Savepoint without error undone.")
+
+class SQLiteStorageTestSuite(unittest.TestCase):
+    def setUp(self):
+        self.storage = storage.SQLiteStorage(":memory:")
+
+    def tearDown(self):
+        self.storage.close()
+
+    def test_insert_and_search(self):
+        self.storage.insert("Reply", {"event_name": "Game Night", "author": "dave", "status": "yes"})
+        self.storage.insert("Reply", {"event_name": "Game Night", "author": "anna", "status": "no"})
+        replies = self.storage.search("Reply", event_name="Game Night", author="anna")
+        self.assertEqual([reply["status"] for reply in replies], ["no"], "Wrong replies returned.")
+        self.assertEqual(len(self.storage.all("Reply")), 2, "Wrong number of records returned.")
+
+    def test_update_and_remove(self):
+        eid = self.storage.insert("Event", {"name": "Game Night", "date": "2017-06-01"})
+        self.assertEqual(self.storage.update("Event", {"date": "2017-06-02"}, name="Game Night"), 1, "Wrong number of records updated.")
+        self.assertEqual(self.storage.search("Event", name="Game Night")[0]["date"], "2017-06-02", "Update not stored.")
+        self.storage.remove_ids("Event", [eid])
+        self.assertEqual(self.storage.all("Event"), [], "Record not removed.")
+
+    def test_upsert_and_insert_unique(self):
+        self.assertTrue(self.storage.upsert("Reply", {"status": "yes"}, {"created_date": "2017-06-01"}, event_name="Game Night", author="dave"), "Reply not inserted.")
+        self.assertFalse(self.storage.upsert("Reply", {"status": "no"}, {"created_date": "2017-06-02"}, event_name="Game Night", author="dave"), "Reply inserted twice.")
+        replies = self.storage.all("Reply")
+        self.assertEqual([(reply["status"], reply["created_date"]) for reply in replies], [("no", "2017-06-01")], "Wrong reply stored.")
+
+        self.assertIsNotNone(self.storage.insert_unique("Event", {"name": "Game Night"}, "name"), "Event not inserted.")
+        self.assertIsNone(self.storage.insert_unique("Event", {"name": "Game Night", "date": "2017-06-02"}, "name"), "Duplicate name inserted.")
+        self.assertEqual(self.storage.count("Event"), 1, "Wrong number of events.")
+
+    def test_savepoint(self):
+        check_savepoint(self, self.storage)
+
+    def test_uses_index(self):
+        self.storage.insert("Event", {"name": "Game Night"})
+        plan = self.storage.conn.execute("EXPLAIN QUERY PLAN SELECT eid FROM \"Event\" WHERE json_extract(data, '$.name') = ?", ("Game Night",)).fetchall()
+        self.assertTrue(any("Event_name" in row[-1] for row in plan), "Index on Event.name not used.")
+
+    def test_migrate_json_to_sqlite(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        json_path = os.path.join(directory, "db.json")
+        sqlite_path = os.path.join(directory, "db.sqlite3")
+        with open(json_path, "w") as jfile:
+            json.dump({"_default": {}, "Event": {"3": {"name": "Game Night"}}}, jfile)
+
+        self.assertEqual(storage.migrate_json_to_sqlite(json_path, sqlite_path), {"Event": 1}, "Wrong migration counts.")
+        migrated = storage.SQLiteStorage(sqlite_path)
+        self.assertEqual(migrated.search("Event", name="Game Night")[0].eid, 3, "Record id not kept.")
+        migrated.close()
+
+class TinyDBStorageTestSuite(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.storage = storage.TinyDBStorage(os.path.join(directory, "db.json"))
+        self.addCleanup(self.storage.close)
+
+    def test_savepoint(self):
+        check_savepoint(self, self.storage)
+
+if __name__ == '__main__':
+    unittest.main()
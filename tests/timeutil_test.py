@@ -0,0 +1,15 @@
+import unittest
+from SchedulerBot import timeutil
+
+class TimeUtilTestSuite(unittest.TestCase):
+    def test_to_utc_timestamp(self):
+        self.assertEqual(timeutil.to_utc_timestamp("2017-06-01", "05:30PM", "UTC"), 1496338200, "Wrong UTC timestamp.")
+        self.assertEqual(timeutil.to_utc_timestamp("2017-06-01", "5:30pm", "PST"), 1496338200 + 8 * 60 * 60, "Timezone offset not applied.")
+        self.assertEqual(timeutil.to_utc_timestamp("2017-06-01", "05:30PM", "XXXXZZ"), 1496338200, "Unknown timezone not treated as UTC.")
+
+    def test_day_range(self):
+        self.assertEqual(timeutil.day_range("2017-06-01"), (1496275200, 1496361600), "Wrong day range.")
+        self.assertEqual(timeutil.utc_date(1496338200), "2017-06-01", "Wrong UTC date.")
+
+if __name__ == '__main__':
+    unittest.main()
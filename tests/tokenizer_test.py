@@ -0,0 +1,18 @@
+import unittest
+from SchedulerBot import tokenizer
+
+class TokenizerTestSuite(unittest.TestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenizer.tokenize("\"Game Night\" 2017-06-01 05:30PM PST \"Bring your own beer.\""),
+            ["Game Night", "2017-06-01", "05:30PM", "PST", "Bring your own beer."], "Wrong tokens returned.")
+
+    def test_tokenize_unclosed_quote(self):
+        self.assertEqual(tokenizer.tokenize("\"Game Night yes"), ["Game Night yes"], "Unclosed quote not treated as a phrase.")
+
+    def test_split_command(self):
+        self.assertEqual(tokenizer.split_command("!REPLY \"Game Night\" yes"), ("!reply", "\"Game Night\" yes"), "Wrong command split.")
+        self.assertEqual(tokenizer.split_command("!scheduler-bot"), ("!scheduler-bot", ""), "Wrong command split.")
+        self.assertEqual(tokenizer.split_command("hello there"), (None, None), "Chat treated as a command.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from SchedulerBot import validation
+
+class ValidationTestSuite(unittest.TestCase):
+    def test_parsed_values(self):
+        self.assertEqual(validation.DATE_RULE.parse("2017-06-01"), 1496275200, "Wrong date.")
+        self.assertEqual(validation.TIME_RULE.parse("5:30pm"), 17 * 3600 + 30 * 60, "Wrong time.")
+        self.assertEqual(validation.TIME_RULE.parse("12:15AM"), 15 * 60, "Midnight hour not handled.")
+        self.assertEqual(validation.TIMEZONE_RULE.parse("PST"), -8 * 3600, "Wrong timezone offset.")
+        self.assertEqual(validation.DATE_RANGE_RULE.parse("2017-06-01..2017-06-01"), (1496275200, 1496361600), "Wrong date range.")
+        self.assertEqual(validation.MONTH_RULE.parse("2017-6"), "2017-06", "Wrong month.")
+        self.assertEqual(validation.DURATION_RULE.parse("1h30m"), 5400, "Wrong duration.")
+        self.assertEqual(validation.DURATION_RULE.parse("2D"), 2 * 86400, "Wrong duration in days.")
+
+    def test_invalid_values(self):
+        for rule, value in ((validation.DATE_RULE, "2017-02-30"), (validation.TIME_RULE, "13:30PM"),
+                            (validation.TIMEZONE_RULE, "XXXXZZ"), (validation.DATE_RANGE_RULE, "2017-06-02..2017-06-01"),
+                            (validation.MONTH_RULE, "2017-13"), (validation.DURATION_RULE, "0m"), (validation.DURATION_RULE, "2 hours")):
+            self.assertFalse(rule.passes(value), "{} passed.".format(value))
+
+    def test_check_reports_every_failure(self):
+        checker = validation.InputRuleChecker([("name", validation.TEXT_RULE), ("date", validation.DATE_RULE), ("time", validation.TIME_RULE)])
+        values, errors = checker.check(["Game Night", "2017-AA-01", "7:X1PM"])
+        self.assertEqual(errors, [validation.DATE_RULE.fail_msg, validation.TIME_RULE.fail_msg], "Not every failure reported.")
+        values, errors = checker.check(["Game Night", "2017-06-01", "05:30PM"])
+        self.assertEqual((values, errors), ({"name": "Game Night", "date": 1496275200, "time": 63000}, []), "Wrong parsed values.")
+
+    def test_check_pairs(self):
+        values, parsed, errors = validation.InputRuleChecker().check_pairs(["Date", "2017-06-01", "color", "red", "timezone", "UTC", "author", "anna"],
+            validation.EVENT_FIELD_RULE, validation.EVENT_FIELD_RULES)
+        self.assertEqual(values, {"date": "2017-06-01", "timezone": "UTC"}, "Wrong field values.")
+        self.assertEqual(parsed, {"date": 1496275200, "timezone": 0}, "Wrong parsed values.")
+        self.assertEqual(errors, [validation.EVENT_FIELD_RULE.fail_msg] * 2, "Unknown or uneditable field not reported.")
+
+if __name__ == '__main__':
+    unittest.main()